@@ -3,3 +3,4 @@ scripts and classes used for data analysis
 """
 from .analyzer import *
 from .fit import fit, gaussian_fit
+from .scalars import parse_scalars, decode_scalar_lines, decode_scalar_file
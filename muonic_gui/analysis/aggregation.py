@@ -0,0 +1,337 @@
+"""
+Histogram the analyzer results on the acquisition side and send only the
+changes of the bin contents to the GUI in a fixed interval, so the cost of
+a GUI update depends on the number of bins and not on the number of events.
+"""
+import threading
+
+import numpy as np
+
+from muonic.lib.consumers import AbstractMuonicConsumer
+from muonic_gui.lib.buffers import RawValueBuffer
+from muonic_gui.lib.tracing import TRACER
+
+__all__ = ["HistogramAggregator", "AggregatingConsumer"]
+
+
+class HistogramAggregator(object):
+    """
+    Histogram filled in one thread and read out as bin content changes in
+    another one.
+
+    The raw values are kept as well, so the histogram can be rebinned. After
+    rebinning, the next read out returns the complete bin contents and is
+    flagged as reset.
+
+    :param binning: start, stop and number of bin edges
+    :type binning: tuple
+    :param max_values: maximum number of raw values to keep
+    :type max_values: int
+    """
+
+    def __init__(self, binning, max_values=RawValueBuffer.DEFAULT_MAX_VALUES):
+        self.raw_values = RawValueBuffer(max_values=max_values)
+
+        self._lock = threading.Lock()
+        self._set_binning(binning)
+
+    def _set_binning(self, binning):
+        """
+        Set the binning and clear the bin contents.
+
+        :param binning: start, stop and number of bin edges
+        :type binning: tuple
+        :returns: None
+        """
+        self.binning = tuple(binning)
+        self.bin_edges = np.linspace(binning[0], binning[1], binning[2])
+        self.bincontent = np.zeros(len(self.bin_edges) - 1)
+        self._sent = np.zeros(len(self.bin_edges) - 1)
+        self._reset = True
+
+    def fill(self, values):
+        """
+        Add values to the histogram.
+
+        :param values: the values
+        :type values: list or numpy.ndarray
+        :returns: None
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+
+        if values.size == 0:
+            return
+
+        # histogram outside the lock, rebin swaps the bin edges under it
+        with self._lock:
+            bin_edges = self.bin_edges
+
+        counts = np.histogram(values, bin_edges)[0]
+
+        with self._lock:
+            # rebinned in the meantime, the counts are for the old bins
+            if self.bin_edges is not bin_edges:
+                counts = np.histogram(values, self.bin_edges)[0]
+
+            self.raw_values.extend(values)
+            self.bincontent += counts
+
+    def rebin(self, binning):
+        """
+        Histogram the collected values again with a new binning.
+
+        :param binning: start, stop and number of bin edges
+        :type binning: tuple
+        :returns: None
+        """
+        with self._lock:
+            if tuple(binning) == self.binning:
+                return
+
+            self._set_binning(binning)
+            self.bincontent = self.raw_values.histogram(self.bin_edges)[0]
+
+    def get_state(self):
+        """
+        Copy of the histogram, e.g. for a session snapshot.
+
+        :returns: dict -- binning, bin contents, raw values and the number
+            of values seen
+        """
+        with self._lock:
+            return {"binning": np.array(self.binning, dtype=np.float64),
+                    "bincontent": self.bincontent.copy(),
+                    "values": self.raw_values.values.copy(),
+                    "total": np.int64(self.raw_values.total)}
+
+    def restore(self, state):
+        """
+        Replace the histogram with one saved by get_state. The complete bin
+        contents are sent with the next delta.
+
+        :param state: the saved histogram
+        :type state: dict
+        :returns: None
+        """
+        binning = state["binning"]
+        binning = (binning[0], binning[1], int(binning[2]))
+
+        with self._lock:
+            self._set_binning(binning)
+            self.raw_values.restore(state["values"], state.get("total"))
+
+            bincontent = state.get("bincontent")
+
+            # the bin contents are exact, the raw values may be a sample
+            if bincontent is not None and \
+                    len(bincontent) == len(self.bincontent):
+                self.bincontent = np.array(bincontent, dtype=np.float64)
+            else:
+                self.bincontent = self.raw_values.histogram(
+                        self.bin_edges)[0]
+
+    def request_reset(self):
+        """
+        Send the complete bin contents with the next delta.
+
+        :returns: None
+        """
+        with self._lock:
+            self._reset = True
+
+    def take_delta(self):
+        """
+        Get the change of the bin contents since the last call.
+
+        :returns: tuple or None -- bin content change, binning and reset
+            flag, None if nothing changed
+        """
+        with self._lock:
+            reset = self._reset
+
+            if reset:
+                delta = self.bincontent.copy()
+            else:
+                delta = self.bincontent - self._sent
+
+            if not reset and not delta.any():
+                return None
+
+            self._sent = self.bincontent.copy()
+            self._reset = False
+
+            return delta, self.binning, reset
+
+
+class AggregatingConsumer(AbstractMuonicConsumer):
+    """
+    Wraps a consumer and histograms the decay times, flight times and pulse
+    widths for it. Every 'interval' seconds the bin content changes are
+    handed to the push_histogram method of the wrapped consumer from a
+    background thread.
+
+    Pulses are still passed on event by event for the oscilloscope, but
+    without the pulse widths. Raw data and rates are passed on unchanged.
+
+    :param logger: logger object
+    :type logger: logging.Logger
+    :param consumer: the consumer to feed
+    :type consumer: muonic.lib.consumers.AbstractMuonicConsumer
+    :param interval: seconds between two updates of the consumer
+    :type interval: float
+    :param max_values: maximum number of raw values kept per histogram
+    :type max_values: int
+    """
+    # the binnings of the histogram canvases of the GUI
+    BINNINGS = {"lifetime": (0, 10, 21),
+                "velocity": (0., 30, 25),
+                "pulse_width_ch0": (0., 100, 30),
+                "pulse_width_ch1": (0., 100, 30),
+                "pulse_width_ch2": (0., 100, 30),
+                "pulse_width_ch3": (0., 100, 30)}
+
+    def __init__(self, logger, consumer, interval=0.5,
+                 max_values=RawValueBuffer.DEFAULT_MAX_VALUES):
+        AbstractMuonicConsumer.__init__(self, logger=logger)
+        self.consumer = consumer
+        self.interval = interval
+
+        self.histograms = dict(
+                (name, HistogramAggregator(binning, max_values=max_values))
+                for name, binning in self.BINNINGS.items())
+
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def rebin(self, name, binning):
+        """
+        Change the binning of histogram 'name'. Safe to call from any thread.
+
+        :param name: histogram name
+        :type name: str
+        :param binning: start, stop and number of bin edges
+        :type binning: tuple
+        :returns: None
+        """
+        self.histograms[name].rebin(binning)
+
+    def resend(self, name, binning):
+        """
+        Send the complete bin contents of histogram 'name' in the given
+        binning with the next update, e.g. for a newly created canvas.
+
+        :param name: histogram name
+        :type name: str
+        :param binning: start, stop and number of bin edges
+        :type binning: tuple
+        :returns: None
+        """
+        histogram = self.histograms[name]
+        histogram.rebin(binning)
+        histogram.request_reset()
+
+    def get_state(self):
+        """
+        Copies of all histograms, see :meth:`HistogramAggregator.get_state`
+
+        :returns: dict -- histogram name to histogram state
+        """
+        return dict((name, histogram.get_state())
+                    for name, histogram in self.histograms.items())
+
+    def restore(self, states):
+        """
+        Replace the histograms with ones saved by get_state. Unknown names
+        are ignored.
+
+        :param states: histogram name to histogram state
+        :type states: dict
+        :returns: None
+        """
+        for name, state in states.items():
+            if name in self.histograms:
+                self.histograms[name].restore(state)
+
+    def send(self):
+        """
+        Hand the bin content changes of all histograms to the consumer.
+
+        :returns: None
+        """
+        if TRACER.enabled:
+            for kind in TRACER.KINDS:
+                TRACER.handed(kind)
+
+        for name, histogram in sorted(self.histograms.items()):
+            delta = histogram.take_delta()
+
+            if delta is not None:
+                self.consumer.push_histogram(name, *delta)
+
+    def _run(self):
+        """
+        Send loop of the background thread.
+
+        :returns: None
+        """
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.send()
+            except Exception as e:
+                self.logger.error("Sending histograms failed: %s" % e)
+
+    def start(self):
+        """
+        Start sending the histograms in the background.
+
+        :returns: None
+        """
+        if self._thread is not None:
+            return
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run,
+                                        name="AggregatingConsumer")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def run(self, run_id=None):
+        self.start()
+        self.consumer.run(run_id)
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+            self.send()
+
+        self.consumer.stop()
+
+    def push_raw(self, data, meta):
+        self.consumer.push_raw(data, meta)
+
+    def push_rate(self, rates, counts, time_window, query_time, meta):
+        self.consumer.push_rate(rates, counts, time_window, query_time, meta)
+
+    def push_pulse(self, pulse_widths, event_time, meta):
+        # filled before the push, so a trace handed on by send() is part
+        # of the bin content changes taken right after
+        for i in range(4):
+            self.histograms["pulse_width_ch%d" % i].fill(pulse_widths[i])
+
+        if TRACER.enabled:
+            TRACER.push("pulse", meta)
+
+        if isinstance(meta, dict) and meta.get("pulses") is not None:
+            self.consumer.push_pulse([[], [], [], []], event_time, meta)
+
+    def push_decay(self, decay_time, event_time, meta):
+        self.histograms["lifetime"].fill([decay_time])
+        if TRACER.enabled:
+            TRACER.push("decay", meta)
+
+    def push_velocity(self, flight_time, event_time, meta):
+        self.histograms["velocity"].fill([flight_time])
+        if TRACER.enabled:
+            TRACER.push("velocity", meta)
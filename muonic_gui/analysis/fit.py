@@ -5,9 +5,11 @@ time differences for the use with QNet
 from __future__ import print_function
 import sys
 
-from matplotlib import pylab
+import matplotlib
 import numpy
-import scipy.optimize as optimize
+
+# scipy and pylab take long to import, so they are only imported when the
+# first fit is requested
 
 
 def fit(bincontent=None, binning=(0, 10, 21), fitrange=None):
@@ -19,6 +21,8 @@ def fit(bincontent=None, binning=(0, 10, 21), fitrange=None):
     :param fitrange:
     :returns:
     """
+    import scipy.optimize as optimize
+
     def decay(p, x):
         return p[0] * numpy.exp(-x / p[1]) + p[2]
     
@@ -26,6 +30,8 @@ def fit(bincontent=None, binning=(0, 10, 21), fitrange=None):
         return decay(p, x) - y
     
     if bincontent is None:
+        from matplotlib import pylab
+
         nbins = 10
         xmin = 1.0
         xmax = 20.0
@@ -96,8 +102,8 @@ def fit(bincontent=None, binning=(0, 10, 21), fitrange=None):
             if fitrange[1] > binning[1]:
                 fitrange = (fitrange[0], binning[1])
 
-            bin_mask = [(bin_centers <= fitrange[1]) &
-                        (bin_centers >= fitrange[0])]
+            bin_mask = ((bin_centers <= fitrange[1]) &
+                        (bin_centers >= fitrange[0]))
             bin_centers_ = numpy.asarray([x for x in bin_centers
                                           if fitrange[0] <= x <= fitrange[1]])
 
@@ -155,7 +161,7 @@ def fit(bincontent=None, binning=(0, 10, 21), fitrange=None):
         
         params = {"legend.fontsize": 13}
 
-        pylab.rcParams.update(params)
+        matplotlib.rcParams.update(params)
         
         # nbins = 84
         nbins = len(bins)
@@ -179,6 +185,8 @@ def gaussian_fit(bincontent, binning=(0, 2, 10), fitrange=None):
     :param fitrange:
     :returns:
     """
+    import scipy.optimize as optimize
+
     def gauss(p, x):
         return (p[0] * (1 / (p[1] * numpy.sqrt(2 * numpy.pi))) *
                 numpy.exp(-0.5 * (((x - p[2]) / p[1]) ** 2)))
@@ -201,8 +209,8 @@ def gaussian_fit(bincontent, binning=(0, 2, 10), fitrange=None):
             fitrange = (binning[0], fitrange[1])
         if fitrange[1] > binning[1]:
             fitrange = (fitrange[0], binning[1])
-        bin_mask = [(bin_centers <= fitrange[1]) &
-                    (bin_centers >= fitrange[0])]
+        bin_mask = ((bin_centers <= fitrange[1]) &
+                    (bin_centers >= fitrange[0]))
         bin_centers_ = numpy.asarray([x for x in bin_centers
                                       if fitrange[0] <= x <= fitrange[1]])
         if len(bin_centers_) < 3:
@@ -266,7 +274,7 @@ def gaussian_fit(bincontent, binning=(0, 2, 10), fitrange=None):
     
     params = {"legend.fontsize": 13}
 
-    pylab.rcParams.update(params)
+    matplotlib.rcParams.update(params)
     
     # nbins = 84
     nbins = len(bins)
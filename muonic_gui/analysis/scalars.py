@@ -0,0 +1,112 @@
+"""
+Decoding of the scalar counters reported by the DAQ card on the DS command.
+
+A DS message reads 'DS S0=0000002A S1=... S4=00000011' with the counts of
+the four channels and of the trigger as eight hex digits each. Single
+messages are decoded with one regex pass, whole raw logs at once by reading
+the hex digits at their fixed offsets with numpy.
+"""
+import re
+
+import numpy as np
+
+__all__ = ["SCALAR_CHANNELS", "parse_scalars", "decode_scalar_lines",
+           "decode_scalar_file"]
+
+# counters of channel 0-3 and of the trigger
+SCALAR_CHANNELS = 5
+
+# one counter of a DS message, e.g. 'S2=0000ABCD'
+SCALAR_PATTERN = re.compile(r"(?<!\S)S([0-4])=([0-9A-Fa-f]{8})(?!\S)")
+
+# a DS message with all counters in order has a fixed layout
+CANONICAL_LENGTH = 2 + SCALAR_CHANNELS * 12
+DIGIT_OFFSETS = np.array([2 + 12 * i + 4 + j
+                          for i in range(SCALAR_CHANNELS)
+                          for j in range(8)])
+SEPARATOR_OFFSETS = np.array([2 + 12 * i + k
+                              for i in range(SCALAR_CHANNELS)
+                              for k in range(4)])
+SEPARATORS = np.frombuffer(b"".join(b" S%d=" % i
+                                    for i in range(SCALAR_CHANNELS)),
+                           dtype=np.uint8)
+NIBBLE_WEIGHTS = 16 ** np.arange(7, -1, -1, dtype=np.int64)
+
+# value of the ASCII hex digits, -1 for all other characters
+HEX_VALUES = np.full(256, -1, dtype=np.int64)
+for _value, _digit in enumerate(b"0123456789ABCDEF"):
+    HEX_VALUES[_digit] = _value
+    HEX_VALUES[ord(chr(_digit).lower())] = _value
+del _value, _digit
+
+
+def parse_scalars(msg):
+    """
+    Extracts the scalar values for channel 0-3 and the trigger channel from
+    a DAQ message. Counters missing in the message are zero.
+
+    :param msg: DAQ message
+    :type msg: str
+    :returns: list of int
+    """
+    scalars = [0] * SCALAR_CHANNELS
+
+    for match in SCALAR_PATTERN.finditer(msg):
+        scalars[int(match.group(1))] = int(match.group(2), 16)
+
+    return scalars
+
+
+def decode_scalar_lines(lines):
+    """
+    Decodes DS messages to an array with one row of counters per message.
+    Lines which are not DS messages are skipped.
+
+    :param lines: DAQ messages
+    :type lines: iterable of str or bytes
+    :returns: numpy.ndarray -- counters, shape (number of messages, 5)
+    """
+    lines = [line.encode("ascii", "replace") if isinstance(line, str)
+             else line for line in lines]
+    lines = [line.strip() for line in lines if line.lstrip().startswith(b"DS")]
+
+    scalars = np.zeros((len(lines), SCALAR_CHANNELS), dtype=np.int64)
+
+    if not lines:
+        return scalars
+
+    # decode the messages in the canonical layout in one go
+    canonical = np.array([len(line) == CANONICAL_LENGTH for line in lines])
+
+    if canonical.any():
+        chars = np.frombuffer(b"".join(line for line, ok in
+                                       zip(lines, canonical) if ok),
+                              dtype=np.uint8).reshape(-1, CANONICAL_LENGTH)
+        nibbles = HEX_VALUES[chars[:, DIGIT_OFFSETS]].reshape(
+                -1, SCALAR_CHANNELS, 8)
+
+        valid = ((chars[:, SEPARATOR_OFFSETS] == SEPARATORS).all(axis=1) &
+                 (nibbles >= 0).all(axis=(1, 2)))
+
+        indices = np.flatnonzero(canonical)
+        scalars[indices[valid]] = nibbles[valid].dot(NIBBLE_WEIGHTS)
+        canonical[indices[~valid]] = False
+
+    # everything else, e.g. with the counters in another order
+    for index in np.flatnonzero(~canonical):
+        scalars[index] = parse_scalars(lines[index].decode("ascii",
+                                                           "replace"))
+
+    return scalars
+
+
+def decode_scalar_file(filename):
+    """
+    Decodes the DS messages of a raw data file.
+
+    :param filename: name of the file with the raw DAQ messages
+    :type filename: str
+    :returns: numpy.ndarray -- counters, shape (number of messages, 5)
+    """
+    with open(filename, "rb") as f:
+        return decode_scalar_lines(f)
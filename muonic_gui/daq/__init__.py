@@ -0,0 +1,11 @@
+"""
+Communication with the DAQ card on top of the muonic DAQ providers
+"""
+from .commands import DAQCommander, DAQCommandQueue, DAQTimeoutError
+from .commands import parse_thresholds, parse_channel_config
+from .gps import GPSRecord, GPSParser, GPSMonitor
+from .registers import DAQRegisterWriter, channel_registers
+from .registers import parse_registers, register_commands
+from .state import DAQState
+from .simulator import EventGenerator, DAQCardSimulator, SimulatedDAQProvider
+from .simulator import PTYSimulator, SocketSimulator
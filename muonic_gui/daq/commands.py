@@ -0,0 +1,324 @@
+"""
+Provides a request/response layer for DAQ commands. A request returns a
+future which is completed by the matching reply in the stream of raw DAQ
+messages, so no caller has to sleep while waiting for the card.
+
+Commands changing the configuration of the card are sent in batches
+through a :class:`DAQCommandQueue`, which paces them and reads the
+configuration back once per batch.
+"""
+from concurrent.futures import Future
+import queue
+import threading
+
+__all__ = ["DAQCommander", "DAQCommandQueue", "DAQTimeoutError",
+           "parse_thresholds", "parse_channel_config"]
+
+
+class DAQTimeoutError(Exception):
+    """
+    Exception that gets set on a request future if the DAQ card did not
+    reply in time.
+    """
+    pass
+
+
+class DAQCommander(object):
+    """
+    Sends commands to the DAQ card and completes the futures of the
+    requests when the replies arrive.
+
+    :meth:`feed` has to be called with every raw message of the card, e.g.
+    from the push_raw method of a consumer. Futures are completed in the
+    thread calling :meth:`feed` or, on timeout, in a timer thread.
+
+    :param logger: logger object
+    :type logger: logging.Logger
+    :param put: function sending a message to the DAQ card
+    :type put: callable
+    """
+    # first line of the reply and last line for replies spanning several
+    # lines, e.g. the 13 lines of the GPS dump
+    REPLIES = {"TL": ("TL L0=", None),
+               "DC": ("DC C0=", None),
+               "DS": ("DS S0=", None),
+               "DG": ("Date+Time:", "ChkSumErr:")}
+
+    def __init__(self, logger, put):
+        self.logger = logger
+        self.put = put
+
+        self._pending = dict((command, []) for command in self.REPLIES)
+        # only used by the thread calling feed
+        self._lines = dict()
+        self._lock = threading.Lock()
+
+    def request(self, command, timeout=2.0):
+        """
+        Send 'command' to the DAQ card. The returned future gets the reply,
+        a str or for replies spanning several lines a list of str, or a
+        DAQTimeoutError after 'timeout' seconds.
+
+        :param command: one of TL, DC, DS or DG
+        :type command: str
+        :param timeout: seconds to wait for the reply
+        :type timeout: float
+        :returns: concurrent.futures.Future
+        """
+        if command not in self.REPLIES:
+            raise ValueError("No reply known for DAQ command '%s'" % command)
+
+        future = Future()
+
+        timer = threading.Timer(timeout, self._expire,
+                                args=(command, future, timeout))
+        timer.daemon = True
+
+        with self._lock:
+            self._pending[command].append((future, timer))
+
+        timer.start()
+        self.put(command)
+
+        return future
+
+    def feed(self, line):
+        """
+        Check a raw message of the DAQ card for replies to pending requests.
+
+        :param line: the raw message
+        :type line: str
+        :returns: None
+        """
+        for command, (first, last) in self.REPLIES.items():
+            if not self._pending[command]:
+                # the requests expired while collecting
+                self._lines.pop(command, None)
+                continue
+
+            if command in self._lines:
+                # collecting a reply spanning several lines
+                self._lines[command].append(line)
+
+                if line.startswith(last):
+                    self._complete(command, self._lines.pop(command))
+            elif line.startswith(first):
+                if last is None:
+                    self._complete(command, line)
+                else:
+                    self._lines[command] = [line]
+
+    def _complete(self, command, reply):
+        """
+        Complete all pending requests for 'command' with 'reply'.
+
+        :param command: the command
+        :type command: str
+        :param reply: the reply
+        :type reply: str or list of str
+        :returns: None
+        """
+        with self._lock:
+            pending = self._pending[command]
+            self._pending[command] = []
+
+        for future, timer in pending:
+            timer.cancel()
+            if not future.done():
+                future.set_result(reply)
+
+    def _expire(self, command, future, timeout):
+        """
+        Fail a request the DAQ card did not reply to in time.
+
+        :param command: the command
+        :type command: str
+        :param future: the future of the request
+        :type future: concurrent.futures.Future
+        :param timeout: the timeout in seconds
+        :type timeout: float
+        :returns: None
+        """
+        with self._lock:
+            self._pending[command] = [(f, t) for f, t in self._pending[command]
+                                      if f is not future]
+
+        if not future.done():
+            self.logger.warning("No reply to DAQ command '%s' within %.1f s" %
+                                (command, timeout))
+            future.set_exception(DAQTimeoutError(command))
+
+
+class DAQCommandQueue(object):
+    """
+    Sends batches of commands to the DAQ card from a single background
+    thread, one batch after the other, so the commands of two batches never
+    mix. The commands of a batch are sent 'interval' seconds apart, then
+    each command given for the readback is requested once. The future of
+    the batch gets the readback replies by command.
+
+    :param logger: logger object
+    :type logger: logging.Logger
+    :param commander: sends the commands and requests the readback
+    :type commander: DAQCommander
+    :param interval: seconds between two commands of a batch
+    :type interval: float
+    :param timeout: seconds to wait for a readback reply
+    :type timeout: float
+    """
+
+    def __init__(self, logger, commander, interval=0.02, timeout=2.0):
+        self.logger = logger
+        self.commander = commander
+        self.interval = interval
+        self.timeout = timeout
+
+        self._queue = queue.Queue()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, commands, readback=()):
+        """
+        Queue a batch of commands.
+
+        :param commands: the commands, sent in this order
+        :type commands: list of str
+        :param readback: commands requested after the batch, e.g. TL or DC
+        :type readback: list of str
+        :returns: concurrent.futures.Future -- completed with a dict of the
+            readback replies by command, or a DAQTimeoutError
+        """
+        future = Future()
+
+        with self._lock:
+            if self._thread is None:
+                self._stop_event.clear()
+                self._thread = threading.Thread(target=self._run,
+                                                name="DAQCommandQueue")
+                self._thread.daemon = True
+                self._thread.start()
+
+        self._queue.put((list(commands), list(readback), future))
+
+        return future
+
+    def _run(self):
+        """
+        Sending loop of the background thread.
+
+        :returns: None
+        """
+        while True:
+            batch = self._queue.get()
+
+            if batch is None:
+                break
+
+            commands, readback, future = batch
+
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            try:
+                replies = self._send(commands, readback)
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result(replies)
+
+    def _send(self, commands, readback):
+        """
+        Send a batch and read back the replies.
+
+        :param commands: the commands
+        :type commands: list of str
+        :param readback: commands requested after the batch
+        :type readback: list of str
+        :returns: dict
+        """
+        for command in commands:
+            self.logger.debug("Sending '%s' to the DAQ card" % command)
+            self.commander.put(command)
+
+            if self._stop_event.wait(self.interval):
+                raise RuntimeError("DAQ command queue stopped")
+
+        requests = [(command, self.commander.request(command,
+                                                     timeout=self.timeout))
+                    for command in readback]
+
+        return dict((command, future.result())
+                    for command, future in requests)
+
+    def stop(self):
+        """
+        Stop sending, batches still queued are dropped.
+
+        :returns: None
+        """
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+
+        if thread is None:
+            return
+
+        self._stop_event.set()
+        self._queue.put(None)
+        thread.join()
+
+        while True:
+            try:
+                batch = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if batch is not None:
+                batch[2].cancel()
+
+
+def parse_thresholds(reply):
+    """
+    Get the thresholds of the four channels from a TL reply like
+    'TL L0=300 L1=300 L2=300 L3=300'.
+
+    :param reply: the reply
+    :type reply: str
+    :returns: list of int
+    """
+    fields = dict(field.split("=") for field in reply.split()[1:])
+    return [int(fields["L%d" % i]) for i in range(4)]
+
+
+def parse_channel_config(reply):
+    """
+    Get the channel configuration from a DC reply like
+    'DC C0=23 C1=71 C2=0A C3=00', by the names of the muonic settings.
+
+    :param reply: the reply
+    :type reply: str
+    :returns: dict
+    """
+    fields = dict(field.split("=") for field in reply.split()[1:])
+    config = dict()
+
+    # register 0: veto in bits 7-6, coincidence in bits 5-4 and the
+    # enabled channels in bits 3-0
+    c0 = int(fields["C0"], 16)
+
+    for i in range(4):
+        config["active_ch%d" % i] = bool(c0 & (1 << i))
+
+    coincidence = (c0 >> 4) & 3
+    for i in range(4):
+        config["coincidence%d" % i] = (i == coincidence)
+
+    veto = (c0 >> 6) & 3
+    config["veto"] = veto != 0
+    for i in range(3):
+        config["veto_ch%d" % i] = (veto == i + 1)
+
+    # registers 3 and 2: gate width in steps of 10 ns
+    config["gate_width"] = int(fields["C3"] + fields["C2"], 16) * 10
+
+    return config
@@ -0,0 +1,336 @@
+"""
+Provides the parsing of the GPS dump of the DAQ card and a monitor which
+reads out the GPS in the background.
+
+The reply to the DG command spans several lines, from 'Date+Time:' to
+'ChkSumErr:', and data lines of the card may arrive in between. The
+parser is a small state machine fed with every raw message, so it finds
+the dump wherever it appears in the stream, no matter who sent the DG
+command, and parses every field once into a :class:`GPSRecord`.
+"""
+import collections
+import datetime
+import threading
+import time
+
+import numpy as np
+
+__all__ = ["GPSRecord", "GPSParser", "GPSMonitor", "parse_gps_time",
+           "parse_coordinate"]
+
+# first and last line of the GPS dump
+GPS_DUMP_START = "Date+Time:"
+GPS_DUMP_END = "ChkSumErr:"
+
+# a dump is given up after this many lines without its end, data lines of
+# the card are not counted
+GPS_DUMP_MAX_LINES = 16
+
+# number of fields of a data line of the card
+DATA_FIELDS = 16
+
+
+def parse_gps_time(value):
+    """
+    Parse the GPS time of the dump, e.g. '13/02/07 23:12:00.006'.
+
+    :param value: the time
+    :type value: str
+    :returns: datetime.datetime
+    :raises: ValueError
+    """
+    return datetime.datetime.strptime(value.strip(), "%d/%m/%y %H:%M:%S.%f")
+
+
+def parse_coordinate(value):
+    """
+    Parse a latitude or longitude in degrees and minutes like
+    '51:14.7420N' or '087:50.0560 W' into signed degrees.
+
+    :param value: the coordinate
+    :type value: str
+    :returns: float
+    :raises: ValueError
+    """
+    value = value.replace(" ", "")
+    hemisphere = value[-1:].upper()
+
+    if hemisphere not in ("N", "S", "E", "W"):
+        raise ValueError("No hemisphere in coordinate '%s'" % value)
+
+    degrees, minutes = value[:-1].split(":")
+    coordinate = int(degrees) + float(minutes) / 60.
+
+    return -coordinate if hemisphere in ("S", "W") else coordinate
+
+
+def _parse_altitude(value):
+    """
+    Parse an altitude like '150.3m' in meters.
+
+    :param value: the altitude
+    :type value: str
+    :returns: float
+    """
+    return float(value.strip().rstrip("m"))
+
+
+class GPSRecord(object):
+    """
+    The fields of one GPS dump. Fields which could not be parsed are None.
+
+    :param fields: the fields by the attribute names
+    :type fields: dict
+    :param lines: the lines of the dump
+    :type lines: list of str
+    :param received: time the dump was received in seconds since the epoch
+    :type received: float
+    """
+    # label in the dump, attribute name and parse function
+    FIELDS = [("Date+Time", "time", parse_gps_time),
+              ("Status", "status", str),
+              ("PosFix#", "pos_fix", int),
+              ("Latitude", "latitude", parse_coordinate),
+              ("Longitude", "longitude", parse_coordinate),
+              ("Altitude", "altitude", _parse_altitude),
+              ("Sats used", "satellites", int),
+              ("PPS delay", "pps_delay", str),
+              ("FPGA time", "fpga_time", lambda value: int(value, 16)),
+              ("FPGA 1PPS", "fpga_pps", lambda value: int(value, 16)),
+              ("ChkSumErr", "checksum_errors", int)]
+
+    def __init__(self, fields, lines, received=None):
+        for _, name, _ in self.FIELDS:
+            setattr(self, name, fields.get(name))
+
+        self.lines = lines
+        self.received = time.time() if received is None else received
+
+    @property
+    def valid(self):
+        """
+        True if the GPS has a valid fix
+
+        :returns: bool
+        """
+        return self.status is not None and self.status.startswith("A")
+
+    def __repr__(self):
+        return "GPSRecord(time=%s, valid=%s, satellites=%s)" % (
+                self.time, self.valid, self.satellites)
+
+
+class GPSParser(object):
+    """
+    Finds GPS dumps in the stream of raw DAQ messages.
+
+    :param logger: logger object
+    :type logger: logging.Logger
+    """
+    # parse function by label
+    _FIELDS = dict((label, (name, parse))
+                   for label, name, parse in GPSRecord.FIELDS)
+
+    def __init__(self, logger):
+        self.logger = logger
+
+        # lines and parsed fields of the dump being read, None if idle
+        self._lines = None
+        self._fields = None
+
+    @property
+    def collecting(self):
+        """
+        True while reading a dump
+
+        :returns: bool
+        """
+        return self._lines is not None
+
+    def feed(self, line):
+        """
+        Read a raw message.
+
+        :param line: the raw message
+        :type line: str
+        :returns: GPSRecord or None -- the record if 'line' ended a dump
+        """
+        if line.startswith(GPS_DUMP_START):
+            if self.collecting:
+                self.logger.debug("Incomplete GPS dump dropped")
+            self._lines = []
+            self._fields = dict()
+        elif not self.collecting:
+            return None
+        elif len(line.split()) == DATA_FIELDS:
+            # data lines of the card in between
+            return None
+
+        self._lines.append(line)
+        self._parse_field(line)
+
+        if line.startswith(GPS_DUMP_END):
+            record = GPSRecord(self._fields, self._lines)
+            self._lines = None
+            self._fields = None
+            return record
+
+        if len(self._lines) > GPS_DUMP_MAX_LINES:
+            self.logger.debug("GPS dump without end dropped")
+            self._lines = None
+            self._fields = None
+
+        return None
+
+    def _parse_field(self, line):
+        """
+        Parse a 'label: value' line of the dump into the fields.
+
+        :param line: the line
+        :type line: str
+        :returns: None
+        """
+        label, separator, value = line.partition(":")
+
+        if not separator or label.strip() not in self._FIELDS:
+            return
+
+        name, parse = self._FIELDS[label.strip()]
+
+        try:
+            self._fields[name] = parse(value.strip())
+        except (ValueError, IndexError) as e:
+            self.logger.debug("Failed to parse GPS field '%s': %s" %
+                              (line, e))
+
+
+class GPSMonitor(object):
+    """
+    Reads out the GPS of the DAQ card every 'interval' seconds from a
+    background thread and keeps the last record and a time series of the
+    number of satellites, the fix status and the checksum errors.
+
+    :meth:`feed` has to be called with every raw message of the card. It
+    parses the dumps, whoever asked for them, and hands new records to
+    'callback', in the thread calling :meth:`feed`.
+
+    :param logger: logger object
+    :type logger: logging.Logger
+    :param put: function sending a message to the DAQ card
+    :type put: callable
+    :param interval: seconds between two readouts, no polling if 0
+    :type interval: float
+    :param callback: called with every new record
+    :type callback: callable
+    :param history: number of records kept in the time series
+    :type history: int
+    """
+
+    def __init__(self, logger, put, interval=60., callback=None,
+                 history=10000):
+        self.logger = logger
+        self.put = put
+        self.interval = interval
+        self.callback = callback
+
+        self.parser = GPSParser(logger)
+        self.last = None
+
+        self._series = collections.deque(maxlen=history)
+        self._lock = threading.Lock()
+
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def feed(self, line):
+        """
+        Read a raw message of the DAQ card.
+
+        :param line: the raw message
+        :type line: str
+        :returns: None
+        """
+        record = self.parser.feed(line)
+
+        if record is None:
+            return
+
+        with self._lock:
+            self.last = record
+            self._series.append((record.received,
+                                 -1 if record.satellites is None
+                                 else record.satellites,
+                                 record.valid,
+                                 -1 if record.checksum_errors is None
+                                 else record.checksum_errors))
+
+        if self.callback is not None:
+            self.callback(record)
+
+    def series(self):
+        """
+        The time series of the records received so far.
+
+        :returns: dict -- arrays 'time' in seconds since the epoch,
+            'satellites', 'valid' and 'checksum_errors', -1 where a field
+            could not be parsed
+        """
+        with self._lock:
+            values = list(self._series)
+
+        if not values:
+            values = np.zeros((0, 4))
+
+        time_, satellites, valid, errors = np.asarray(values,
+                                                      dtype=np.float64).T
+
+        return {"time": time_,
+                "satellites": satellites.astype(np.int64),
+                "valid": valid.astype(bool),
+                "checksum_errors": errors.astype(np.int64)}
+
+    def poll(self):
+        """
+        Ask the DAQ card for a GPS dump. Returns right away, the record
+        arrives through :meth:`feed`.
+
+        :returns: None
+        """
+        self.put("DG")
+
+    def _run(self):
+        """
+        Polling loop of the background thread.
+
+        :returns: None
+        """
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                self.logger.error("Failed to ask for the GPS dump: %s" % e)
+
+    def start(self):
+        """
+        Start polling in the background.
+
+        :returns: None
+        """
+        if self._thread is not None or not self.interval:
+            return
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="GPSMonitor")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop polling.
+
+        :returns: None
+        """
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,327 @@
+"""
+Provides a register model of the configuration of the DAQ card and a
+writer which changes it with as few commands as possible.
+
+The channel configuration lives in the registers 0, 2 and 3 of the card,
+written with 'WC <register> <value>', the thresholds are set with
+'TL <channel> <value>'. The writer encodes the desired configuration into
+register values, compares them with the current ones from the
+:class:`muonic_gui.daq.state.DAQState` and only sends the commands for what
+differs, as one batch through a
+:class:`muonic_gui.daq.commands.DAQCommandQueue`. A single TL and DC
+readback after the batch confirms the new configuration.
+"""
+import functools
+import itertools
+import threading
+
+__all__ = ["REGISTER_SETTINGS", "channel_registers", "parse_registers",
+           "register_commands", "DAQRegisterWriter"]
+
+# the settings encoded into the registers holding the channel
+# configuration
+REGISTER_SETTINGS = {
+    0: tuple(["active_ch%d" % i for i in range(4)] +
+             ["coincidence%d" % i for i in range(4)] +
+             ["veto"] + ["veto_ch%d" % i for i in range(3)]),
+    2: ("gate_width",),
+    3: ("gate_width",)
+}
+
+# registers holding the channel configuration
+CHANNEL_REGISTERS = tuple(sorted(REGISTER_SETTINGS))
+
+# 'TL 4 <value>' sets the thresholds of all channels
+ALL_CHANNELS = 4
+
+
+def _known(values, register):
+    """
+    Returns True if all settings encoded into 'register' are known.
+
+    :param values: the configuration by setting name
+    :type values: dict
+    :param register: the register number
+    :type register: int
+    :returns: bool
+    """
+    return all(values.get(name) is not None
+               for name in REGISTER_SETTINGS[register])
+
+
+def channel_registers(values):
+    """
+    Encode the channel configuration into the values of the registers
+    0, 2 and 3, the inverse of
+    :func:`muonic_gui.daq.commands.parse_channel_config`. Registers with
+    settings missing from 'values' or None are left out.
+
+    :param values: the configuration by setting name
+    :type values: dict
+    :returns: dict -- register values by register number
+    """
+    registers = dict()
+
+    # register 0: veto in bits 7-6, coincidence in bits 5-4 and the
+    # enabled channels in bits 3-0
+    if _known(values, 0):
+        c0 = 0
+
+        for i in range(4):
+            if values["active_ch%d" % i]:
+                c0 |= 1 << i
+
+        for i in range(4):
+            if values["coincidence%d" % i]:
+                c0 |= i << 4
+                break
+
+        if values["veto"]:
+            for i in range(3):
+                if values["veto_ch%d" % i]:
+                    c0 |= (i + 1) << 6
+                    break
+
+        registers[0] = c0
+
+    # registers 3 and 2: gate width in steps of 10 ns
+    if _known(values, 2):
+        gate_width = int(values["gate_width"]) // 10
+        registers[2] = gate_width & 0xFF
+        registers[3] = (gate_width >> 8) & 0xFF
+
+    return registers
+
+
+def parse_registers(reply):
+    """
+    Get the register values from a DC reply like
+    'DC C0=23 C1=71 C2=0A C3=00'.
+
+    :param reply: the reply
+    :type reply: str
+    :returns: dict -- register values by register number
+    """
+    fields = dict(field.split("=") for field in reply.split()[1:])
+    return dict((int(name[1:]), int(value, 16))
+                for name, value in fields.items())
+
+
+def _threshold_commands(current, desired):
+    """
+    The TL commands changing the thresholds 'current' to 'desired'.
+
+    :param current: the current thresholds, None where unknown
+    :type current: list of int
+    :param desired: the desired thresholds, None where unchanged
+    :type desired: list of int
+    :returns: list of str
+    """
+    changed = [i for i in range(4)
+               if desired[i] is not None and current[i] != desired[i]]
+
+    if len(changed) == 4 and len(set(desired)) == 1:
+        return ["TL %d %d" % (ALL_CHANNELS, desired[0])]
+
+    return ["TL %d %d" % (i, desired[i]) for i in changed]
+
+
+def register_commands(current, values, thresholds_known=True,
+                      registers_known=True):
+    """
+    The commands changing the settings in 'values' from the configuration
+    'current'. Only the thresholds and registers of settings in 'values'
+    are written, registers which also hold settings unknown in both are
+    left out, see :func:`channel_registers`.
+
+    :param current: the current configuration by setting name
+    :type current: dict
+    :param values: the changed settings by setting name
+    :type values: dict
+    :param thresholds_known: False to set the thresholds in 'values' even
+        if they equal the current ones, e.g. if those are not read from
+        the card
+    :type thresholds_known: bool
+    :param registers_known: False to write the registers of the settings
+        in 'values' even if they equal the current ones
+    :type registers_known: bool
+    :returns: list of str
+    """
+    desired_thresholds = [values.get("threshold_ch%d" % i)
+                          for i in range(4)]
+    current_thresholds = ([current.get("threshold_ch%d" % i)
+                           for i in range(4)]
+                          if thresholds_known else [None] * 4)
+
+    commands = _threshold_commands(current_thresholds, desired_thresholds)
+
+    desired = dict(current)
+    desired.update((name, value) for name, value in values.items()
+                   if value is not None)
+
+    desired_registers = channel_registers(desired)
+    current_registers = (channel_registers(current)
+                         if registers_known else dict())
+
+    # the high byte of the gate width first
+    for register in sorted(CHANNEL_REGISTERS, reverse=True):
+        if register not in desired_registers or \
+                not any(name in values
+                        for name in REGISTER_SETTINGS[register]):
+            continue
+        if current_registers.get(register) != desired_registers[register]:
+            commands.append("WC %02X %02X" % (register,
+                                              desired_registers[register]))
+
+    return commands
+
+
+class DAQRegisterWriter(object):
+    """
+    Changes the configuration of the DAQ card with the least commands.
+
+    The DAQ state only takes the new values from the readback, which
+    passes through the raw messages as every reply does. Until then the
+    values written are kept as pending, so the next write is compared
+    with them rather than with the configuration they replace.
+
+    :param logger: logger object
+    :type logger: logging.Logger
+    :param state: the current configuration of the card
+    :type state: muonic_gui.daq.state.DAQState
+    :param command_queue: sends the batches
+    :type command_queue: muonic_gui.daq.commands.DAQCommandQueue
+    """
+
+    def __init__(self, logger, state, command_queue):
+        self.logger = logger
+        self.state = state
+        self.command_queue = command_queue
+        # values written but not confirmed yet by name, with their batch
+        self._pending = dict()
+        self._batches = itertools.count()
+        self._lock = threading.Lock()
+
+    def write(self, values, commands=()):
+        """
+        Change the settings in 'values', all others keep their current
+        value. Settings which are None are not written.
+
+        :param values: the changed configuration by setting name
+        :type values: dict
+        :param commands: further commands sent first in the same batch,
+            e.g. CE
+        :type commands: list of str
+        :returns: concurrent.futures.Future -- of the batch, see
+            :meth:`muonic_gui.daq.commands.DAQCommandQueue.submit`
+        """
+        current = self.state.values()
+        unknown = [name for name, value in values.items()
+                   if name in current and value is None]
+        values = dict((name, value) for name, value in values.items()
+                      if name in current and value is not None)
+
+        if unknown:
+            self.logger.warning("Not writing unknown DAQ settings: %s" %
+                                ", ".join(sorted(unknown)))
+
+        with self._lock:
+            batch = next(self._batches)
+            current.update((name, value) for name, (_, value)
+                           in self._pending.items())
+
+            writes = register_commands(
+                    current, values,
+                    thresholds_known=self.state.reported("TL"),
+                    registers_known=self.state.reported("DC"))
+
+            desired = dict(current)
+            desired.update(values)
+            incomplete = [register for register in CHANNEL_REGISTERS
+                          if not _known(desired, register) and
+                          any(name in values
+                              for name in REGISTER_SETTINGS[register])]
+            self._pending.update((name, (batch, value))
+                                 for name, value in values.items())
+
+        if incomplete:
+            self.logger.warning("Not writing DAQ registers %s, their "
+                                "configuration is unknown" %
+                                ", ".join(str(register)
+                                          for register in incomplete))
+
+        readback = []
+        if any(command.startswith("TL") for command in writes):
+            readback.append("TL")
+        if any(command.startswith("WC") for command in writes):
+            readback.append("DC")
+
+        if writes:
+            self.logger.info("Writing DAQ configuration: %s" %
+                             ", ".join(writes))
+        else:
+            self.logger.debug("DAQ configuration unchanged")
+
+        written = dict((int(command.split()[1], 16),
+                        int(command.split()[2], 16))
+                       for command in writes if command.startswith("WC"))
+
+        future = self.command_queue.submit(list(commands) + writes, readback)
+        future.add_done_callback(functools.partial(self._confirm, batch,
+                                                   values, written))
+
+        return future
+
+    def _confirm(self, batch, values, written, future):
+        """
+        Compare the readback of a batch with the settings written. The
+        values of the batch are no longer pending, the DAQ state holds
+        what the card replied.
+
+        :param batch: the number of the batch
+        :type batch: int
+        :param values: the settings written
+        :type values: dict
+        :param written: the register values written by register number
+        :type written: dict
+        :param future: the future of the batch
+        :type future: concurrent.futures.Future
+        :returns: None
+        """
+        with self._lock:
+            for name in list(self._pending):
+                if self._pending[name][0] == batch:
+                    del self._pending[name]
+
+        if future.cancelled():
+            return
+
+        try:
+            replies = future.result()
+        except Exception as e:
+            self.logger.warning("Failed to confirm the DAQ configuration: "
+                                "%s" % e)
+            return
+
+        mismatches = []
+
+        if "TL" in replies:
+            fields = dict(field.split("=")
+                          for field in replies["TL"].split()[1:])
+            for i in range(4):
+                threshold = values.get("threshold_ch%d" % i)
+                if threshold is not None and \
+                        int(fields.get("L%d" % i, -1)) != threshold:
+                    mismatches.append("threshold_ch%d" % i)
+
+        if "DC" in replies:
+            registers = parse_registers(replies["DC"])
+            for register, value in written.items():
+                if registers.get(register) != value:
+                    mismatches.append("register %d" % register)
+
+        if mismatches:
+            self.logger.warning("The DAQ card did not take %s" %
+                                ", ".join(mismatches))
+        elif replies:
+            self.logger.debug("DAQ configuration confirmed")
@@ -0,0 +1,768 @@
+"""
+Provides a simulated DAQ card which produces the messages of the real card
+without any hardware, e.g. for load and latency tests.
+
+The card can be used in process as a DAQ provider of a muonic App, or be
+served over a pseudo terminal or a local TCP socket, where it stands in for
+the serial interface of the real card::
+
+    python -m muonic_gui.daq.simulator --pty
+    python -m muonic_gui.daq.simulator --port 5000
+"""
+import argparse
+import datetime
+import logging
+import os
+import queue
+import random
+import select
+import socket
+import threading
+import time
+
+from muonic.daq.provider import BaseDAQProvider
+
+__all__ = ["EventGenerator", "DAQCardSimulator", "SimulatedDAQProvider",
+           "PTYSimulator", "SocketSimulator"]
+
+
+class EventGenerator(object):
+    """
+    Generates the data lines of random muon events in the line format of
+    the DAQ card: trigger count, rising and falling edges of the four
+    channels, 1PPS count, GPS time and date, GPS status and time correction.
+
+    Decays are simulated as a second pulse in channel 0 after an
+    exponentially distributed time.
+
+    :param rate: mean number of muons per second
+    :type rate: float
+    :param decay_rate: mean number of decays per second
+    :type decay_rate: float
+    :param lifetime: mean lifetime of the decays in microseconds
+    :type lifetime: float
+    :param counter: start value of the trigger counter, e.g. close to
+        0xFFFFFFFF to test the rollover, random if None
+    :type counter: int
+    :param seed: seed of the random generator
+    :type seed: int
+    """
+    # the counter of the card runs with 25 MHz
+    CLOCK_PERIOD = 40.
+    CLOCK_FREQUENCY = 25000000
+    COUNTER_MASK = 0xFFFFFFFF
+    # the edges are given in 1/32 of a clock period
+    TMC_STEP = CLOCK_PERIOD / 32.
+    # flags in the edge bytes
+    EDGE_VALID = 0x20
+    NEW_TRIGGER = 0x80
+
+    def __init__(self, rate=10., decay_rate=0.5, lifetime=2.197,
+                 counter=None, seed=None):
+        self.rate = rate
+        self.decay_rate = decay_rate
+        self.lifetime = lifetime
+
+        self._random = random.Random(seed)
+        # counter value of the card, continues between events
+        if counter is None:
+            counter = self._random.randrange(self.COUNTER_MASK + 1)
+        self.counter = counter
+        self.time = datetime.datetime.utcnow()
+
+        # set from the registers of the card
+        self.channels = [0, 1, 2, 3]
+        self.coincidence = 1
+        self.gate_width = 10000.
+
+        self.satellites = 7
+        self.events = 0
+
+    def _edges(self, start, width, channels):
+        """
+        The edge bytes of a pulse, keyed by clock tick relative to the
+        trigger.
+
+        :param start: start of the pulse after the trigger in ns
+        :type start: float
+        :param width: pulse width in ns
+        :type width: float
+        :param channels: channels with the pulse
+        :type channels: list of int
+        :returns: dict -- clock tick to list of 8 edge bytes
+        """
+        ticks = dict()
+
+        for channel in channels:
+            for position, t in ((2 * channel, start),
+                                (2 * channel + 1, start + width)):
+                tick = int(t // self.CLOCK_PERIOD)
+                tmc = int((t % self.CLOCK_PERIOD) // self.TMC_STEP)
+                edges = ticks.setdefault(tick, [0] * 8)
+                edges[position] = self.EDGE_VALID | tmc
+
+        return ticks
+
+    def gps_fields(self, counter):
+        """
+        The 1PPS count, GPS time, date, status, number of satellites and
+        time correction at the current time. Like on the card, the GPS time
+        is the one of the last 1PPS, the time since then is given by the
+        difference of the counter and the 1PPS count.
+
+        :param counter: current value of the counter
+        :type counter: int
+        :returns: str
+        """
+        ticks_since_pps = int((self.time.microsecond / 1e6) *
+                              self.CLOCK_FREQUENCY)
+        pps = (counter - ticks_since_pps) & self.COUNTER_MASK
+
+        return "%08X %s000 %s A %02d 0 +0000" % (
+                pps, self.time.strftime("%H%M%S."),
+                self.time.strftime("%d%m%y"), self.satellites)
+
+    def format_line(self, counter, edges):
+        """
+        Format a data line of the card.
+
+        :param counter: value of the trigger counter
+        :type counter: int
+        :param edges: the 8 edge bytes RE0, FE0, ..., RE3, FE3
+        :type edges: list of int
+        :returns: str
+        """
+        return "%08X %s %s" % (counter,
+                               " ".join("%02X" % edge for edge in edges),
+                               self.gps_fields(counter))
+
+    def advance(self, seconds):
+        """
+        Let 'seconds' pass on the clock of the card.
+
+        :param seconds: the time to pass
+        :type seconds: float
+        :returns: None
+        """
+        self.time += datetime.timedelta(seconds=seconds)
+        self.counter = ((self.counter + int(seconds * self.CLOCK_FREQUENCY))
+                        & self.COUNTER_MASK)
+
+    def next_event(self, rate=None):
+        """
+        Generate the data lines of the next event. The time to the event is
+        exponentially distributed with the mean 1/rate.
+
+        :param rate: event rate, the muon rate if None
+        :type rate: float
+        :returns: tuple -- the lines, empty if the event did not fulfill
+            the coincidence condition, and the channels hit
+        """
+        self.advance(self._random.expovariate(rate or self.rate))
+
+        hit = sorted(self._random.sample(range(4),
+                                         self._random.randint(1, 4)))
+        channels = [channel for channel in hit if channel in self.channels]
+
+        if not channels or len(channels) < self.coincidence:
+            return [], []
+
+        self.events += 1
+
+        ticks = self._edges(self._random.uniform(0, self.CLOCK_PERIOD),
+                            self._random.uniform(10., 60.), channels)
+
+        if (0 in self.channels and
+                self._random.random() * self.rate < self.decay_rate):
+            decay_time = self._random.expovariate(1. / self.lifetime) * 1000.
+            if decay_time < self.gate_width:
+                for tick, edges in self._edges(
+                        decay_time, self._random.uniform(10., 60.),
+                        [0]).items():
+                    merged = ticks.setdefault(tick, [0] * 8)
+                    merged[0:2] = edges[0:2]
+
+        lines = []
+
+        for tick in sorted(ticks):
+            edges = ticks[tick]
+            if not lines:
+                edges[0] |= self.NEW_TRIGGER
+            lines.append(self.format_line(
+                    (self.counter + tick) & self.COUNTER_MASK, edges))
+
+        return lines, channels
+
+
+class DAQCardSimulator(object):
+    """
+    Line protocol of the DAQ card on top of an event generator.
+
+    Understood commands:
+
+    - CE and CD: enable and disable the counters and the data lines
+    - DS: scalars as 'DS S0=... S4=...', RB resets them
+    - TL: thresholds as 'TL L0=... L3=...', 'TL <channel> <mV>' sets the
+      threshold of a channel, channel 4 sets all
+    - DC: registers as 'DC C0=... C3=...', 'WC <register> <value>' sets a
+      register; enabled channels, coincidence and gate width are applied to
+      the generated events
+    - DG: GPS dump from 'Date+Time:' to 'ChkSumErr:'
+    - ST: one status line, 'ST <seconds>' sends them periodically
+
+    :param generator: the event generator
+    :type generator: EventGenerator
+    :param counting: start with enabled counters
+    :type counting: bool
+    """
+    # all channels in singles mode and a gate width of 100 ns
+    REGISTERS = [0x0F, 0x71, 0x0A, 0x00]
+
+    def __init__(self, generator=None, counting=True):
+        self.generator = generator or EventGenerator()
+        self.counting = counting
+
+        self.registers = list(self.REGISTERS)
+        self.thresholds = [300] * 4
+        self.scalars = [0] * 5
+        self.status_interval = 0
+        self.bursts = []
+
+        self._last_status = self.generator.time
+        self._lock = threading.Lock()
+        self._apply_registers()
+
+    def _apply_registers(self):
+        """
+        Configure the generator from registers 0, 2 and 3.
+
+        :returns: None
+        """
+        c0 = self.registers[0]
+
+        self.generator.channels = [i for i in range(4) if c0 & (1 << i)]
+        self.generator.coincidence = ((c0 >> 4) & 0x3) + 1
+        self.generator.gate_width = ((self.registers[3] << 8 |
+                                      self.registers[2]) * 10.)
+
+    def inject_burst(self, events, rate=100000.):
+        """
+        Emit 'events' events at 'rate' before continuing with the normal
+        rate, e.g. to test how the pipeline copes with an air shower.
+
+        :param events: number of events in the burst
+        :type events: int
+        :param rate: event rate during the burst
+        :type rate: float
+        :returns: None
+        """
+        with self._lock:
+            self.bursts.append([events, rate])
+
+    def handle(self, command):
+        """
+        Execute a command and get the reply.
+
+        :param command: the command
+        :type command: str
+        :returns: list of str -- the reply lines
+        """
+        fields = command.strip().split()
+
+        if not fields:
+            return []
+
+        name, args = fields[0].upper(), fields[1:]
+
+        with self._lock:
+            if name == "CE":
+                self.counting = True
+            elif name == "CD":
+                self.counting = False
+            elif name == "RB":
+                self.scalars = [0] * 5
+            elif name == "DS":
+                return [self.scalars_line()]
+            elif name == "TL":
+                if len(args) == 2:
+                    channel, value = int(args[0]), int(args[1])
+                    for i in (range(4) if channel == 4 else [channel]):
+                        self.thresholds[i] = value
+                return ["TL " + " ".join("L%d=%d" % (i, value) for i, value
+                                         in enumerate(self.thresholds))]
+            elif name == "DC":
+                return ["DC " + " ".join("C%d=%02X" % (i, value)
+                                         for i, value
+                                         in enumerate(self.registers))]
+            elif name == "WC" and len(args) == 2:
+                register, value = int(args[0], 16), int(args[1], 16)
+                if register < len(self.registers):
+                    self.registers[register] = value & 0xFF
+                    self._apply_registers()
+            elif name == "DG":
+                return self.gps_dump()
+            elif name == "ST":
+                if args:
+                    self.status_interval = int(args[0])
+                    self._last_status = self.generator.time
+                return [self.status_line()]
+
+        return []
+
+    def scalars_line(self):
+        """
+        The DS reply with the counts of the channels and of the triggers.
+
+        :returns: str
+        """
+        return "DS " + " ".join("S%d=%08X" % (i, count & 0xFFFFFFFF)
+                                for i, count in enumerate(self.scalars))
+
+    def status_line(self):
+        """
+        A status line with the scalars and the GPS fields.
+
+        :returns: str
+        """
+        return "ST %s %s" % (
+                " ".join("%08X" % (count & 0xFFFFFFFF)
+                         for count in self.scalars),
+                self.generator.gps_fields(self.generator.counter))
+
+    def gps_dump(self):
+        """
+        The reply to DG.
+
+        :returns: list of str
+        """
+        gps_time = self.generator.time
+        return ["Date+Time: %s" % gps_time.strftime("%d/%m/%y %H:%M:%S.") +
+                "%03d" % (gps_time.microsecond // 1000),
+                "Status:    A (valid)",
+                "PosFix#:   1",
+                "Latitude:  51:14.7420N",
+                "Longitude: 007:09.0960E",
+                "Altitude:  150.3m",
+                "Sats used: %02d" % self.generator.satellites,
+                "PPS delay: 00000 nsec",
+                "FPGA time: %08X" % self.generator.counter,
+                "FPGA 1PPS: %s" % self.generator.gps_fields(
+                        self.generator.counter).split()[0],
+                "ChkSumErr: 0"]
+
+    def next_lines(self):
+        """
+        Advance to the next event and get the lines the card sends until
+        then: the data lines of the event and periodic status lines.
+
+        :returns: list of str
+        """
+        with self._lock:
+            rate = None
+            if self.bursts:
+                burst = self.bursts[0]
+                rate = burst[1]
+                burst[0] -= 1
+                if burst[0] <= 0:
+                    self.bursts.pop(0)
+
+            lines, channels = self.generator.next_event(rate)
+
+            if not self.counting:
+                lines = []
+            elif lines:
+                for channel in channels:
+                    self.scalars[channel] += 1
+                self.scalars[4] += 1
+
+            if (self.status_interval > 0 and
+                    (self.generator.time - self._last_status).total_seconds()
+                    >= self.status_interval):
+                self._last_status = self.generator.time
+                lines.append(self.status_line())
+
+            return lines
+
+    def serve(self, emit, stop_event, realtime=True):
+        """
+        Pass the lines of the card to 'emit' until 'stop_event' is set.
+
+        :param emit: called with every line
+        :type emit: callable
+        :param stop_event: ends the loop
+        :type stop_event: threading.Event
+        :param realtime: keep the simulated time in step with the wall
+            clock, otherwise the lines are emitted as fast as 'emit' takes
+            them
+        :type realtime: bool
+        :returns: None
+        """
+        start = time.perf_counter()
+        simulated_start = self.generator.time
+
+        while not stop_event.is_set():
+            lines = self.next_lines()
+
+            if realtime:
+                elapsed = (self.generator.time -
+                           simulated_start).total_seconds()
+                wait = elapsed - (time.perf_counter() - start)
+                if wait > 0 and stop_event.wait(wait):
+                    break
+
+            for line in lines:
+                emit(line)
+
+
+class SimulatedDAQProvider(BaseDAQProvider):
+    """
+    DAQ provider running a simulated card in a background thread. It can
+    replace the provider of a muonic App.
+
+    With 'realtime' the events are emitted at the rate of the generator.
+    Otherwise they are emitted as fast as they are taken, so the provider
+    measures the capacity of whatever reads from it.
+
+    :param logger: logger object
+    :type logger: logging.Logger
+    :param generator: the event generator
+    :type generator: EventGenerator
+    :param realtime: emit the events in real time
+    :type realtime: bool
+    :param max_lines: maximum number of lines waiting to be taken
+    :type max_lines: int
+    """
+
+    def __init__(self, logger, generator=None, realtime=False,
+                 max_lines=10000):
+        BaseDAQProvider.__init__(self, logger=logger)
+        self.logger = logger
+        self.card = DAQCardSimulator(generator)
+        self.generator = self.card.generator
+        self.realtime = realtime
+
+        self.lines = 0
+        self._queue = queue.Queue(maxsize=max_lines)
+
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def get(self, *args):
+        """
+        Get the next message. Takes the same arguments as queue.Queue.get.
+
+        :returns: str
+        :raises: queue.Empty
+        """
+        return self._queue.get(*args)
+
+    def put(self, *args):
+        """
+        Send a command to the simulated card.
+
+        :returns: None
+        """
+        for line in self.card.handle(args[0]):
+            self._emit(line)
+
+    def data_available(self):
+        """
+        Returns True if messages are waiting.
+
+        :returns: bool
+        """
+        return not self._queue.empty()
+
+    def _emit(self, line):
+        """
+        Queue a message, waiting for room if the reader falls behind.
+
+        :param line: the message
+        :type line: str
+        :returns: None
+        """
+        while not self._stop_event.is_set():
+            try:
+                self._queue.put(line, timeout=0.1)
+                self.lines += 1
+                return
+            except queue.Full:
+                continue
+
+    def start(self):
+        """
+        Start producing messages.
+
+        :returns: None
+        """
+        if self._thread is not None:
+            return
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+                target=self.card.serve,
+                args=(self._emit, self._stop_event, self.realtime),
+                name="SimulatedDAQProvider")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop producing messages.
+
+        :returns: None
+        """
+        if self._thread is None:
+            return
+
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+
+
+class _StreamSimulator(object):
+    """
+    Base class serving a simulated card over a byte stream. Lines are
+    terminated with CR LF like on the serial interface of the card.
+
+    :param logger: logger object
+    :type logger: logging.Logger
+    :param card: the simulated card
+    :type card: DAQCardSimulator
+    """
+
+    def __init__(self, logger, card=None):
+        self.logger = logger
+        self.card = card or DAQCardSimulator()
+
+        self._stop_event = threading.Event()
+        self._write_lock = threading.Lock()
+        self._threads = []
+
+    def _write(self, data):
+        """
+        Write bytes to the stream.
+
+        :param data: the bytes
+        :type data: bytes
+        :returns: None
+        """
+        raise NotImplementedError()
+
+    def _read(self):
+        """
+        Read bytes from the stream, empty at the end of the stream and None
+        if nothing arrived for a while.
+
+        :returns: bytes or None
+        """
+        raise NotImplementedError()
+
+    def send(self, line):
+        """
+        Send a line to the reader.
+
+        :param line: the line
+        :type line: str
+        :returns: None
+        """
+        with self._write_lock:
+            self._write((line + "\r\n").encode("ascii"))
+
+    def _read_commands(self):
+        """
+        Read loop executing the commands written to the stream.
+
+        :returns: None
+        """
+        pending = b""
+
+        while not self._stop_event.is_set():
+            try:
+                data = self._read()
+            except OSError:
+                break
+
+            if data is None:
+                continue
+            if not data:
+                break
+
+            pending += data.replace(b"\r", b"\n")
+
+            while b"\n" in pending:
+                line, pending = pending.split(b"\n", 1)
+                for reply in self.card.handle(line.decode("ascii", "replace")):
+                    self.send(reply)
+
+    def _serve(self):
+        """
+        Send the lines of the card until stopped or the reader is gone.
+
+        :returns: None
+        """
+        try:
+            self.card.serve(self.send, self._stop_event, realtime=True)
+        except OSError as e:
+            self.logger.info("Simulated DAQ card disconnected: %s" % e)
+
+    def start(self):
+        """
+        Start serving the card in background threads.
+
+        :returns: None
+        """
+        self._stop_event.clear()
+        self._threads = [threading.Thread(target=self._read_commands,
+                                          name="DAQSimulatorCommands"),
+                         threading.Thread(target=self._serve,
+                                          name="DAQSimulatorLines")]
+        for thread in self._threads:
+            thread.daemon = True
+            thread.start()
+
+    def stop(self):
+        """
+        Stop serving the card.
+
+        :returns: None
+        """
+        self._stop_event.set()
+        for thread in self._threads:
+            thread.join(timeout=1.0)
+        self._threads = []
+
+
+class PTYSimulator(_StreamSimulator):
+    """
+    Serves a simulated card on a pseudo terminal. Open :attr:`device` in
+    place of the serial port of the real card.
+
+    :param logger: logger object
+    :type logger: logging.Logger
+    :param card: the simulated card
+    :type card: DAQCardSimulator
+    """
+
+    def __init__(self, logger, card=None):
+        _StreamSimulator.__init__(self, logger, card)
+
+        # only available on unix
+        import tty
+
+        self._master, self._slave = os.openpty()
+        # no echo and no line editing, like a serial port
+        tty.setraw(self._slave)
+        self.device = os.ttyname(self._slave)
+
+    def _write(self, data):
+        os.write(self._master, data)
+
+    def _read(self):
+        if not select.select([self._master], [], [], 0.1)[0]:
+            return None
+        return os.read(self._master, 1024)
+
+    def stop(self):
+        _StreamSimulator.stop(self)
+        os.close(self._master)
+        os.close(self._slave)
+
+
+class SocketSimulator(_StreamSimulator):
+    """
+    Serves a simulated card to one client at a time on a local TCP socket.
+
+    :param logger: logger object
+    :type logger: logging.Logger
+    :param card: the simulated card
+    :type card: DAQCardSimulator
+    :param port: the port, a free one if 0
+    :type port: int
+    :param host: the address to listen on
+    :type host: str
+    """
+
+    def __init__(self, logger, card=None, port=0, host="127.0.0.1"):
+        _StreamSimulator.__init__(self, logger, card)
+
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind((host, port))
+        self._server.listen(1)
+        self.address = self._server.getsockname()
+
+        self._connection = None
+
+    def _write(self, data):
+        self._connection.sendall(data)
+
+    def _read(self):
+        try:
+            return self._connection.recv(1024)
+        except socket.timeout:
+            return None
+
+    def start(self):
+        """
+        Wait for a client and serve the card to it.
+
+        :returns: None
+        """
+        self._connection, peer = self._server.accept()
+        self._connection.settimeout(0.1)
+        self.logger.info("Serving simulated DAQ card to %s:%d" % peer)
+        _StreamSimulator.start(self)
+
+    def stop(self):
+        _StreamSimulator.stop(self)
+        if self._connection is not None:
+            self._connection.close()
+        self._server.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+            description="Simulated DAQ card on a pseudo terminal or a local "
+                        "TCP socket")
+    parser.add_argument("--pty", action="store_true",
+                        help="serve the card on a pseudo terminal")
+    parser.add_argument("--port", type=int, default=0,
+                        help="serve the card on this TCP port")
+    parser.add_argument("--rate", type=float, default=10.,
+                        help="muon rate in Hz")
+    parser.add_argument("--decay-rate", type=float, default=0.5,
+                        help="decay rate in Hz")
+    parser.add_argument("--counter", type=lambda value: int(value, 0),
+                        default=None,
+                        help="start value of the trigger counter, e.g. "
+                             "0xFFF00000 to test the rollover")
+    parser.add_argument("--burst-every", type=float, default=0.,
+                        help="inject a burst every given number of seconds")
+    parser.add_argument("--burst-size", type=int, default=1000,
+                        help="number of events in a burst")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger("muonic_gui.simulator")
+
+    card = DAQCardSimulator(EventGenerator(rate=args.rate,
+                                           decay_rate=args.decay_rate,
+                                           counter=args.counter))
+
+    if args.pty:
+        simulator = PTYSimulator(logger, card)
+        logger.info("Simulated DAQ card on %s" % simulator.device)
+    else:
+        simulator = SocketSimulator(logger, card, port=args.port)
+        logger.info("Simulated DAQ card waiting on %s:%d" % simulator.address)
+
+    simulator.start()
+
+    try:
+        while True:
+            time.sleep(args.burst_every or 1.)
+            if args.burst_every:
+                card.inject_burst(args.burst_size)
+    except KeyboardInterrupt:
+        simulator.stop()
@@ -0,0 +1,231 @@
+"""
+Provides a cached model of the configuration of the DAQ card.
+
+The thresholds, enabled channels, coincidence, veto and gate width are
+read from the TL and DC replies in the stream of raw DAQ messages, no
+matter who sent the command, and from the settings changed in the dialogs.
+Readers take the cached values instead of asking the card or the settings
+one key at a time, and subscribers are called whenever a value changes.
+"""
+import threading
+
+from muonic_gui.daq.commands import parse_channel_config, parse_thresholds
+
+__all__ = ["DAQState"]
+
+# first words of the TL and DC replies
+THRESHOLDS_REPLY = "TL L0="
+CHANNEL_CONFIG_REPLY = "DC C0="
+
+
+class DAQState(object):
+    """
+    The configuration of the DAQ card by the names of the muonic settings.
+    Thread safe, values are usually fed from the acquisition thread and read
+    from the GUI thread.
+
+    Subscribers are called with a dict of all values and the set of the
+    names which changed, in the thread feeding the change. Values are None
+    until they are known.
+
+    :param logger: logger object
+    :type logger: logging.Logger
+    :param values: initial values, e.g. from the settings
+    :type values: dict
+    """
+    SETTINGS = (["threshold_ch%d" % i for i in range(4)] +
+                ["active_ch%d" % i for i in range(4)] +
+                ["coincidence%d" % i for i in range(4)] +
+                ["veto"] + ["veto_ch%d" % i for i in range(3)] +
+                ["gate_width"])
+
+    def __init__(self, logger, values=None):
+        self.logger = logger
+
+        self._values = dict.fromkeys(self.SETTINGS)
+        # the replies seen, i.e. 'TL' and 'DC'
+        self._reported = set()
+        self._subscribers = []
+        self._lock = threading.Lock()
+
+        if values is not None:
+            self.update(values)
+
+    def subscribe(self, callback):
+        """
+        Call 'callback' with all values and the names of the changed ones
+        whenever a value changes.
+
+        :param callback: the subscriber
+        :type callback: callable
+        :returns: None
+        """
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        """
+        Stop calling 'callback'.
+
+        :param callback: the subscriber
+        :type callback: callable
+        :returns: None
+        """
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def feed(self, line):
+        """
+        Read a raw message of the DAQ card. TL and DC replies update the
+        values.
+
+        :param line: the raw message
+        :type line: str
+        :returns: None
+        """
+        if line.startswith(THRESHOLDS_REPLY):
+            command = "TL"
+            try:
+                values = dict(("threshold_ch%d" % i, threshold)
+                              for i, threshold in
+                              enumerate(parse_thresholds(line)))
+            except (KeyError, ValueError) as e:
+                self.logger.debug("Failed to parse '%s': %s" % (line, e))
+                return
+        elif line.startswith(CHANNEL_CONFIG_REPLY):
+            command = "DC"
+            try:
+                values = parse_channel_config(line)
+            except (KeyError, ValueError) as e:
+                self.logger.debug("Failed to parse '%s': %s" % (line, e))
+                return
+        else:
+            return
+
+        self.update(values, reported=command)
+
+    def update(self, values, reported=None):
+        """
+        Set values, e.g. after changing the settings. Names which are not
+        part of the configuration are ignored.
+
+        :param values: the values by setting name
+        :type values: dict
+        :param reported: the reply the values were read from, if any
+        :type reported: str
+        :returns: set -- the names of the changed values
+        """
+        with self._lock:
+            if reported is not None:
+                self._reported.add(reported)
+
+            changed = set(name for name, value in values.items()
+                          if name in self._values and
+                          self._values[name] != value)
+
+            if not changed:
+                return changed
+
+            for name in changed:
+                self._values[name] = values[name]
+
+            current = dict(self._values)
+            subscribers = list(self._subscribers)
+
+        for callback in subscribers:
+            try:
+                callback(current, changed)
+            except Exception as e:
+                self.logger.error("DAQ state subscriber failed: %s" % e)
+
+        return changed
+
+    def reported(self, command):
+        """
+        Returns True if the card replied to 'command' at least once, so the
+        values read from its reply are known.
+
+        :param command: 'TL' or 'DC'
+        :type command: str
+        :returns: bool
+        """
+        with self._lock:
+            return command in self._reported
+
+    def get(self, name):
+        """
+        The value of setting 'name'.
+
+        :param name: the setting name
+        :type name: str
+        :returns: int or bool or None
+        """
+        with self._lock:
+            return self._values[name]
+
+    def values(self):
+        """
+        All values by setting name.
+
+        :returns: dict
+        """
+        with self._lock:
+            return dict(self._values)
+
+    @property
+    def thresholds(self):
+        """
+        The thresholds of the four channels in mV
+
+        :returns: list of int
+        """
+        values = self.values()
+        return [values["threshold_ch%d" % i] for i in range(4)]
+
+    @property
+    def active_channels(self):
+        """
+        Enabled state of the four channels
+
+        :returns: list of bool
+        """
+        values = self.values()
+        return [bool(values["active_ch%d" % i]) for i in range(4)]
+
+    @property
+    def coincidence(self):
+        """
+        Index of the coincidence level, 0 for singles up to 3 for fourfold
+
+        :returns: int or None
+        """
+        values = self.values()
+        for i in range(4):
+            if values["coincidence%d" % i]:
+                return i
+        return None
+
+    @property
+    def veto_channel(self):
+        """
+        Index of the veto channel, None without veto
+
+        :returns: int or None
+        """
+        values = self.values()
+        if not values["veto"]:
+            return None
+        for i in range(3):
+            if values["veto_ch%d" % i]:
+                return i
+        return None
+
+    @property
+    def gate_width(self):
+        """
+        The gate width in ns
+
+        :returns: int or None
+        """
+        return self.get("gate_width")
@@ -5,11 +5,14 @@ Provides the main window for the gui part of muonic
 from os import path
 from PyQt5.QtWidgets import *
 import datetime
+import functools
 import threading
 import time
 import uuid
 import webbrowser
 
+import numpy as np
+
 from PyQt5 import QtGui, QtWidgets
 from PyQt5 import QtCore, QtWidgets
 
@@ -18,9 +21,25 @@ from muonic import __docs_hosted_at__, __manual_hosted_at__
 # from muonic.analysis import PulseExtractor
 # from muonic.daq import DAQIOError
 from muonic.lib.app import App
-from muonic.lib.analyzers import BaseAnalyzer, DummyAnalyzer, RateAnalyzer, PulseAnalyzer, DecayAnalyzer, VelocityAnalyzer
-from muonic.lib.consumers import AbstractMuonicConsumer, BufferedConsumer
+from muonic.lib.consumers import BufferedConsumer
+from muonic_gui.daq.commands import DAQCommander, DAQCommandQueue
+from muonic_gui.daq.commands import DAQTimeoutError
+from muonic_gui.daq.gps import GPSMonitor
+from muonic_gui.daq.registers import DAQRegisterWriter
+from muonic_gui.daq.state import DAQState
 from muonic_gui.gui.helpers import set_large_plot_style
+from muonic_gui.lib.pipeline import PipelineConsumer, create_analyzers
+from muonic_gui.lib.pipeline import wrap_consumer
+from muonic_gui.lib.archive import EventArchiveWriter
+from muonic_gui.lib.daqlog import DAQMessageLog
+from muonic_gui.lib.profiling import SamplingProfiler
+from muonic_gui.lib.snapshot import SessionSnapshot
+from muonic_gui.lib.tracing import TRACER
+from muonic_gui.lib.writers import AsyncFileWriter, RecordConsumer
+from muonic_gui.lib.writers import DATA_DIRECTORY, data_filename
+from muonic_gui.gui.plot_canvases import BasePlotCanvas
+from muonic_gui.plots.budget import RenderBudget
+from muonic_gui.plots.text import benchmark_text_rendering
 from muonic_gui.gui.dialogs import ThresholdDialog, ConfigDialog
 from muonic_gui.gui.dialogs import HelpDialog, AdvancedDialog
 from muonic_gui.gui.widgets import VelocityWidget, PulseAnalyzerWidget
@@ -31,7 +50,7 @@ from muonic_gui.gui.widgets import GPSWidget, StatusWidget
 # from muonic.util import get_data_directory
 
 
-class Application(AbstractMuonicConsumer, QtWidgets.QMainWindow):
+class Application(PipelineConsumer, QtWidgets.QMainWindow):
     """
     The GUI main application
 
@@ -40,15 +59,49 @@ class Application(AbstractMuonicConsumer, QtWidgets.QMainWindow):
     :param opts: command line options
     :type opts: Namespace
     """
+    # messages moved to the DAQ message log per update and update interval
+    # in ms, adding to the log is cheap, so the batches can be large
+    DAQ_LOG_BATCH_SIZE = 5000
+    DAQ_LOG_INTERVAL = 250
+    # number of DAQ messages kept for the DAQ widget, about an hour of
+    # messages of a busy card
+    DAQ_MESSAGE_LOG_LENGTH = 4000000
+    # interval in ms for moving analyzer results to the widgets
+    EVENT_INTERVAL = 100
+    # seconds to wait for the reply to a DAQ command
+    DAQ_REPLY_TIMEOUT = 2.0
+    # seconds between two commands changing the configuration of the card
+    DAQ_COMMAND_INTERVAL = 0.02
+
+    # default seconds to profile for
+    PROFILING_DURATION = 30
+
+    # seconds to wait for the first DAQ message before enabling the settings
+    DAQ_READY_TIMEOUT = 5.0
+
+    # default seconds between two session snapshots
+    SNAPSHOT_INTERVAL = 60
+
+    # default seconds between two readouts of the GPS
+    GPS_INTERVAL = 60
+
+    # delivers DAQ replies from the acquisition thread to the GUI thread
+    daqReplyReceived = QtCore.pyqtSignal(object, object)
+    # emitted once when the first message of the DAQ card arrives
+    daqReady = QtCore.pyqtSignal()
+
     def __init__(self, logger, opts, consumers):
 
         # call parent class init functions
         # App.__init__(self, opts, analyzers, logger)
-        AbstractMuonicConsumer.__init__(self, logger=logger)
+        PipelineConsumer.__init__(self, logger)
         QtWidgets.QMainWindow.__init__(self)
 
         # start time of the application
         self.start_time = datetime.datetime.utcnow()
+        # for measuring the time until the window is shown
+        self._init_start = time.perf_counter()
+        self._first_shown = False
 
         QtCore.QLocale.setDefault(QtCore.QLocale("en_us"))
         self.setWindowTitle("muonic")
@@ -63,6 +116,11 @@ class Application(AbstractMuonicConsumer, QtWidgets.QMainWindow):
 
         # widget store for the tab widgets to reference later
         self._widgets = dict()
+        # factories and placeholders of the tabs not created yet
+        self._widget_factories = dict()
+
+        # histogram aggregation on the acquisition side, set up below
+        self.aggregator = None
 
         # setup status bar
         self.status_bar = QtWidgets.QMainWindow.statusBar(self)
@@ -70,7 +128,56 @@ class Application(AbstractMuonicConsumer, QtWidgets.QMainWindow):
         # detected pulses
         self.pulses = None
 
+        # latency tracing from DAQ line to plot, can be switched on in the
+        # status tab as well
+        TRACER.set_enabled(bool(opts.get("trace", False)))
+
+        # samples the acquisition and GUI threads on request, see
+        # the profiling entry of the settings menu
+        self.profiler = SamplingProfiler(logger)
+        self.profiling_timer = QtCore.QTimer()
+        self.profiling_timer.setSingleShot(True)
+        self.profiling_timer.timeout.connect(self.finish_profiling)
+
+        # data files are written in the background, the analyzer results
+        # go there straight from the acquisition thread
+        self.writer = AsyncFileWriter(logger)
+        self.writer.start()
+        self.records = RecordConsumer(
+                logger, write_daq_status=bool(opts.get("write_daq_status")))
+        self.pulse_file = None
+
+        # binary archive of the extracted events if requested
+        self.archive = None
+
+        if opts.get("event_archive"):
+            self.archive = EventArchiveWriter(
+                    logger, path.join(DATA_DIRECTORY, "%s_EVENTS" % (
+                        self.start_time.strftime("%Y-%m-%d_%H-%M-%S"))),
+                    date=self.start_time.date())
+            self.records.set_archive(self.archive)
+
+        # the measurements are saved periodically and restored on the next
+        # start, the widgets take their part of the state when created
+        self.snapshot = SessionSnapshot(logger)
+        self.restored = dict()
+
+        if opts.get("restore_session", True):
+            self.restored = self.snapshot.load() or dict()
+
+        self.snapshot_timer = QtCore.QTimer()
+        self.snapshot_timer.timeout.connect(self.save_snapshot)
+
+        snapshot_interval = opts.get("snapshot_interval",
+                                     self.SNAPSHOT_INTERVAL)
+        if snapshot_interval:
+            self.snapshot_timer.start(int(snapshot_interval * 1000))
+
+        # adapts the plot decorations to the time spent drawing
+        self.render_budget = RenderBudget(logger)
+
         # create tabbed widgets
+        self.setup_render_budget()
         self.setup_tab_widgets(opts)
 
         self.setCentralWidget(self.tab_widget)
@@ -102,12 +209,28 @@ class Application(AbstractMuonicConsumer, QtWidgets.QMainWindow):
         #                        QtCore.SIGNAL("timeout()"),
         #                        self.update_dynamic)
 
-        self.daq_log = ""
-
+        # raw DAQ messages from the acquisition thread for the DAQ widget,
+        # collected from the start even if the widget is created later
+        self.daq_messages = DAQMessageLog(
+                max_lines=self.DAQ_MESSAGE_LOG_LENGTH)
         self.daq_log_timer = QtCore.QTimer()
         self.daq_log_timer.timeout.connect(self.update_raw_daq)
 
-        self.daq_log_timer.start(1500)
+        self.daq_log_timer.start(self.DAQ_LOG_INTERVAL)
+
+        # analyzer results from the acquisition thread, the widgets are only
+        # touched from the GUI thread when the event timer fires
+        self.event_handlers = {"rate": self.show_rate,
+                               "pulse": self.show_pulses,
+                               "decay": self.show_decay_times,
+                               "velocity": self.show_flight_times,
+                               "histogram": self.show_histograms,
+                               "gps": self.show_gps,
+                               "daq_state": self.show_daq_state}
+
+        self.event_timer = QtCore.QTimer()
+        self.event_timer.timeout.connect(self.process_events)
+        self.event_timer.start(self.EVENT_INTERVAL)
 
         self.logger.info("Time window is %4.2f" % opts.get("time_window"))
 
@@ -120,46 +243,361 @@ class Application(AbstractMuonicConsumer, QtWidgets.QMainWindow):
         # self.widget_updater.start(opts.time_window * 1000)
 
         self._consumers = consumers
-        self._consumers.append(self)
 
-        # bf = [BufferedConsumer(opts.get("buf_size"), *(self._consumers))]
+        # batching and histogram aggregation as requested in the options
+        consumer, self.aggregator = wrap_consumer(logger, self, opts)
+
+        if self.aggregator is not None:
+            self.aggregator.restore(self.restored.get("histograms", dict()))
+            self.setup_histogram_aggregation()
+
+        self._consumers.append(consumer)
+        self._consumers.append(self.records)
 
-        self._analyzers = [DummyAnalyzer(logger=logger, consumers=self._consumers, **opts),
-                           RateAnalyzer(logger=logger, consumers=self._consumers, **opts),
-                           PulseAnalyzer(logger=logger, consumers=self._consumers, **opts),
-                           DecayAnalyzer(logger=logger, consumers=self._consumers, **opts),
-                           VelocityAnalyzer(logger=logger, consumers=self._consumers, **opts)]
+        # the analyzers only run while a widget subscribed to their results
+        self._analyzers, self.registry = create_analyzers(
+                logger, self._consumers, opts)
 
-        for a in self._analyzers:
-            if isinstance(a, BaseAnalyzer) and not isinstance(a, DummyAnalyzer):
-                a.disabled = True
+        # the raw messages feed the DAQ log and the replies to commands
+        self.registry.subscribe("raw", self)
+
+        if opts.get("write_pulses"):
+            self.write_pulses(True)
+
+        if self.archive is not None:
+            self.registry.subscribe("pulse", self.records)
 
         self._app = App(options=opts, analyzers=self._analyzers, logger=logger)
-        self._app_thread = threading.Thread(target=self._app.run)
+
+        # the configuration of the card is cached from the TL and DC
+        # replies, starting with the settings until the card replied
+        self.daq_state = DAQState(logger, dict(
+                (name, self._app.get_setting(name))
+                for name in DAQState.SETTINGS))
+        self.daq_state.subscribe(
+                lambda values, changed: self.events.put("daq_state", values))
+
+        # replies to DAQ commands are matched in push_raw
+        self.daq_commands = DAQCommander(logger, self._app.daq.put)
+        self.daqReplyReceived.connect(self.on_daq_reply)
+
+        # changes of the configuration are sent as batches of the differing
+        # registers through one queue and read back once
+        self.daq_queue = DAQCommandQueue(logger, self.daq_commands,
+                                         interval=self.DAQ_COMMAND_INTERVAL,
+                                         timeout=self.DAQ_REPLY_TIMEOUT)
+        self.daq_writer = DAQRegisterWriter(logger, self.daq_state,
+                                            self.daq_queue)
+
+        # the GPS dumps are parsed from the raw messages, the GPS is read
+        # out periodically in the background
+        self.gps = GPSMonitor(logger, self._app.daq.put,
+                              interval=opts.get("gps_interval",
+                                                self.GPS_INTERVAL),
+                              callback=functools.partial(self.events.put,
+                                                         "gps"))
+        self.gps.start()
+        # the settings need the DAQ card, so they are enabled once it talks
+        self._daq_ready = False
+        self.daqReady.connect(self.on_daq_ready)
+        self.settings_menu.setEnabled(False)
+        self.status_bar.showMessage("Waiting for the DAQ card...")
+        QtCore.QTimer.singleShot(int(self.DAQ_READY_TIMEOUT * 1000),
+                                 self.on_daq_ready_timeout)
+
+        self._app_thread = threading.Thread(target=self._app.run,
+                                            name="acquisition")
         self._app_thread.start()
 
-        time.sleep(1.0)
+    def showEvent(self, ev):
+        """
+        Log the time from the start of the initialization until the window
+        is shown for the first time.
+
+        :param ev: event
+        :type ev: QtGui.QShowEvent
+        :returns: None
+        """
+        QtWidgets.QMainWindow.showEvent(self, ev)
+
+        if not self._first_shown:
+            self._first_shown = True
+            self.logger.info("Window shown %.0f ms after start" %
+                             ((time.perf_counter() - self._init_start) * 1000.))
+
+    def on_daq_ready(self):
+        """
+        Enable the settings once the DAQ card sends messages.
+
+        :returns: None
+        """
+        if self.settings_menu.isEnabled():
+            return
+
+        self.settings_menu.setEnabled(True)
+        self.status_bar.showMessage("DAQ card ready", 5000)
+
+        # read the configuration of the card once, the replies update the
+        # DAQ state
+        self._app.daq.put("TL")
+        self._app.daq.put("DC")
+
+    def on_daq_ready_timeout(self):
+        """
+        Enable the settings anyway if the DAQ card did not send anything in
+        time, the commands then fail with a timeout message.
+
+        :returns: None
+        """
+        if self._daq_ready:
+            return
+
+        self.logger.warning("No message from the DAQ card after %.0f s" %
+                            self.DAQ_READY_TIMEOUT)
+        self.on_daq_ready()
 
     def setup_tab_widgets(self, opts):
         """
-        Creates the widgets and adds tabs
+        Adds the tabs. The widgets are created when their tab is shown for
+        the first time or when they are requested with get_widget.
+
+        :returns: None
+        """
+        self.add_lazy_widget("rate", "Muon Rates",
+                             lambda: RateWidget(self.logger, opts,
+                                                parent=self))
+        self.add_lazy_widget("pulse", "Pulse Analyzer",
+                             lambda: PulseAnalyzerWidget(self.logger, opts,
+                                                         parent=self))
+        self.add_lazy_widget("decay", "Muon Decay",
+                             lambda: DecayWidget(self.logger, opts,
+                                                 parent=self))
+        self.add_lazy_widget("velocity", "Muon Velocity",
+                             lambda: VelocityWidget(self.logger, opts,
+                                                    parent=self))
+        self.add_lazy_widget("status", "Status",
+                             lambda: StatusWidget(self.logger, parent=self))
+        self.add_lazy_widget("daq", "DAQ Output",
+                             lambda: DAQWidget(self.logger, parent=self))
+        self.add_lazy_widget("gps", "GPS Output",
+                             lambda: GPSWidget(self.logger, parent=self))
+
+        self.tab_widget.currentChanged.connect(self.on_tab_changed)
+
+        # the first tab is shown right away
+        self.on_tab_changed(self.tab_widget.currentIndex())
+
+    def on_tab_changed(self, index):
+        """
+        Create the widget of the tab at 'index' if it is still a
+        placeholder.
+
+        :param index: the tab index
+        :type index: int
+        :returns: None
+        """
+        for name, (_, _, placeholder) in list(
+                self._widget_factories.items()):
+            if self.tab_widget.indexOf(placeholder) == index:
+                self.create_widget(name)
+
+    def create_widget(self, name):
+        """
+        Create the widget 'name' and put it in place of its placeholder.
+
+        :param name: widget name
+        :type name: str
+        :returns: object
+        """
+        factory, label, placeholder = self._widget_factories.pop(name)
+
+        start = time.perf_counter()
+        widget = factory()
+
+        # replacing the tab must not switch to and create another one
+        self.tab_widget.blockSignals(True)
+        current = self.tab_widget.currentIndex()
+        index = self.tab_widget.indexOf(placeholder)
+        self.tab_widget.removeTab(index)
+        self.tab_widget.insertTab(index, widget, label)
+        self.tab_widget.setCurrentIndex(current)
+        self.tab_widget.blockSignals(False)
+
+        placeholder.deleteLater()
+        self._widgets[name] = widget
+
+        self.setup_widget(name, widget)
+
+        self.logger.debug("Created tab '%s' in %.0f ms" %
+                          (label, (time.perf_counter() - start) * 1000.))
+
+        return widget
+
+    def setup_widget(self, name, widget):
+        """
+        Attach the render budget and the histogram aggregator to the plot
+        canvases of a newly created widget.
+
+        :param name: widget name
+        :type name: str
+        :param widget: the widget
+        :type widget: object
+        :returns: None
+        """
+        for canvas in widget.findChildren(BasePlotCanvas):
+            canvas.set_render_budget(self.render_budget)
+
+        self.restore_widget(name, widget)
+
+        if self.aggregator is not None:
+            for hist_name, canvas in self.get_histogram_canvases(
+                    [name]).items():
+                self.connect_histogram(hist_name, canvas)
+
+    def restore_widget(self, name, widget):
+        """
+        Restore the state of a newly created widget and of its histograms
+        from the session snapshot.
+
+        :param name: widget name
+        :type name: str
+        :param widget: the widget
+        :type widget: object
+        :returns: None
+        """
+        state = self.restored.get("widgets", dict()).pop(name, None)
+
+        if state is not None:
+            widget.restore_session_state(state)
+
+        histograms = self.restored.get("histograms", dict())
+
+        for hist_name, canvas in self.get_histogram_canvases([name]).items():
+            if hist_name not in histograms:
+                continue
+
+            if self.aggregator is None:
+                canvas.restore(histograms.pop(hist_name))
+            else:
+                # the aggregator has the contents, the canvas only needs
+                # the binning to ask for them
+                binning = histograms[hist_name]["binning"]
+                canvas.rebin((binning[0], binning[1], int(binning[2])))
+
+    def collect_session_state(self):
+        """
+        The state of all measurements for the session snapshot. Widgets
+        not created yet keep their restored state.
+
+        :returns: dict
+        """
+        widgets = dict(self.restored.get("widgets", dict()))
+
+        for name, widget in self._widgets.items():
+            widgets[name] = widget.get_session_state()
+
+        if self.aggregator is not None:
+            histograms = self.aggregator.get_state()
+        else:
+            histograms = dict(self.restored.get("histograms", dict()))
+
+            for name, canvas in self.get_histogram_canvases().items():
+                histograms[name] = canvas.get_state()
+
+        return {"widgets": widgets, "histograms": histograms}
+
+    def save_snapshot(self):
+        """
+        Save the state of all measurements to the session snapshot.
+
+        :returns: None
+        """
+        try:
+            self.snapshot.save(self.collect_session_state())
+        except (IOError, OSError) as e:
+            self.logger.error("Failed to save the session snapshot: %s" % e)
+
+    def get_histogram_canvases(self, names=("decay", "velocity", "pulse")):
+        """
+        The histogram canvases of the created widgets by the names used by
+        the aggregator.
+
+        :param names: names of the widgets to look at
+        :type names: list of str
+        :returns: dict
+        """
+        canvases = dict()
+
+        if "decay" in names and self.have_widget("decay"):
+            canvases["lifetime"] = self.get_widget("decay").plot_canvas
+
+        if "velocity" in names and self.have_widget("velocity"):
+            canvases["velocity"] = self.get_widget("velocity").plot_canvas
+
+        if "pulse" in names and self.have_widget("pulse"):
+            for i, canvas in enumerate(
+                    self.get_widget("pulse").pulse_width_canvases):
+                canvases["pulse_width_ch%d" % i] = canvas
+
+        return canvases
+
+    def connect_histogram(self, name, canvas):
+        """
+        Let a histogram canvas show the histogram 'name' of the aggregator
+        and rebin it there.
+
+        :param name: histogram name
+        :type name: str
+        :param canvas: the histogram canvas
+        :type canvas: muonic_gui.gui.plot_canvases.BaseHistogramCanvas
+        :returns: None
+        """
+        canvas.set_rebin_callback(functools.partial(self.aggregator.rebin,
+                                                    name))
+        # a new canvas needs the complete contents, not only the changes
+        self.aggregator.resend(name, canvas.binning)
+
+    def setup_histogram_aggregation(self):
+        """
+        Connect the histogram canvases created so far to the aggregator and
+        start it.
+
+        :returns: None
+        """
+        for name, canvas in self.get_histogram_canvases().items():
+            self.connect_histogram(name, canvas)
+
+        self.aggregator.start()
+
+    def setup_render_budget(self):
+        """
+        Show the render quality in the status bar. The render budget is
+        attached to the plot canvases when their widget is created.
+
+        :returns: None
+        """
+        self.render_status = QtWidgets.QLabel(self)
+        self.status_bar.addPermanentWidget(self.render_status)
+
+        self.render_status_timer = QtCore.QTimer()
+        self.render_status_timer.timeout.connect(self.update_render_status)
+        self.render_status_timer.start(1000)
+
+    def update_render_status(self):
+        """
+        Show the render quality level and the draw times in the status bar.
 
         :returns: None
         """
-        self.add_widget("rate", "Muon Rates",
-                        RateWidget(self.logger, opts, parent=self))
-        self.add_widget("pulse", "Pulse Analyzer",
-                        PulseAnalyzerWidget(self.logger, opts, parent=self))
-        self.add_widget("decay", "Muon Decay",
-                        DecayWidget(self.logger, opts, parent=self))
-        self.add_widget("velocity", "Muon Velocity",
-                        VelocityWidget(self.logger, opts, parent=self))
-        self.add_widget("status", "Status",
-                        StatusWidget(self.logger, parent=self))
-        self.add_widget("daq", "DAQ Output",
-                        DAQWidget(self.logger, parent=self))
-        self.add_widget("gps", "GPS Output",
-                        GPSWidget(self.logger, parent=self))
+        draw_times = self.render_budget.mean_draw_times()
+        text = "Render quality: %s" % self.render_budget.level_name()
+
+        if draw_times:
+            text += " (%s)" % ", ".join(
+                    ["%s %.0f ms" % (name, draw_time * 1000.)
+                     for name, draw_time in sorted(draw_times.items())])
+
+        self.render_status.setText(text)
 
     def setup_plot_style(self):
         """
@@ -180,6 +618,33 @@ class Application(AbstractMuonicConsumer, QtWidgets.QMainWindow):
         if screen_x * screen_y >= 1920000:
             set_large_plot_style()
 
+            # measure the text rendering paths without delaying the startup
+            thread = threading.Thread(target=self.check_text_rendering,
+                                      name="TextRenderingCheck")
+            thread.daemon = True
+            thread.start()
+
+    def check_text_rendering(self):
+        """
+        Benchmark the text rendering with LaTeX and mathtext and log the
+        cost of a single draw for each of them.
+
+        :returns: None
+        """
+        try:
+            results = benchmark_text_rendering()
+        except Exception as e:
+            self.logger.warning("Text rendering check failed: %s" % e)
+            return
+
+        for name, draw_time in sorted(results.items()):
+            self.logger.info("Text rendering with %s takes %.1f ms per draw" %
+                             (name, draw_time * 1000.))
+
+        if "usetex" not in results:
+            self.logger.info("LaTeX not found, text rendering with LaTeX " +
+                             "was not measured")
+
     def setup_menus(self):
         """
         Setup the menu bar and populate menus.
@@ -209,6 +674,7 @@ class Application(AbstractMuonicConsumer, QtWidgets.QMainWindow):
 
         # create settings menu
         settings_menu = menu_bar.addMenu('&Settings')
+        self.settings_menu = settings_menu
 
         config_action = QtWidgets.QAction('Channel Configuration', self)
         config_action.setStatusTip('Configure the Coincidences and channels')
@@ -222,9 +688,17 @@ class Application(AbstractMuonicConsumer, QtWidgets.QMainWindow):
         advanced_action.setStatusTip('Advanced configurations')
         advanced_action.triggered.connect(self.advanced_menu)
 
+        self.profiling_action = QtWidgets.QAction('Profiling', self)
+        self.profiling_action.setStatusTip(
+                'Profile the acquisition and the GUI for a while')
+        self.profiling_action.setCheckable(True)
+        self.profiling_action.triggered.connect(self.profiling_menu)
+
         settings_menu.addAction(config_action)
         settings_menu.addAction(thresholds_action)
         settings_menu.addAction(advanced_action)
+        settings_menu.addSeparator()
+        settings_menu.addAction(self.profiling_action)
 
         # create help menu
         help_menu = menu_bar.addMenu('&Help')
@@ -248,6 +722,32 @@ class Application(AbstractMuonicConsumer, QtWidgets.QMainWindow):
         help_menu.addAction(about_action)
 
 
+    def add_lazy_widget(self, name, label, factory):
+        """
+        Adds a tab with a placeholder. The widget is created by calling
+        'factory' when the tab is shown for the first time.
+
+        Raises WidgetWithNameExistsError if a widget of that name already
+        exists.
+
+        :param name: widget name
+        :type name: str
+        :param label: the tab label
+        :type label: str
+        :param factory: function creating the widget
+        :type factory: callable
+        :returns: None
+        :raises: WidgetWithNameExistsError
+        """
+        if self.have_widget(name) or name in self._widget_factories:
+            raise WidgetWithNameExistsError("widget with name '%s' already exists" % name)
+
+        placeholder = QtWidgets.QLabel("Loading %s..." % label)
+        placeholder.setAlignment(QtCore.Qt.AlignCenter)
+
+        self.tab_widget.addTab(placeholder, label)
+        self._widget_factories[name] = (factory, label, placeholder)
+
     def add_widget(self, name, label, widget):
         """
         Adds widget to the store.
@@ -289,12 +789,15 @@ class Application(AbstractMuonicConsumer, QtWidgets.QMainWindow):
 
     def get_widget(self, name):
         """
-        Retrieved a widget from the store.
+        Retrieved a widget from the store. Widgets of tabs which were not
+        shown yet are created.
 
         :param name: widget name
         :type name: str
         :returns: object
         """
+        if name in self._widget_factories:
+            return self.create_widget(name)
         return self._widgets.get(name)
 
     def is_widget_active(self, name):
@@ -309,41 +812,109 @@ class Application(AbstractMuonicConsumer, QtWidgets.QMainWindow):
             return self.get_widget(name).active()
         return False
 
+    def daq_request(self, command, callback):
+        """
+        Send 'command' to the DAQ card and call 'callback' with the future
+        of the request in the GUI thread as soon as the reply arrives or the
+        request times out.
+
+        :param command: one of TL, DC, DS or DG
+        :type command: str
+        :param callback: called with a concurrent.futures.Future
+        :type callback: callable
+        :returns: None
+        """
+        future = self.daq_commands.request(command,
+                                           timeout=self.DAQ_REPLY_TIMEOUT)
+        future.add_done_callback(
+                lambda f: self.daqReplyReceived.emit(callback, f))
+
+    def on_daq_reply(self, callback, future):
+        """
+        Hand the future of a DAQ request to its callback.
+
+        :param callback: the callback
+        :type callback: callable
+        :param future: the future of the request
+        :type future: concurrent.futures.Future
+        :returns: None
+        """
+        try:
+            callback(future)
+        except Exception as e:
+            self.logger.error("Handling the DAQ reply failed: %s" % e)
+
     def threshold_menu(self):
         """
-        Shows thresholds dialog.
+        Shows thresholds dialog, right away if the DAQ card reported its
+        thresholds before, otherwise as soon as it did.
 
         :returns: None
         """
-        # get the actual thresholds from the DAQ card
-        self._app.daq.put('TL')
+        if self.daq_state.reported("TL"):
+            self.show_threshold_dialog()
+            return
 
-        # wait explicitly until the thresholds get loaded
         self.logger.info("loading threshold information..")
-        time.sleep(1.5)
+        self.daq_request("TL", self.show_threshold_dialog)
 
-        # get thresholds from settings
-        thresholds = [self._app.get_setting("threshold_ch%d" % i, 300) for i in range(4)]
+    def show_threshold_dialog(self, future=None):
+        """
+        Shows thresholds dialog.
+
+        :param future: the future of the TL request, if the thresholds had
+            to be requested
+        :type future: concurrent.futures.Future
+        :returns: None
+        """
+        self.check_daq_reply(future)
 
         # show dialog
-        dialog = ThresholdDialog(thresholds)
+        dialog = ThresholdDialog([300 if threshold is None else threshold
+                                  for threshold in self.daq_state.thresholds])
 
         if dialog.exec_() == 1:
-            commands = []
+            thresholds = dict()
 
             # update thresholds config
             for ch in range(4):
                 val = dialog.get_widget_value("threshold_ch_%d" % ch)
-                self._app.update_setting("threshold_ch%d" % ch, val)
-                commands.append("TL %d %s" % (ch, val))
+                thresholds["threshold_ch%d" % ch] = int(val)
 
             # apply new thresholds to daq card
-            for cmd in commands:
-                self._app.daq.put(cmd)
-                self.logger.info("Set threshold of channel %s to %s" %
-                                 (cmd.split()[1], cmd.split()[2]))
+            self.update_daq_settings(thresholds)
+
+    def check_daq_reply(self, future):
+        """
+        Log if a request for the configuration of the DAQ card failed, the
+        DAQ state then still holds the settings or the last reply.
+
+        :param future: the future of the request, None if there was none
+        :type future: concurrent.futures.Future
+        :returns: None
+        """
+        if future is None:
+            return
+
+        try:
+            future.result()
+        except DAQTimeoutError as e:
+            self.logger.warning("%s, using the last known configuration" % e)
+
+    def update_daq_settings(self, values):
+        """
+        Store changed settings of the DAQ card and write the registers
+        which differ to the card. The DAQ state shows the new values once
+        the card confirms them.
+
+        :param values: the values by setting name
+        :type values: dict
+        :returns: None
+        """
+        for name, value in values.items():
+            self._app.update_setting(name, value)
 
-        self._app.daq.put('TL')
+        self.daq_writer.write(values)
 
     def open_muonic_data(self):
         """
@@ -353,31 +924,124 @@ class Application(AbstractMuonicConsumer, QtWidgets.QMainWindow):
         import webbrowser
         webbrowser.open("file://" + path.expanduser("~") + "/muonic_data/")
 
+    def write_pulses(self, enabled):
+        """
+        Start or stop writing the extracted pulses to the pulse file.
+        Writing only stops if the pulse analyzer, the decay and the velocity
+        measurements are inactive and the option 'write_pulses' is not set.
+
+        :param enabled: write the pulses
+        :type enabled: bool
+        :returns: None
+        """
+        if enabled:
+            if self.pulse_file is None:
+                self.pulse_file = self.writer.open(
+                        data_filename("P", self.start_time))
+
+            self.pulse_file.open("pulse extraction")
+            self.records.attach("pulse", self.pulse_file)
+            self.registry.subscribe("pulse", self.records)
+            return
+
+        if (self.opts.get("write_pulses") or
+                self.is_widget_active("pulse") or
+                self.is_widget_active("decay") or
+                self.is_widget_active("velocity")):
+            return
+
+        self.records.detach("pulse")
+
+        # the archive needs the pulses as well
+        if self.archive is None:
+            self.registry.unsubscribe("pulse", self.records)
+
+        if self.pulse_file is not None:
+            self.pulse_file.close()
+
+    def profiling_menu(self, checked):
+        """
+        Start profiling for a duration asked for or stop a running profile.
+
+        :param checked: start profiling
+        :type checked: bool
+        :returns: None
+        """
+        if not checked:
+            self.profiling_timer.stop()
+            self.finish_profiling()
+            return
+
+        duration, ok = QtWidgets.QInputDialog.getInt(
+                self, "Profiling", "Profile for how many seconds?",
+                self.PROFILING_DURATION, 1, 3600)
+
+        if not ok:
+            self.profiling_action.setChecked(False)
+            return
+
+        self.profiler.start(duration)
+        self.profiling_timer.start(duration * 1000)
+        self.profiling_action.setText('Stop Profiling')
+        self.status_bar.showMessage("Profiling for %d seconds..." % duration)
+
+    def finish_profiling(self):
+        """
+        Stop profiling and save the report next to the data files.
+
+        :returns: None
+        """
+        self.profiler.stop()
+        self.profiling_action.setChecked(False)
+        self.profiling_action.setText('Profiling')
+
+        try:
+            filename = self.profiler.save(DATA_DIRECTORY)
+        except (IOError, OSError) as e:
+            self.logger.error("Unable to save the profile: %s" % e)
+            self.status_bar.showMessage("Unable to save the profile")
+            return
+
+        self.status_bar.showMessage("Profile saved to %s" % filename)
+
     def config_menu(self):
         """
-        Show the channel config dialog.
+        Show the channel config dialog, right away if the DAQ card reported
+        its channel configuration before, otherwise as soon as it did.
 
         :returns: None
         """
-        # get the actual channels from the DAQ card
-        self._app.daq.put("DC")
+        if self.daq_state.reported("DC"):
+            self.show_config_dialog()
+            return
 
-        # wait explicitly until the channels get loaded
         self.logger.info("loading channel information...")
-        time.sleep(1)
+        self.daq_request("DC", self.show_config_dialog)
+
+    def show_config_dialog(self, future=None):
+        """
+        Show the channel config dialog.
+
+        :param future: the future of the DC request, if the configuration
+            had to be requested
+        :type future: concurrent.futures.Future
+        :returns: None
+        """
+        self.check_daq_reply(future)
+        config = self.daq_state.values()
 
         # get current config values
-        channel_config = [self._app.get_setting("active_ch%d" % i) for i in range(4)]
-        coincidence_config = [self._app.get_setting("coincidence%d" % i)
-                              for i in range(4)]
-        veto = self._app.get_setting("veto")
-        veto_config = [self._app.get_setting("veto_ch%d" % i) for i in range(3)]
+        channel_config = [config["active_ch%d" % i] for i in range(4)]
+        coincidence_config = [config["coincidence%d" % i] for i in range(4)]
+        veto = config["veto"]
+        veto_config = [config["veto_ch%d" % i] for i in range(3)]
 
         # show dialog
         dialog = ConfigDialog(channel_config, coincidence_config,
                               veto, veto_config)
 
         if dialog.exec_() == 1:
+            settings = dict()
 
             # get and update channel and coincidence config
             for i in range(4):
@@ -386,68 +1050,22 @@ class Application(AbstractMuonicConsumer, QtWidgets.QMainWindow):
                 coincidence_config[i] = dialog.get_widget_value(
                         "coincidence_checkbox_%d" % i)
 
-                self._app.update_setting("active_ch%d" % i, channel_config[i])
-                self._app.update_setting("coincidence%d" % i, coincidence_config[i])
+                settings["active_ch%d" % i] = channel_config[i]
+                settings["coincidence%d" % i] = coincidence_config[i]
 
             # get and update veto state
             veto = dialog.get_widget_value("veto_checkbox")
-            self._app.update_setting("veto", veto)
+            settings["veto"] = veto
 
             # get and update veto channel config
             for i in range(3):
                 veto_config[i] = dialog.get_widget_value(
                         "veto_checkbox_%d" % i)
 
-                self._app.update_setting("veto_ch%d" % i, veto_config[i])
-
-            # build daq message to apply the new config to the card
-            tmp_msg = ""
-
-            if veto:
-                if veto_config[0]:
-                    tmp_msg += "01"
-                elif veto_config[1]:
-                    tmp_msg += "10"
-                elif veto_config[2]:
-                    tmp_msg += "11"
-                else:
-                    tmp_msg += "00"
-            else:
-                tmp_msg += "00"
-
-            coincidence_set = False
-
-            # singles, twofold, threefold, fourfold
-            for i, coincidence in enumerate(["00", "01", "10", "11"]):
-                if coincidence_config[i]:
-                    tmp_msg += coincidence
-                    coincidence_set = True
-
-            if not coincidence_set:
-                tmp_msg += "00"
+                settings["veto_ch%d" % i] = veto_config[i]
 
-            # now calculate the correct expression for the first
-            # four bits
-            self.logger.debug("The first four bits are set to %s" % tmp_msg)
-            msg = "WC 00 %s" % hex(int(''.join(tmp_msg), 2))[-1].capitalize()
-
-            channel_set = False
-            enable = ['0', '0', '0', '0']
-
-            for i, active in enumerate(reversed(channel_config)):
-                if active:
-                    enable[i] = '1'
-                    channel_set = True
-
-            if channel_set:
-                msg += hex(int(''.join(enable), 2))[-1].capitalize()
-            else:
-                msg += '0'
-
-            # send the message to the daq card
-            self._app.daq.put(msg)
-
-            self.logger.info("The following message was sent to DAQ: %s" % msg)
+            # apply the new config to the card
+            self.update_daq_settings(settings)
 
             for i in range(4):
                 self.logger.debug("channel%d selected %s" %
@@ -458,8 +1076,6 @@ class Application(AbstractMuonicConsumer, QtWidgets.QMainWindow):
                 self.logger.debug("coincidence %s %s" %
                                   (name, coincidence_config[i]))
 
-        self._app.daq.put("DC")
-
     def advanced_menu(self):
         """
         Show a config dialog for advanced options, ie. gate width,
@@ -468,15 +1084,26 @@ class Application(AbstractMuonicConsumer, QtWidgets.QMainWindow):
 
         :returns: None
         """
-        # get the actual channels from the DAQ card
-        self._app.daq.put("DC")
+        if self.daq_state.reported("DC"):
+            self.show_advanced_dialog()
+            return
 
-        # wait explicitly until the channels get loaded
         self.logger.info("loading channel information...")
-        time.sleep(1)
+        self.daq_request("DC", self.show_advanced_dialog)
+
+    def show_advanced_dialog(self, future=None):
+        """
+        Show the config dialog for advanced options.
+
+        :param future: the future of the DC request, if the configuration
+            had to be requested
+        :type future: concurrent.futures.Future
+        :returns: None
+        """
+        self.check_daq_reply(future)
 
         # show dialog
-        dialog = AdvancedDialog(self._app.get_setting("gate_width"),
+        dialog = AdvancedDialog(self.daq_state.gate_width,
                                 self._app.get_setting("time_window"),
                                 self._app.get_setting("write_daq_status"))
 
@@ -497,28 +1124,15 @@ class Application(AbstractMuonicConsumer, QtWidgets.QMainWindow):
 
             # update gate width
             gate_width = int(dialog.get_widget_value("gate_width"))
-            self._app.update_setting("gate_width", gate_width)
-
-            # transform gate width for daq msg
-            gate_width = bin(gate_width // 10).replace('0b', '').zfill(16)
-            gate_width_03 = format(int(gate_width[0:8], 2), 'x').zfill(2)
-            gate_width_02 = format(int(gate_width[8:16], 2), 'x').zfill(2)
 
             # set gate widths
-            self._app.daq.put("WC 03 %s" % gate_width_03)
-            self._app.daq.put("WC 02 %s" % gate_width_02)
+            self.update_daq_settings({"gate_width": gate_width})
 
-            # adjust the update interval
-            self.widget_updater.start(time_window * 1000)
-
-            self.logger.debug("Writing gate width WC 02 %s WC 03 %s" %
-                              (gate_width_02, gate_width_03))
+            self.logger.debug("Setting gate width to %d ns" % gate_width)
             self.logger.debug("Setting time window to %.2f " % time_window)
             self.logger.debug("Switching write_daq_status option to %s" %
                               write_daq_status)
 
-        self._app.daq.put("DC")
-
     def help_menu(self):
         """
         Show a simple help dialog.
@@ -607,18 +1221,35 @@ class Application(AbstractMuonicConsumer, QtWidgets.QMainWindow):
             # self.timer.stop()
             # self.widget_updater.stop()
 
+            # save the measurements before the widgets finish them
+            self.snapshot_timer.stop()
+            self.save_snapshot()
+
             for key, widget in self._widgets.items():
                 # run finish hook on each widget, e.g. close and
                 # rename files if necessary
                 widget.finish()
 
-            # run finish hook on pulse extractor to close and
-            # rename pulse file
-            # self.pulse_extractor.finish()
+            # close and rename pulse file
+            self.records.detach("pulse")
+            if self.pulse_file is not None:
+                self.pulse_file.finish()
+
+            self.profiling_timer.stop()
+            self.profiler.stop()
+            self.gps.stop()
+            self.daq_queue.stop()
 
             self._app.stop()
             self._app_thread.join(timeout=10.0)
 
+            # write what is left and close all files
+            self.writer.stop()
+
+            if self.archive is not None:
+                self.records.set_archive(None)
+                self.archive.close()
+
             time.sleep(0.5)
 
             self.lastWindowClosed.emit()
@@ -639,29 +1270,104 @@ class Application(AbstractMuonicConsumer, QtWidgets.QMainWindow):
     def push_raw(self, data, meta):
         # print("DEBUG Application.push_raw START")
 
-        self.daq_log += data + "\n"
+        if not self._daq_ready:
+            self._daq_ready = True
+            self.daqReady.emit()
+
+        PipelineConsumer.push_raw(self, data, meta)
 
         # print("DEBUG Application.push_raw END")
 
     def update_raw_daq(self):
-        self.get_widget("daq").daq_msg_log.appendPlainText(self.daq_log)
+        """
+        Move a batch of raw DAQ messages to the DAQ message log and show
+        them in the DAQ widget. Messages beyond the batch size stay buffered
+        until the next call.
+
+        :returns: None
+        """
+        self.daq_messages.extend(self.daq_log.drain(self.DAQ_LOG_BATCH_SIZE))
+
+        if self.have_widget("daq"):
+            self.get_widget("daq").show_messages(self.daq_log.dropped)
 
-        self.daq_log = ""
+    def process_events(self):
+        """
+        Show the analyzer results queued since the last call. Runs in the
+        GUI thread.
+
+        :returns: None
+        """
+        for kind, value in self.events.drain():
+            try:
+                self.event_handlers[kind](value)
+            except Exception as e:
+                self.logger.error("Failed to show %s events: %s" % (kind, e))
+
+    def show_pulses(self, records):
+        """
+        Show the pulse widths and pulses of several events.
+
+        :param records: pulse widths per channel and pulses of each event
+        :type records: list of tuples
+        :returns: None
+        """
+        # results for tabs which were not shown yet are dropped
+        if not self.have_widget("pulse"):
+            return
 
-    def push_pulse(self, pulse_widths, event_time, meta):
         w = self.get_widget("pulse")
 
         for i in range(4):
-            w.pulse_width_canvases[i].update_plot(pulse_widths[i])
+            widths = [record[0][i] for record in records]
+            if widths:
+                w.pulse_width_canvases[i].update_plot(np.concatenate(widths))
+
+        w.pulse_canvas.update_plot_batch([record[1] for record in records])
+
+        if TRACER.enabled:
+            TRACER.applied("pulse")
+
+    def show_histograms(self, records):
+        """
+        Add bin content changes to the histogram canvases.
+
+        :param records: name, bin content change, binning and reset flag
+        :type records: list of tuples
+        :returns: None
+        """
+        canvases = self.get_histogram_canvases()
+        kinds = set()
+
+        for name, bincontent, binning, reset in records:
+            # the canvas gets the complete contents when it is created
+            if name not in canvases:
+                continue
+            canvases[name].add_bin_counts(bincontent, binning, reset=reset)
+            kinds.add(canvases[name].model.TRACE_KIND)
+
+        if TRACER.enabled:
+            for kind in kinds:
+                TRACER.applied(kind)
+
+    def show_rate(self, record):
+        """
+        Show a rate sample.
+
+        :param record: rates, counts, time window and query time
+        :type record: tuple
+        :returns: None
+        """
+        if not self.have_widget("rate"):
+            return
 
-    def push_rate(self, rates, counts, time_window, query_time, meta):
-        # print("DEBUG Application.push_rate START")
+        rates, counts, time_window, query_time = record
 
         w = self.get_widget("rate")
 
         w.update_info_field("max_rate", "%.3f 1/s" % rates[5])
 
-        data = rates[0:5]
+        data = list(rates[0:5])
         data.append(time_window)
         w.scalars_monitor.update_plot(data)
         w.update_info_field("daq_time", "%.2f s" % time_window)
@@ -670,17 +1376,56 @@ class Application(AbstractMuonicConsumer, QtWidgets.QMainWindow):
             w.rate_fields[i].setText("%.3f" % rates[i])
             w.scalar_fields[i].setText("%d" % counts[i])
 
-        # print("DEBUG Application.push_rate END")
+    def show_daq_state(self, values):
+        """
+        Show a changed configuration of the DAQ card.
 
-    def push_decay(self, decay_time, event_time, meta):
-        w = self.get_widget("decay")
+        :param values: the values by setting name, see
+            :class:`muonic_gui.daq.state.DAQState`
+        :type values: dict
+        :returns: None
+        """
+        if self.have_widget("status"):
+            self.get_widget("status").show_daq_state(values)
+
+    def show_gps(self, record):
+        """
+        Show a readout of the GPS.
 
-        w.plot_canvas.update_plot([decay_time])
+        :param record: the readout
+        :type record: muonic_gui.daq.gps.GPSRecord
+        :returns: None
+        """
+        if self.have_widget("gps"):
+            self.get_widget("gps").show_record(record, self.gps.series())
+
+    def show_decay_times(self, decay_times):
+        """
+        Add decay times to the lifetime histogram.
 
-    def push_velocity(self, flight_time, event_time, meta):
-        w = self.get_widget("velocity")
+        :param decay_times: the decay times
+        :type decay_times: list of float
+        :returns: None
+        """
+        if self.have_widget("decay"):
+            self.get_widget("decay").plot_canvas.update_plot(decay_times)
+
+            if TRACER.enabled:
+                TRACER.applied("decay")
+
+    def show_flight_times(self, flight_times):
+        """
+        Add flight times to the velocity histogram.
+
+        :param flight_times: the flight times
+        :type flight_times: list of float
+        :returns: None
+        """
+        if self.have_widget("velocity"):
+            self.get_widget("velocity").plot_canvas.update_plot(flight_times)
 
-        w.plot_canvas.update_plot([flight_time])
+            if TRACER.enabled:
+                TRACER.applied("velocity")
 
 
 class WidgetWithNameExistsError(Exception):
@@ -247,6 +247,59 @@ class FitRangeConfigDialog(BaseDialog):
         self.show()
 
 
+class BinningConfigDialog(BaseDialog):
+    """
+    Dialog to configure the binning of a histogram
+
+    :param binning: start, stop and number of bin edges
+    :type binning: tuple
+    :param limits: lowest and highest value for start and stop
+    :type limits: tuple of float
+    :param log_y: logarithmic y-axis
+    :type log_y: bool
+    :param dimension: suffix
+    :type dimension: str
+    """
+
+    def __init__(self, binning, limits, log_y=False, dimension=''):
+        BaseDialog.__init__(self, "Binning Configuration")
+
+        layout = QtWidgets.QGridLayout(self)
+
+        for row, (name, label, value) in enumerate(
+                [("lower_limit", "Lower edge of the first bin: ", binning[0]),
+                 ("upper_limit", "Upper edge of the last bin: ", binning[1])]):
+            limit = QtWidgets.QDoubleSpinBox()
+            limit.setDecimals(2)
+            limit.setSingleStep(0.1)
+            limit.setObjectName(name)
+            limit.setSuffix(' %s' % dimension)
+            limit.setMinimum(limits[0])
+            limit.setMaximum(limits[1])
+            limit.setValue(value)
+
+            layout.addWidget(QtWidgets.QLabel(label), row, 0)
+            layout.addWidget(limit, row, 1)
+
+        bins = QtWidgets.QSpinBox()
+        bins.setObjectName("bins")
+        bins.setMinimum(1)
+        bins.setMaximum(1000)
+        bins.setValue(binning[2] - 1)
+
+        layout.addWidget(QtWidgets.QLabel("Number of bins: "), 2, 0)
+        layout.addWidget(bins, 2, 1)
+
+        log_checkbox = QtWidgets.QCheckBox("Logarithmic y-axis")
+        log_checkbox.setObjectName("log_y")
+        log_checkbox.setChecked(log_y)
+
+        layout.addWidget(log_checkbox, 3, 0, 1, 2)
+        layout.addWidget(self.button_box(left=200), 4, 0, 2, 0)
+
+        self.show()
+
+
 class VelocityConfigDialog(BaseDialog):
     """
     Dialog to configure the muon velocity
@@ -1,7 +1,9 @@
 """
 Provides helper classes and function needed by the gui
 """
-from matplotlib.pylab import rc
+from matplotlib import rc
+
+import numpy as np
 
 from PyQt5 import QtGui, QtWidgets
 from PyQt5 import QtCore, QtWidgets
@@ -61,31 +63,164 @@ class HistoryAwareLineEdit(QtWidgets.QLineEdit):
         self.hist_pointer = len(self.history)
 
 
-def set_large_plot_style():
+class DAQLogModel(QtCore.QAbstractListModel):
+    """
+    List model over a :class:`muonic_gui.lib.daqlog.DAQMessageLog`. The
+    view only asks for the visible rows, so the number of lines does not
+    matter for drawing.
+
+    Without a filter the rows are the lines of the log. With a filter the
+    absolute numbers of the matching lines are kept and extended with the
+    matching new lines on every refresh.
+
+    :param log: the message log
+    :type log: muonic_gui.lib.daqlog.DAQMessageLog
+    :param parent: parent object
+    """
+
+    def __init__(self, log, parent=None):
+        QtCore.QAbstractListModel.__init__(self, parent)
+        self.log = log
+
+        # message types and text of the filter, None for all
+        self.kinds = None
+        self.text = None
+
+        # absolute line numbers of the rows if filtered
+        self._rows = None
+        # first and end line of the log at the last refresh
+        self._first = log.first
+        self._end = log.end
+
+    @property
+    def filtered(self):
+        """
+        True if only some lines are shown
+
+        :returns: bool
+        """
+        return self._rows is not None
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        if self._rows is None:
+            return self._end - self._first
+        return len(self._rows)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid() or role != QtCore.Qt.DisplayRole:
+            return None
+        return self.log.line(self.line_number(index.row()))
+
+    def line_number(self, row):
+        """
+        The absolute line number of 'row'.
+
+        :param row: the row
+        :type row: int
+        :returns: int
+        """
+        if self._rows is None:
+            return self._first + row
+        return int(self._rows[row])
+
+    def set_filter(self, kinds=None, text=None):
+        """
+        Show only the lines of the message types 'kinds' containing 'text'.
+
+        :param kinds: the message types, all if None
+        :type kinds: list of int
+        :param text: text the lines have to contain, any if None or empty
+        :type text: str
+        :returns: None
+        """
+        self.beginResetModel()
+
+        self.kinds = kinds
+        self.text = text or None
+        self._first = self.log.first
+        self._end = self.log.end
+
+        if self.kinds is None and self.text is None:
+            self._rows = None
+        else:
+            self._rows = self.log.find(self.kinds, self.text)
+
+        self.endResetModel()
+
+    def refresh(self):
+        """
+        Remove the rows of the lines dropped from the log and add the rows
+        of the new lines.
+
+        :returns: None
+        """
+        first, end = self.log.first, self.log.end
+
+        if self._rows is None:
+            dropped = min(first, self._end) - self._first
+        else:
+            dropped = int(np.searchsorted(self._rows, first))
+
+        if dropped > 0:
+            self.beginRemoveRows(QtCore.QModelIndex(), 0, dropped - 1)
+            if self._rows is not None:
+                self._rows = self._rows[dropped:]
+            self._first = first
+            self._end = max(self._end, first)
+            self.endRemoveRows()
+
+        self._first = first
+        self._end = max(self._end, first)
+
+        if end <= self._end:
+            return
+
+        if self._rows is None:
+            new = end - self._end
+        else:
+            rows = self.log.find(self.kinds, self.text, start=self._end)
+            new = len(rows)
+
+        if new > 0:
+            count = self.rowCount()
+            self.beginInsertRows(QtCore.QModelIndex(), count, count + new - 1)
+            if self._rows is not None:
+                self._rows = np.concatenate((self._rows, rows))
+            self._end = end
+            self.endInsertRows()
+
+        self._end = end
+
+
+def set_large_plot_style(usetex=False):
     """
     Large fonts for large screens
 
+    Text is rendered with matplotlib's mathtext in a Palatino like serif
+    font by default. Rendering with LaTeX looks the same, but runs LaTeX
+    for every changed tick label and is therefore much slower to redraw.
+
+    :param usetex: render all text with LaTeX
+    :type usetex: bool
     :returns: None
     """
     font_size = 20
 
-    # workaround for ancient versions of matplotlib at DESY
-    from matplotlib import __version__ as mplversion
-    from distutils.version import LooseVersion
-    if LooseVersion(mplversion) > LooseVersion("1.3.0"):
-        ff = "TeX Gyre Pagella"
-    else:
-        ff = 'serif'
-
     rc("axes", titlesize=font_size, labelsize=font_size)
-    # rc("font", serif="Palatino")
-    rc("font", size=font_size, family=ff)  # this is Palatino
+    # Palatino if available, fonts shipped with matplotlib otherwise
+    rc("font", size=font_size, family="serif",
+       serif=["TeX Gyre Pagella", "Palatino", "STIXGeneral", "DejaVu Serif"])
     rc("grid", linewidth=1.2)
     rc("legend", fontsize=font_size, markerscale=1, numpoints=1)
     rc("lines", linewidth=2, markersize=10)
     rc("ps", useafm=True)
     rc("pdf", use14corefonts=True)
-    rc("text", usetex=True)
+    rc("text", usetex=usetex)
+    # math and tick labels in the style of LaTeX without running it
+    rc("mathtext", fontset="stix")
+    rc("axes.formatter", use_mathtext=True)
     rc("xtick", labelsize=font_size)
     rc("xtick.major", size=7)
     rc("xtick.minor", size=5)
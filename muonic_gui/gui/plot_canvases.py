@@ -1,8 +1,10 @@
 """
 Provides the canvases for plots in muonic
+
+The canvases are Qt views of the plot models in
+:mod:`muonic_gui.plots.models`, which hold the figures and the plot logic.
 """
-from matplotlib.figure import Figure
-from matplotlib.backends.backend_qt4agg \
+from matplotlib.backends.backend_qt5agg \
     import FigureCanvasQTAgg as FigureCanvas
 try:
     from matplotlib.backends.backend_qt5agg \
@@ -10,8 +12,11 @@ try:
 except ImportError:
     from matplotlib.backends.backend_qt5agg \
         import NavigationToolbar2QT as NavigationToolbar
+import time
 
-import numpy as np
+from muonic_gui.lib.tracing import TRACER
+from muonic_gui.plots.models import LifetimePlot, PulsePlot, PulseWidthPlot
+from muonic_gui.plots.models import ScalarsPlot, VelocityPlot
 
 
 class BasePlotCanvas(FigureCanvas):
@@ -19,67 +24,60 @@ class BasePlotCanvas(FigureCanvas):
     Base class for plot canvases
 
     :param parent: the parent widget
-    :param logger: logger object
-    :type logger: logging.Logger
-    :param ymin: minimum y-value
-    :type ymin: float
-    :param ymax: maximum y-value
-    :type ymax: float
-    :param xmin: minimum x-value
-    :type xmin: float
-    :param xmax: maximum x-value
-    :type xmax: float
-    :param xlabel: label of the x-axis
-    :type xlabel: str
-    :param ylabel: label of the y-axis
-    :type ylabel: str
-    :param grid: draw grid
-    :type grid: bool
-    :param spacing: left and right spacing of the subplots
-    :type spacing: tuple
+    :param model: the plot model to show
+    :type model: muonic_gui.plots.models.BasePlot
     """
 
-    def __init__(self, parent, logger, ymin=0, ymax=10, xmin=0, xmax=10,
-                 xlabel="xlabel", ylabel="ylabel", grid=True, title=None,
-                 spacing=(0.1, 0.9)):
-
-        self.logger = logger
+    def __init__(self, parent, model):
+        self.model = model
+        self.logger = model.logger
+        self.fig = model.fig
+        self.ax = model.ax
 
-        # initialization of the canvas
-        self.fig = Figure(facecolor="white", dpi=72)
-        self.fig.subplots_adjust(left=spacing[0], right=spacing[1])
         FigureCanvas.__init__(self, self.fig)
 
-        # setup subplot, axis and grid
-        self.ax = self.fig.add_subplot(111)
-        self.ax.set_ylim(ymin=ymin, ymax=ymax)
-        self.ax.set_xlim(xmin=xmin, xmax=xmax)
-        self.ax.set_xlabel(xlabel)
-        self.ax.set_ylabel(ylabel)
-        self.ax.set_autoscale_on(False)
-        self.ax.grid(grid)
-
-        # store the limits for later use
-        self.xmin = xmin
-        self.xmax = xmax
-        self.ymin = ymin
-        self.ymax = ymax
-        self.xlabel = xlabel
-        self.ylabel = ylabel
-
-        self.title = None
-        # force a redraw of the Figure
-        self.fig.canvas.draw()
+        # let the model schedule redraws on this canvas
+        self.model.draw_callback = self.draw_idle
+
+        # the figure is drawn when the canvas is shown for the first time
         self.setParent(parent)
 
+    def set_render_budget(self, budget):
+        """
+        Let 'budget' measure the draw times of this canvas and control the
+        optional decorations of the plot.
 
-    def update_plot(self, *args):
+        :param budget: the render budget
+        :type budget: muonic_gui.plots.budget.RenderBudget
+        :returns: None
         """
-        Instructions to update the plot. Needs to be implemented in subclasses.
+        self.model.budget = budget
 
-        :Returns: None
+    def draw(self):
         """
-        raise NotImplementedError("implement this method")
+        Render the figure and report the draw time to the render budget.
+
+        :returns: None
+        """
+        self.model.cache_static_text()
+
+        start = time.perf_counter()
+        FigureCanvas.draw(self)
+
+        if self.model.budget is not None:
+            self.model.budget.record(self.model.name,
+                                     time.perf_counter() - start)
+
+        if TRACER.enabled and self.model.TRACE_KIND is not None:
+            TRACER.drawn(self.model.TRACE_KIND)
+
+    def update_plot(self, *args, **kwargs):
+        """
+        Update the plot model with new data.
+
+        :returns: None
+        """
+        self.model.update_plot(*args, **kwargs)
 
 
 class BaseHistogramCanvas(BasePlotCanvas):
@@ -87,194 +85,113 @@ class BaseHistogramCanvas(BasePlotCanvas):
     A base class for all canvases with a histogram
 
     :param parent: parent widget
-    :param logger: logger object
-    :type logger: logging.Logger
-    :param binning: the binning to use for this canvas
-    :type binning: list or tuple or numpy.ndarray
-    :param hist_color: the color of the histogram
-    :type hist_color: str
-    :param kwargs: additional keyword arguments
-    :param kwargs: dict
+    :param model: the histogram model to show
+    :type model: muonic_gui.plots.models.BaseHistogramPlot
     """
 
-    def __init__(self, parent, logger, binning, hist_color="b", **kwargs):
-        BasePlotCanvas.__init__(self, parent, logger, **kwargs)
-
-        # setup binning
-        self.binning = np.asarray(binning)
-        self.bincontent = np.zeros(len(self.binning))
-        self.hist_patches = self.ax.hist(np.array([self.binning[0] - 1]),
-                                         self.binning, fc=hist_color,
-                                         alpha=0.25)[2]
-        self.heights = []
-        self.dimension = r"$\mu$s"
-
-        # FIXME the current implementation does not know about outliers
-        self.underflow = 0
-        # FIXME the current implementation does not know about outliers
-        self.overflow = 0
-
-        # fixed xrange for histogram
-        self.xmin = self.binning[0]
-        self.xmax = (self.binning[-1] +
-                     (self.binning[:-1] - self.binning[1:])[-1])
-
-    def update_plot(self, data):
-        """
-        Update the plot
-
-        :param data: the data to plot
-        :type data: list of lists
-        :return: None
-        """
-        if not data:
-            return
-
-        # avoid memory leak
-        self.ax.clear()
-
-        if self.title is not None:
-            self.ax.set_title(self.title)
-
-        # we have to do some bad hacking here,
-        # because the p histogram is rather
-        # simple and it is not possible to add two of them...
-        # however, since we do not want to run into a memory leak
-        # and we also be not dependent on dashi (but maybe
-        # sometimes in the future?) we have to do it
-        # by manipulating rectangles...
-
-        # we want to find the non-empty bins
-        # tmp_hist is compatible with the decay_time hist...
-        tmp_hist = self.ax.hist(data, self.binning, fc="b", alpha=0.25)[0]
-
-        for hist_bin in enumerate(tmp_hist):
-            if hist_bin[1]:
-                self.hist_patches[hist_bin[0]].set_height(
-                        self.hist_patches[hist_bin[0]].get_height() +
-                        hist_bin[1])
-
-        # we want to get the maximum for the ylims
-        # self.heights contains the bincontent!
-
-        self.heights = []
-        for patch in self.hist_patches:
-            self.heights.append(patch.get_height())
-
-        self.logger.debug("Histogram patch heights %s" % self.heights)
-        self.ax.set_ylim(ymax=max([h+np.sqrt(h) for h in self.heights]) * 1.1)
-        self.ax.set_ylim(ymin=0)
-        self.ax.set_xlabel(self.xlabel)
-        self.ax.set_ylabel(self.ylabel)
-        self.ax.set_xlim(xmin=self.xmin, xmax=self.xmax)
-
-        # always get rid of unused stuff
-        del tmp_hist
-
-        # try to add errorbars
-        bincenters = (self.binning[1:]+self.binning[:-1])/2.
-        for i, height in enumerate(self.heights):
-            self.ax.errorbar(bincenters[i], height,
-                     yerr=np.sqrt(height), color='b')
-
-        # some beautification
-        self.ax.grid()
-
-        # we now have to pass our new patches
-        # to the figure we created..
-        self.ax.patches = self.hist_patches
-        self.fig.canvas.draw()
-
-    def show_fit(self, bin_centers, bincontent, fitx, decay, p, covar,
-                 chisquare, nbins):
-        """
-        Plot the fit onto the diagram
-
-        :param bin_centers: bin centers
-        :param bincontent: bincontents
-        :param fitx: the fit
-        :type fitx: numpy.ndarray
-        :param decay: decay function
-        :type decay: function
-        :param p: fit parameters
-        :type p: list
-        :param covar: covariance matrix
-        :type covar: matrix
-        :param chisquare: chi-squared
-        :type chisquare: float
-        :param nbins: number of bins
-        :type nbins: int
+    @property
+    def heights(self):
+        """
+        The bin contents of the histogram
+
+        :returns: list
+        """
+        return self.model.heights
+
+    @property
+    def binning(self):
+        """
+        The binning as (start, stop, number of bin edges)
+
+        :returns: tuple
+        """
+        return self.model.binning_range
+
+    @property
+    def log_y(self):
+        """
+        True if the y-axis is logarithmic
+
+        :returns: bool
+        """
+        return self.model.log_y
+
+    def rebin(self, binning):
+        """
+        Histogram the collected values again, see
+        :meth:`muonic_gui.plots.models.BaseHistogramPlot.rebin`
+
+        :param binning: start, stop and number of bin edges
+        :type binning: tuple
+        :returns: None
+        """
+        self.model.rebin(binning)
+
+    def set_log_y(self, enabled):
+        """
+        Switch between a linear and a logarithmic y-axis.
+
+        :param enabled: use a logarithmic y-axis
+        :type enabled: bool
         :returns: None
         """
+        self.model.set_log_y(enabled)
 
-        # clears a previous fit from the canvas
-        self.ax.lines = []
-        self.ax.plot(bin_centers, bincontent, "b^", fitx, decay(p, fitx), "b-")
-
-        ## print fit function formula start
-        #x = bin_centers
-        #y = bincontent
-        #poly = pl.polyfit(x, y, 2)
-
-        #def poly2latex(poly, variable="x", width=2):
-        #  t = ["{0:0.{width}f}"]
-        #  t.append(t[-1] + " {variable}")
-        #  t.append(t[-1] + "^{1}")
-
-        #  def f():
-        #    for i, v in enumerate(reversed(poly)):
-        #      idx = i if i < 2 else 2
-        #      yield t[idx].format(v, i, variable=variable, width=width)
-
-        #  return "${}$".format("+".join(f()))
-
-        #self.ax.plot(x, y, "o", alpha=0.4)
-        #x2 = np.linspace(-2, 2, 100)
-        #y2 = np.polyval(poly, x2)
-        #self.ax.plot(x2, y2, lw=2, color="r")
-        #self.ax.text(x2[5], y2[5], poly2latex(poly), fontsize=16)
-        # print fit function formula end
-
-        # FIXME: this seems to crop the histogram
-        # self.ax.set_ylim(0,max(bincontent)*1.2)
-        self.ax.set_xlabel(self.xlabel)
-        self.ax.set_ylabel(self.ylabel)
-
-        # compute the errors on the fit, nb that this calculation assumes that
-        # scipy.optimize.leastsq was used
-        error = []
-        for i in range(len(p)):
-            try:
-                error.append(np.absolute(covar[i][i]) ** 0.5)
-            except Exception:
-                error.append(0.00)
-
-        perr_leastsq = np.array(error)
-
-        try:
-            if chisquare / (nbins-len(p)) > 10000:
-                self.ax.legend(("Data", ("Fit: (%4.2f $\pm$ %4.2f) %s \n" +
-                                     " chisq/ndf=%.4g") %
-                            (p[2], perr_leastsq[2], self.dimension,
-                             chisquare / (nbins-len(p)))), loc=1)
-            self.ax.legend(("Data", ("Fit: (%4.2f $\pm$ %4.2f) %s \n" +
-                                     " chisq/ndf=%4.2f") %
-                            (p[2], perr_leastsq[2], self.dimension,
-                             chisquare / (nbins-len(p)))), loc=1)
-        except TypeError:
-            if chisquare / (nbins-len(p)) > 10000:
-                self.ax.legend(("Data", ("Fit: (%4.2f $\pm$ %4.2f) %s \n" +
-                                     " chisq/ndf=%.4g") %
-                            (p[2], perr_leastsq[2], self.dimension,
-                             chisquare / (nbins-len(p)))), loc=1)
-            self.logger.warn("Covariance Matrix is 'None', could " +
-                             "not calculate fit error!")
-            self.ax.legend(("Data", ("Fit: (%4.2f) %s \n " +
-                                     " chisq/ndf=%4.2f") %
-                            (p[2], self.dimension,
-                             chisquare / (nbins-len(p)))), loc=1)
-
-        self.fig.canvas.draw()
+    def add_bin_counts(self, bincontent, binning, reset=False):
+        """
+        Add bin contents histogrammed elsewhere, see
+        :meth:`muonic_gui.plots.models.BaseHistogramPlot.add_bin_counts`
+
+        :returns: None
+        """
+        self.model.add_bin_counts(bincontent, binning, reset=reset)
+
+    def set_rebin_callback(self, callback):
+        """
+        Call 'callback' with the new binning when the histogram is rebinned.
+
+        :param callback: the callback
+        :type callback: callable
+        :returns: None
+        """
+        self.model.rebin_callback = callback
+
+    def get_state(self):
+        """
+        Copy of the collected values, see
+        :meth:`muonic_gui.plots.models.BaseHistogramPlot.get_state`
+
+        :returns: dict
+        """
+        return self.model.get_state()
+
+    def restore(self, state):
+        """
+        Replace the collected values, see
+        :meth:`muonic_gui.plots.models.BaseHistogramPlot.restore`
+
+        :param state: the saved values
+        :type state: dict
+        :returns: None
+        """
+        self.model.restore(state)
+
+    def reset(self):
+        """
+        Remove all collected values.
+
+        :returns: None
+        """
+        self.model.reset()
+
+    def show_fit(self, *args):
+        """
+        Plot the fit onto the diagram, see
+        :meth:`muonic_gui.plots.models.BaseHistogramPlot.show_fit`
+
+        :returns: None
+        """
+        self.model.show_fit(*args)
 
 
 class PulseCanvas(BasePlotCanvas):
@@ -285,64 +202,37 @@ class PulseCanvas(BasePlotCanvas):
     :param logger: logger object
     :type logger: logging.Logger
     """
-    def __init__(self, parent, logger):
-        BasePlotCanvas.__init__(self, parent, logger, ymin=0, ymax=1.2,
-                                xmin=0, xmax=40, xlabel="Time (ns)",
-                                ylabel="ylabel", grid=True)
-        self.ax.set_title("Oscilloscope")
-        self.ax.yaxis.set_visible(False)
-
-    def update_plot(self, pulses):
-        # do a complete redraw of the plot to avoid memory leak!
-        self.ax.clear()
-
-        # set specific limits for x and y axes
-        self.ax.set_xlim(0, 100)
-        self.ax.set_ylim(ymax=1.5)
-        self.ax.grid()
-        self.ax.set_xlabel('Time (ns)')
-        self.ax.yaxis.set_visible(False)
-        self.ax.set_title("Oscilloscope")
-
-        # and disable figure-wide auto scale
-        self.ax.set_autoscale_on(False)
-
-        # we have only the information that the pulse is over the threshold,
-        # besides that we do not have any information about its height
-        # TODO: It would be nice to implement the thresholds as scaling factors
-
-        colors = ['b', 'g', 'r', 'c']
-        labels = ['c0', 'c1', 'c2', 'c3']
-
-        pulse_height = 1.0
-        pulse_max = []
-
-        if pulses is None:
-            self.logger.warning("Pulses have no value - " +
-                                "channels not connected?")
-        else:
-            for chan in enumerate(pulses[1:]):
-                for pulse in chan[1]:
-                    self.ax.plot([pulse[0], pulse[0], pulse[1], pulse[1]],
-                                 [0, pulse_height, pulse_height, 0],
-                                 colors[chan[0]], label=labels[chan[0]], lw=2)
-                    pulse_max.append(pulse[0])
-                    pulse_max.append(pulse[1])
-
-            pulse_max = max(pulse_max)*1.2
-            # TODO: the trick below does not really work as expected.
-            # if pulse_max < self.ax.get_xlim()[1]:
-            #    pulse_max = self.ax.get_xlim()[0]
-            self.ax.set_xlim(0, pulse_max)
-
-            try:
-                self.ax.legend(loc=1, ncol=5, mode="expand",
-                               borderaxespad=0., handlelength=1)
-            except Exception as e:
-                self.logger.info("An error with the legend occurred: %s" % e)
-                self.ax.legend(loc=2)
-
-            self.fig.canvas.draw()
+    def __init__(self, parent, logger, **kwargs):
+        BasePlotCanvas.__init__(self, parent, PulsePlot(logger, **kwargs))
+
+    def update_plot_batch(self, pulses_list):
+        """
+        Update the plot with the pulses of several events, see
+        :meth:`muonic_gui.plots.models.PulsePlot.update_plot_batch`
+
+        :param pulses_list: extracted pulses of each event
+        :type pulses_list: list of tuples
+        :returns: None
+        """
+        self.model.update_plot_batch(pulses_list)
+
+    def set_persistence(self, enabled):
+        """
+        Switch between the oscilloscope and the persistence display.
+
+        :param enabled: show the persistence image
+        :type enabled: bool
+        :returns: None
+        """
+        self.model.set_persistence(enabled)
+
+    def reset_persistence(self):
+        """
+        Clear the accumulated events of the persistence image.
+
+        :returns: None
+        """
+        self.model.reset_persistence()
 
 
 class ScalarsCanvas(BasePlotCanvas):
@@ -355,21 +245,9 @@ class ScalarsCanvas(BasePlotCanvas):
     :param max_length: maximum number of values to plot
     :type max_length: int
     """
-    DEFAULT_CHANNEL_CONFIG = [True, True, True, True]
-    CHANNEL_COLORS = ['y', 'm', 'c', 'b']
-    TRIGGER_COLOR = 'g'
-
     def __init__(self, parent, logger, max_length=40):
-
-        BasePlotCanvas.__init__(self, parent, logger, ymin=0, ymax=20,
-                                xlabel="Time (s)", ylabel="Rate (1/s)")
-        self.show_trigger = True
-        self.max_length = max_length
-        self.channel_data = [[], [], [], []]
-        self.trigger_data = []
-        self.time_data = []
-        self.time_window = 0
-        self.reset()
+        BasePlotCanvas.__init__(self, parent,
+                                ScalarsPlot(logger, max_length=max_length))
 
     def reset(self, show_pending=False):
         """
@@ -379,110 +257,27 @@ class ScalarsCanvas(BasePlotCanvas):
         :type show_pending: bool
         :returns: None
         """
-        self.ax.clear()
-        self.ax.grid()
-        self.ax.set_xlabel(self.xlabel)
-        self.ax.set_ylabel(self.ylabel)
-        self.ax.set_xlim((self.xmin, self.xmax))
-        self.ax.set_ylim((self.ymin, self.ymax))
-
-        self.channel_data = [[], [], [], []]
-        self.trigger_data = []
-        self.time_data = []
-        self.time_window = 0
-
-        for ch in range(4):
-            self.ax.plot(self.time_data, self.channel_data[ch],
-                         c=self.CHANNEL_COLORS[ch],
-                         label=("ch%d" % ch), lw=3)
-        if self.show_trigger:
-            self.ax.plot(self.time_data, self.trigger_data, c='g',
-                         label='trigger', lw=3)
-
-        if show_pending:
-            left, width = .25, .5
-            bottom, height = .35, .8
-            right = left + width
-            top = bottom + height
-            self.ax.text(0.5 * (left + right), 0.5 * (bottom + top),
-                         'Measuring...', horizontalalignment='center',
-                         verticalalignment='center', fontsize=56, color='red',
-                         fontweight="heavy", alpha=.8, rotation=30,
-                         transform=self.fig.transFigure)
-
-        self.fig.canvas.draw()
-
-    def update_plot(self, data, show_trigger=True,
-                    enabled_channels=DEFAULT_CHANNEL_CONFIG):
-        """
-        Update plot
-
-        :param data: plot data
-        :type data: list of lists
-        :param show_trigger: show trigger in plot
-        :type show_trigger: bool
-        :param enabled_channels: enabled channels
-        :type enabled_channels: list of bool
-        :returne: None
-        """
-        # do a complete redraw of the plot to avoid memory leak!
-        self.ax.clear()
-        self.show_trigger = show_trigger
-
-        self.ax.grid()
-        self.ax.set_xlabel(self.xlabel)
-        self.ax.set_ylabel(self.ylabel)
-
-        self.logger.debug("result : %s" % data)
-
-        # update lines data using the lists with new data
-        self.time_window += data[5]
-        self.time_data.append(self.time_window)
-
-        for ch in range(4):
-            self.channel_data[ch].append(data[ch])
-            if enabled_channels[ch]:
-                self.ax.plot(self.time_data, self.channel_data[ch],
-                             c=self.CHANNEL_COLORS[ch],
-                             label=("ch%d" % ch), lw=2, marker='v')
-
-        self.trigger_data.append(data[4])
-
-        if self.show_trigger:
-            self.ax.plot(self.time_data, self.trigger_data,
-                         c=self.TRIGGER_COLOR,
-                         label='trg', lw=2, marker='x')
-
-        try:
-            # get count of active cannels
-            channels = enabled_channels + [show_trigger]
-            active_count = sum(channels)
-
-            self.ax.legend(bbox_to_anchor=(0., 1.02, 1., .102), loc=3,
-                           ncol=active_count, mode="expand", borderaxespad=0.,
-                           handlelength=2)
-        except Exception as e:
-            self.logger.info("An error with the legend occurred: %s" % e)
-            self.ax.legend(loc=2)
-
-        if len(self.channel_data[0]) > self.max_length:
-            for ch in range(4):
-                self.channel_data[ch].remove(self.channel_data[ch][0])
-            self.trigger_data.remove(self.trigger_data[0])
-            self.time_data.remove(self.time_data[0])
-
-        ma = max(max(self.channel_data[0]), max(self.channel_data[1]),
-                 max(self.channel_data[2]), max(self.channel_data[3]),
-                 max(self.trigger_data))
-
-        self.ax.set_ylim(0, ma * 1.1)
-
-        # do not set x-range if time_data consists of only one item to
-        # avoid matlibplot UserWarning
-        if len(self.time_data) > 1:
-            self.ax.set_xlim(self.time_data[0], self.time_data[-1])
-
-        self.fig.canvas.draw()
+        self.model.reset(show_pending=show_pending)
+
+    def get_state(self):
+        """
+        Copy of the rate history, see
+        :meth:`muonic_gui.plots.models.ScalarsPlot.get_state`
+
+        :returns: dict
+        """
+        return self.model.get_state()
+
+    def restore(self, state):
+        """
+        Replace the rate history, see
+        :meth:`muonic_gui.plots.models.ScalarsPlot.restore`
+
+        :param state: the saved rate history
+        :type state: dict
+        :returns: None
+        """
+        self.model.restore(state)
 
 
 class LifetimeCanvas(BaseHistogramCanvas):
@@ -495,12 +290,12 @@ class LifetimeCanvas(BaseHistogramCanvas):
     :type logger: logging.Logger
     :param binning: the binning to use for this canvas
     :type binning: list or tuple or numpy.ndarray
+    :param max_values: maximum number of raw values to keep
+    :type max_values: int
     """
-    def __init__(self, parent, logger, binning=(0, 10, 21)):
+    def __init__(self, parent, logger, binning=(0, 10, 21), **kwargs):
         BaseHistogramCanvas.__init__(
-                self, parent, logger,
-                np.linspace(binning[0], binning[1], binning[2]),
-                xlabel="Time between Pulses ($\mu$s)", ylabel="Events")
+                self, parent, LifetimePlot(logger, binning=binning, **kwargs))
 
 
 class VelocityCanvas(BaseHistogramCanvas):
@@ -512,14 +307,12 @@ class VelocityCanvas(BaseHistogramCanvas):
     :type logger: logging.Logger
     :param binning: the binning to use for this canvas
     :type binning: list or tuple or numpy.ndarray
+    :param max_values: maximum number of raw values to keep
+    :type max_values: int
     """
-    def __init__(self, parent, logger, binning=(0., 30, 25)):
+    def __init__(self, parent, logger, binning=(0., 30, 25), **kwargs):
         BaseHistogramCanvas.__init__(
-                self, parent, logger,
-                np.linspace(binning[0], binning[1], binning[2]),
-                xmin=0., xmax=30, ymin=0, ymax=2,
-                ylabel="Events", xlabel="Flight Time (ns)")
-        self.dimension = r"$ns$"
+                self, parent, VelocityPlot(logger, binning=binning, **kwargs))
 
 
 class PulseWidthCanvas(BaseHistogramCanvas):
@@ -531,19 +324,14 @@ class PulseWidthCanvas(BaseHistogramCanvas):
     :type logger: logging.Logger
     :param hist_color: the color of the histogram
     :type hist_color: str
+    :param title: title of the plot
+    :type title: str
+    :param max_values: maximum number of raw values to keep
+    :type max_values: int
     """
-    def __init__(self, parent, logger, hist_color="r", title=None):
+    def __init__(self, parent, logger, hist_color="r", title=None,
+                 **kwargs):
         BaseHistogramCanvas.__init__(
-                self, parent, logger, np.linspace(0., 100, 30),
-                hist_color=hist_color, xmin=0., xmax=100, ymin=0, ymax=2,
-                ylabel="Events", xlabel="Pulse Width (ns)")
-        self.ax_title = title if title is not None else "Pulse Widths"
-        self.ax.set_title(self.ax_title)
-        self.ax.figure.tight_layout()
-        self.fig.canvas.draw()
-
-    def update_plot(self, data):
-        BaseHistogramCanvas.update_plot(self, data)
-        # self.ax.set_title(self.ax_title)
-        # self.ax.figure.tight_layout()
-        # self.fig.canvas.draw()
+                self, parent,
+                PulseWidthPlot(logger, hist_color=hist_color, title=title,
+                               **kwargs))
@@ -19,17 +19,21 @@ from PyQt5 import QtGui, QtWidgets
 from PyQt5 import QtCore, QtWidgets
 
 from muonic.daq.provider import BaseDAQProvider
-from muonic.lib.analyzers import RateAnalyzer, PulseAnalyzer, DecayAnalyzer, VelocityAnalyzer
-from muonic_gui.gui.helpers import HistoryAwareLineEdit
+from muonic_gui.gui.helpers import DAQLogModel, HistoryAwareLineEdit
+from muonic_gui.lib.tracing import TRACER
 from muonic_gui.gui.plot_canvases import ScalarsCanvas, LifetimeCanvas
 from muonic_gui.gui.plot_canvases import PulseCanvas, PulseWidthCanvas
 from muonic_gui.gui.plot_canvases import VelocityCanvas
 from muonic_gui.gui.dialogs import DecayConfigDialog
 from muonic_gui.gui.dialogs import VelocityConfigDialog, FitRangeConfigDialog
+from muonic_gui.gui.dialogs import BinningConfigDialog
 from muonic_gui.analysis import fit, gaussian_fit
 from muonic_gui.analysis import VelocityTrigger, DecayTriggerThorough
-# from muonic.util import rename_muonic_file, get_hours_from_duration
-# from muonic.util import get_setting, WrappedFile
+from muonic_gui.analysis.scalars import parse_scalars
+from muonic_gui.lib.daqlog import KIND_NAMES
+from muonic_gui.lib.rawlog import RawLogWriter
+from muonic_gui.lib.snapshot import to_timestamp, from_timestamp
+from muonic_gui.lib.writers import DATA_DIRECTORY, data_filename
 
 class BaseWidget(QtWidgets.QWidget):
     """
@@ -94,6 +98,54 @@ class BaseWidget(QtWidgets.QWidget):
         """
         pass
 
+    def measuring(self):
+        """
+        Returns True while the time since 'start_time' counts for the
+        measurement duration.
+
+        :returns: bool
+        """
+        return self.active()
+
+    def get_session_state(self):
+        """
+        The start time and the duration of the measurement for a session
+        snapshot. A running measurement counts until now.
+
+        :returns: dict
+        """
+        state = dict()
+
+        if hasattr(self, "measurement_duration"):
+            duration = self.measurement_duration
+
+            if self.measuring():
+                duration += datetime.datetime.utcnow() - self.start_time
+
+            state["measurement_duration"] = duration.total_seconds()
+            state["start_time"] = to_timestamp(self.start_time)
+
+        if hasattr(self, "active_since"):
+            state["active_since"] = to_timestamp(self.active_since)
+
+        return state
+
+    def restore_session_state(self, state):
+        """
+        Restore the state saved by get_session_state.
+
+        :param state: the saved state
+        :type state: dict
+        :returns: None
+        """
+        if "measurement_duration" in state:
+            self.measurement_duration = datetime.timedelta(
+                    seconds=float(state["measurement_duration"]))
+            self.start_time = from_timestamp(state["start_time"])
+
+        if "active_since" in state:
+            self.active_since = from_timestamp(state["active_since"])
+
     def daq_put(self, msg):
         """
         Send message to DAQ cards. Reuses the connection of the parent widget
@@ -114,6 +166,20 @@ class BaseWidget(QtWidgets.QWidget):
             return True
         return False
 
+    def daq_request(self, command, callback):
+        """
+        Send a command to the DAQ card and call 'callback' with the future
+        of the request once the reply arrived, see
+        :meth:`muonic_gui.gui.application.Application.daq_request`.
+
+        :param command: one of TL, DC, DS or DG
+        :type command: str
+        :param callback: called with a concurrent.futures.Future
+        :type callback: callable
+        :returns: None
+        """
+        self.parent.daq_request(command, callback)
+
     def daq_get_last_msg(self):
         """
         Get the last DAQ message received by the parent, if present.
@@ -124,6 +190,43 @@ class BaseWidget(QtWidgets.QWidget):
             return self.parent.last_daq_msg
         return None
 
+    def configure_binning(self, canvases, limits, dimension=''):
+        """
+        Let the user change the binning and the y-axis scale of histogram
+        canvases. The collected values are kept and histogrammed again.
+
+        :param canvases: the histogram canvases to configure
+        :type canvases: list of BaseHistogramCanvas
+        :param limits: lowest and highest value for the bin edges
+        :type limits: tuple of float
+        :param dimension: suffix
+        :type dimension: str
+        :returns: tuple or None -- the new binning or None if canceled
+        """
+        dialog = BinningConfigDialog(canvases[0].binning, limits,
+                                     log_y=canvases[0].log_y,
+                                     dimension=dimension)
+
+        if dialog.exec_() != 1:
+            return None
+
+        binning = (dialog.get_widget_value("lower_limit"),
+                   dialog.get_widget_value("upper_limit"),
+                   dialog.get_widget_value("bins") + 1)
+
+        if binning[0] >= binning[1]:
+            self.logger.warning(("Invalid binning %s, lower edge has to " +
+                                 "be below the upper edge") % repr(binning))
+            return None
+
+        for canvas in canvases:
+            canvas.set_log_y(dialog.get_widget_value("log_y"))
+            canvas.rebin(binning)
+
+        self.logger.info("Using binning %s" % repr(binning))
+
+        return binning
+
     def finish(self):
         """
         Gets called upon closing application. Implement cleanup routines like
@@ -140,12 +243,16 @@ class RateWidget(BaseWidget):
 
     :param logger: logger object
     :type logger: logging.Logger
-    :param filename: filename for the rate data file
-    :type filename: str
+    :param opts: the options of muonic
+    :type opts: dict
     :param parent: parent widget
     """
     SCALAR_BUF_SIZE = 5
 
+    # column headers of the rate data file
+    DATA_FILE_HEADER = ("# date time R0 R1 R2 R3 R_trigger chan0 chan1 " +
+                        "chan2 chan3 trigger Delta_time\n")
+
     def __init__(self, logger, opts, parent=None):
         BaseWidget.__init__(self, logger, opts, parent)
 
@@ -171,13 +278,14 @@ class RateWidget(BaseWidget):
 
         # we will write the column headers of the data into
         # data_file in the first run
-        # self.first_run = True
+        self.first_run = True
 
         # are we in first cycle after start button is pressed?
         # self.first_cycle = False
 
-        # data file options
-        # self.data_file = WrappedFile(filename)
+        # data file, written in the background
+        self.data_file = self.parent.writer.open(
+                data_filename("R", self.start_time))
 
         # rates store
         self.rates = None
@@ -300,13 +408,7 @@ class RateWidget(BaseWidget):
         :type: str
         :return: list of ints
         """
-        scalars = self.new_scalar_buffer()
-
-        for item in msg.split():
-            for i in range(self.SCALAR_BUF_SIZE):
-                if item.startswith("S%d" % i) and len(item) == 11:
-                    scalars[i] = int(item[3:], 16)
-        return scalars
+        return parse_scalars(msg)
 
     # def calculate(self):
     #     """
@@ -408,10 +510,10 @@ class RateWidget(BaseWidget):
     #     self.update_info_field("max_rate", "%.3f 1/s" % self.max_rate)
     #
     #     for i in range(4):
-    #         self.update_fields(i, self.parent.get_setting("active_ch%d" % i))
+    #         self.update_fields(i, self.parent._app.get_setting("active_ch%d" % i))
     #     self.update_fields(4, self.show_trigger)
     #
-    #     channel_config = [self.parent.get_setting("active_ch%d" % i) for i in range(4)]
+    #     channel_config = [self.parent._app.get_setting("active_ch%d" % i) for i in range(4)]
     #
     #     self.scalars_monitor.update_plot(self.rates, self.show_trigger,
     #                                      channel_config)
@@ -481,8 +583,6 @@ class RateWidget(BaseWidget):
         self.stop_button.setEnabled(True)
         self.table.setEnabled(True)
 
-        time.sleep(0.2)
-
         self.first_cycle = True
         self.time_window = 0
 
@@ -491,7 +591,7 @@ class RateWidget(BaseWidget):
 
         # update table fields
         for i in range(4):
-            self.update_fields(i, self.parent._app.get_setting("active_ch%d" % i),
+            self.update_fields(i, self.parent.daq_state.get("active_ch%d" % i),
                                disable_only=True)
 
         self.update_fields(4, self.show_trigger, disable_only=True)
@@ -509,9 +609,14 @@ class RateWidget(BaseWidget):
         # reset plot
         self.scalars_monitor.reset(show_pending=True)
 
-        for a in self.parent._analyzers:
-            if isinstance(a, RateAnalyzer):
-                a.disabled = False
+        self.data_file.open("rate measurement")
+
+        if self.first_run:
+            self.data_file.write(self.DATA_FILE_HEADER)
+            self.first_run = False
+
+        self.parent.records.attach("rate", self.data_file)
+        self.parent.registry.subscribe("rate", self)
 
         # print("DEBUG RateWidget.start END")
 
@@ -540,13 +645,10 @@ class RateWidget(BaseWidget):
         self.update_info_field("daq_time", enable=False)
         self.update_info_field("max_rate", enable=False)
 
-        # self.data_file.write("# stopped run on: %s\n" %
-        #                      stop_time.strftime("%a %d %b %Y %H:%M:%S UTC"))
-        # self.data_file.close()
+        self.parent.records.detach("rate")
+        self.data_file.close()
 
-        for a in self.parent._analyzers:
-            if isinstance(a, RateAnalyzer):
-                a.disabled = True
+        self.parent.registry.unsubscribe("rate", self)
 
         if self.parent.opts.get("MySQL") is not None:
             for c in self.parent._consumers:
@@ -555,6 +657,31 @@ class RateWidget(BaseWidget):
 
         # print("DEBUG RateWidget.stop END")
 
+    def get_session_state(self):
+        """
+        The start time, the duration and the rate history for a session
+        snapshot.
+
+        :returns: dict
+        """
+        state = BaseWidget.get_session_state(self)
+        state["rates"] = self.scalars_monitor.get_state()
+
+        return state
+
+    def restore_session_state(self, state):
+        """
+        Restore the state saved by get_session_state.
+
+        :param state: the saved state
+        :type state: dict
+        :returns: None
+        """
+        BaseWidget.restore_session_state(self, state)
+
+        if "rates" in state:
+            self.scalars_monitor.restore(state["rates"])
+
     def finish(self):
         """
         Cleanup, close and rename data file
@@ -567,22 +694,15 @@ class RateWidget(BaseWidget):
             stop_time = datetime.datetime.utcnow()
 
             self.measurement_duration += stop_time - self.start_time
+            self.parent.records.detach("rate")
+
+        if self.data_file.opened:
+            self.logger.info("The rate measurement was active for %f hours" %
+                             (self.measurement_duration.total_seconds() /
+                              3600.))
 
-            # self.data_file.write("# stopped run on: %s\n" %
-            #                      stop_time.strftime("%a %d %b %Y %H:%M:%S UTC"))
-            # self.data_file.close()
-
-        # only rename if file actually exists
-        # if os.path.exists(self.data_file.get_filename()):
-        #     try:
-        #         self.logger.info(("The rate measurement was active " +
-        #                           "for %f hours") %
-        #                          get_hours_from_duration(
-        #                                  self.measurement_duration))
-        #         rename_muonic_file(self.measurement_duration,
-        #                            self.data_file.get_filename())
-        #     except (OSError, IOError):
-        #         pass
+        # close the data file and put the hours into its name
+        self.data_file.finish()
 
         # print("DEBUG RateWidget.finish STOP")
 
@@ -615,6 +735,17 @@ class PulseAnalyzerWidget(BaseWidget):
                                  "selected time window")
         self.checkbox.clicked.connect(self.on_checkbox_clicked)
 
+        self.persistence_checkbox = QtWidgets.QCheckBox(self)
+        self.persistence_checkbox.setText("Persistence")
+        self.persistence_checkbox.setToolTip("Accumulate the pulses of the " +
+                                             "last events into a density " +
+                                             "image")
+        self.persistence_checkbox.clicked.connect(
+                self.on_persistence_clicked)
+
+        self.pulse_canvas = PulseCanvas(self, logger)
+        self.pulse_toolbar = NavigationToolbar(self.pulse_canvas, self)
+
         self.pulse_width_canvases = []
         self.pulse_width_toolbars = []
 
@@ -623,10 +754,22 @@ class PulseAnalyzerWidget(BaseWidget):
                                                     title="Pulse Widths Ch %d"%i)))
             self.pulse_width_toolbars.append(NavigationToolbar(self.pulse_width_canvases[-1], self))
 
-        layout.addWidget(self.checkbox, 0, 0, 1, 2)
+        self.binning_button = QtWidgets.QPushButton("Binning")
+        self.binning_button.setToolTip("Change the binning of the pulse " +
+                                       "width distributions")
+        self.binning_button.clicked.connect(self.on_binning_clicked)
+
+        options_layout = QtWidgets.QHBoxLayout()
+        options_layout.addWidget(self.persistence_checkbox)
+        options_layout.addWidget(self.binning_button)
+
+        layout.addWidget(self.checkbox, 0, 0)
+        layout.addLayout(options_layout, 0, 1)
+        layout.addWidget(self.pulse_canvas, 1, 0, 1, 2)
+        layout.addWidget(self.pulse_toolbar, 2, 0, 1, 2)
 
         for i in range(4):
-            cx = i//2 * 2 + 1
+            cx = i//2 * 2 + 3
             cy = i%2
 
             layout.addWidget(self.pulse_width_canvases[i], cx, cy)
@@ -697,6 +840,24 @@ class PulseAnalyzerWidget(BaseWidget):
         else:
             self.stop()
 
+    def on_persistence_clicked(self):
+        """
+        Switches the oscilloscope between last event and persistence display
+
+        :returns: None
+        """
+        self.pulse_canvas.set_persistence(
+                self.persistence_checkbox.isChecked())
+
+    def on_binning_clicked(self):
+        """
+        Adjust the binning of the pulse width distributions
+
+        :returns: None
+        """
+        self.configure_binning(self.pulse_width_canvases, (0., 1000.),
+                               dimension='ns')
+
     def start(self):
         """
         Starts the pulse analyzer
@@ -709,14 +870,14 @@ class PulseAnalyzerWidget(BaseWidget):
         self.logger.debug("switching on pulse analyzer.")
         self.active(True)
 
+        self.pulse_canvas.reset_persistence()
+
         # self.daq_put("CE")
 
         # extract pulses to file
-        # self.pulse_extractor.write_pulses(True)
+        self.parent.write_pulses(True)
 
-        for a in self.parent._analyzers:
-            if isinstance(a, PulseAnalyzer):
-                a.disabled = False
+        self.parent.registry.subscribe("pulse", self)
 
     def stop(self):
         """
@@ -732,14 +893,9 @@ class PulseAnalyzerWidget(BaseWidget):
 
         # stop extracting pulses to file if decay and velocity
         # measurements are inactive and global setting is also false
-        # if (not self.parent.get_setting("write_pulses") and
-        #         not self.parent.is_widget_active("decay") and
-        #         not self.parent.is_widget_active("velocity")):
-        #     self.pulse_extractor.write_pulses(False)
+        self.parent.write_pulses(False)
 
-        for a in self.parent._analyzers:
-            if isinstance(a, PulseAnalyzer):
-                a.disabled = True
+        self.parent.registry.unsubscribe("pulse", self)
 
         if self.parent.opts.get("MySQL") is not None:
             for c in self.parent._consumers:
@@ -757,6 +913,11 @@ class StatusWidget(BaseWidget):
     :param parent: parent widget
     """
     TEXT_UNSET = "not set yet - click on Refresh."
+    # tracing stages shown, named by their end, and the update interval
+    LATENCY_STAGES = [("push", "Line to GUI consumer:"),
+                      ("draw", "Consumer to drawn plot:"),
+                      ("total", "Line to drawn plot:")]
+    LATENCY_INTERVAL = 1000
 
     def __init__(self, logger, parent=None):
         BaseWidget.__init__(self, logger, None, parent)
@@ -857,11 +1018,83 @@ class StatusWidget(BaseWidget):
         layout.addWidget(self.muonic_widgets['start_params'], 9, 1, 2, 4)
         layout.addWidget(self.muonic_widgets['open_files'], 11, 1, 2, 4)
 
+        # add latency tracing widgets
+        self.tracing_checkbox = QtWidgets.QCheckBox("enabled", self)
+        self.tracing_checkbox.setChecked(TRACER.enabled)
+        self.tracing_checkbox.toggled.connect(self.on_tracing_toggled)
+
+        layout.addWidget(QtWidgets.QLabel(self), 13, 0)
+        layout.addWidget(QtWidgets.QLabel("Latency tracing:"), 14, 0)
+        layout.addWidget(self.tracing_checkbox, 14, 1)
+
+        for column, label in enumerate(["median", "99th percentile",
+                                        "traces"]):
+            layout.addWidget(QtWidgets.QLabel(label), 15, column + 1)
+
+        self.latency_widgets = dict()
+
+        for row, (stage, label) in enumerate(self.LATENCY_STAGES):
+            layout.addWidget(QtWidgets.QLabel(label), 16 + row, 0)
+            self.latency_widgets[stage] = []
+
+            for column in range(3):
+                field = QtWidgets.QLineEdit(self)
+                field.setReadOnly(True)
+                field.setDisabled(True)
+                layout.addWidget(field, 16 + row, column + 1)
+                self.latency_widgets[stage].append(field)
+
+        self.latency_timer = QtCore.QTimer()
+        self.latency_timer.timeout.connect(self.update_latencies)
+
+        if TRACER.enabled:
+            self.latency_timer.start(self.LATENCY_INTERVAL)
+
         self.refresh_button = QtWidgets.QPushButton("Refresh")
         self.refresh_button.setDisabled(False)
         self.refresh_button.clicked.connect(self.on_refresh_clicked)
 
-        layout.addWidget(self.refresh_button, 13, 0, 1, 6)
+        layout.addWidget(self.refresh_button, 16 + len(self.LATENCY_STAGES),
+                         0, 1, 6)
+
+        # the DAQ fields follow the DAQ state from now on
+        self.show_daq_state(self.parent.daq_state.values())
+
+    def on_tracing_toggled(self, enabled):
+        """
+        Switch the latency tracing on or off.
+
+        :param enabled: trace the latencies
+        :type enabled: bool
+        :returns: None
+        """
+        TRACER.set_enabled(enabled)
+
+        if enabled:
+            self.latency_timer.start(self.LATENCY_INTERVAL)
+        else:
+            self.latency_timer.stop()
+
+        self.update_latencies()
+
+    def update_latencies(self):
+        """
+        Show the latency percentiles of the tracing stages.
+
+        :returns: None
+        """
+        percentiles = TRACER.percentiles((50, 99))
+
+        for stage, fields in self.latency_widgets.items():
+            total, values = percentiles.get(stage, (0, [None, None]))
+
+            for field, value in zip(fields, values):
+                field.setText("" if value is None else
+                              "%.3g ms" % (value * 1000.))
+                field.setEnabled(TRACER.enabled)
+
+            fields[2].setText("%d" % total)
+            fields[2].setEnabled(TRACER.enabled)
 
     def on_refresh_clicked(self):
         """
@@ -872,34 +1105,92 @@ class StatusWidget(BaseWidget):
         self.refresh_button.setDisabled(True)
         self.logger.debug("Refreshing status information.")
 
-        # request status information from DAQ card
-        self.daq_put('TL')
-        time.sleep(0.5)
-        self.daq_put('DC')
-        time.sleep(0.5)
+        # request status information from DAQ card, one after the other
+        self.daq_request('TL', self.on_thresholds_received)
+
+    def on_thresholds_received(self, future):
+        """
+        Request the channel configuration once the thresholds arrived.
+
+        :param future: the future of the TL request
+        :type future: concurrent.futures.Future
+        :returns: None
+        """
+        self.daq_request('DC', self.on_channel_config_received)
+
+    def on_channel_config_received(self, future):
+        """
+        Show the status information once the channel configuration arrived.
 
+        :param future: the future of the DC request
+        :type future: concurrent.futures.Future
+        :returns: None
+        """
         self.active(True)
-        self.parent.process_incoming()
+        self.update()
 
-    def _update_daq_stats(self):
+    def show_daq_state(self, values):
         """
-        Gather daq status information.
+        Show a changed configuration of the DAQ card. Called by the
+        application whenever the DAQ state changes, so the fields are always
+        up to date without asking the card.
 
+        :param values: the values by setting name, see
+            :class:`muonic_gui.daq.state.DAQState`
+        :type values: dict
         :returns: None
         """
+        self._update_daq_stats(values)
+
         for i in range(4):
-            self.daq_stats['active_channels'][i] = \
-                self.parent.get_setting("active_ch%d" % i)
-            self.daq_stats['thresholds'][i] = \
-                ("%d mV" % self.parent.get_setting("threshold_ch%d" % i))
+            self.daq_widgets['thresholds'][i].setText(
+                    self.daq_stats['thresholds'][i])
+            self.daq_widgets['thresholds'][i].setEnabled(True)
 
-        if self.parent.get_setting("veto"):
+            self.daq_widgets['active_channels'][i].setEnabled(
+                    bool(self.daq_stats['active_channels'][i]))
+
+        for key in ['coincidences', 'coincidence_time', 'veto']:
+            self.daq_widgets[key].setText(self.daq_stats[key])
+            self.daq_widgets[key].setEnabled(True)
+
+    def _update_daq_stats(self, values):
+        """
+        Gather daq status information.
+
+        :param values: the configuration of the DAQ card by setting name
+        :type values: dict
+        :returns: None
+        """
+        for i in range(4):
+            self.daq_stats['active_channels'][i] = values["active_ch%d" % i]
+            threshold = values["threshold_ch%d" % i]
+            self.daq_stats['thresholds'][i] = (
+                    self.TEXT_UNSET if threshold is None
+                    else "%d mV" % threshold)
+
+        self.daq_stats['veto'] = 'no veto set'
+        if values["veto"]:
             for i in range(3):
-                if self.parent.get_setting("veto_ch%d" % i):
+                if values["veto_ch%d" % i]:
                     self.daq_stats['veto'] = "veto with channel %d" % i
-        else:
-            self.daq_stats['veto'] = 'no veto set'
 
+        gate_width = values["gate_width"]
+        self.daq_stats['coincidence_time'] = (
+                self.TEXT_UNSET if gate_width is None
+                else "%d ns" % gate_width)
+
+        for i, value in enumerate(["Single", "Twofold", "Threefold",
+                                   "Fourfold"]):
+            if values["coincidence%d" % i]:
+                self.daq_stats['coincidences'] = "%s Coincidence" % value
+
+    def _update_decay_veto(self):
+        """
+        Gather the software veto of the decay measurement.
+
+        :returns: None
+        """
         if self.parent.is_widget_active("decay"):
             self.daq_stats['decay_veto'] = \
                 "software veto with channel %d" % (
@@ -908,14 +1199,6 @@ class StatusWidget(BaseWidget):
             self.daq_stats['decay_veto'] = ("not set yet - start Muon " +
                                             "Decay Measurement.")
 
-        self.daq_stats['coincidence_time'] = ("%d ns" %
-                                              self.parent.get_setting("gate_width"))
-
-        for i, value in enumerate(["Single", "Twofold", "Threefold",
-                                   "Fourfold"]):
-            if self.parent.get_setting("coincidence%d" % i):
-                self.daq_stats['coincidences'] = "%s Coincidence" % value
-
     def _update_muonic_stats(self):
         """
         Gather muonic status information.
@@ -933,13 +1216,18 @@ class StatusWidget(BaseWidget):
 
         self.muonic_stats['measurements'] = ", ".join(measurements)
         self.muonic_stats['refresh_time'] = ("%f s" %
-                                             self.parent.get_setting("time_window"))
+                                             self.parent._app.get_setting("time_window"))
 
-        # since we use WrappedFile for opening file, we can
-        # easily track the open files
-        # open_files = WrappedFile.get_open_files()
+        # the files are written in the background by the writer, which
+        # also tracks the open files
+        writer = self.parent.writer
+        open_files = writer.open_files()
+        open_files.append("write queue: %d, %.1f kB/s, %d dropped" %
+                          (writer.queue_depth(),
+                           writer.bytes_per_second() / 1024.,
+                           writer.dropped))
 
-        # self.muonic_stats['open_files'] = "\n".join(open_files)
+        self.muonic_stats['open_files'] = "\n".join(open_files)
 
     def update(self):
         """
@@ -952,7 +1240,8 @@ class StatusWidget(BaseWidget):
 
         self.logger.debug("Refreshing status infos")
 
-        self._update_daq_stats()
+        self._update_daq_stats(self.parent.daq_state.values())
+        self._update_decay_veto()
         self._update_muonic_stats()
 
         # update daq widgets
@@ -1009,7 +1298,8 @@ class VelocityWidget(BaseWidget):
         self.last_event_time = None
         self.active_since = None
 
-        # self.mu_file = WrappedFile(filename)
+        # data file, written in the background
+        self.mu_file = self.parent.writer.open(data_filename("V"))
 
         # measurement duration and start time
         self.measurement_duration = datetime.timedelta()
@@ -1039,9 +1329,12 @@ class VelocityWidget(BaseWidget):
         # self.fit_range_button.setEnabled(False)
         self.fit_range_button.setEnabled(True)
 
+        self.binning_button = QtWidgets.QPushButton("Binning")
+
         self.checkbox.clicked.connect(self.on_checkbox_clicked)
         self.fit_button.clicked.connect(self.on_fit_clicked)
         self.fit_range_button.clicked.connect(self.on_fit_range_clicked)
+        self.binning_button.clicked.connect(self.on_binning_clicked)
 
         self.running_status = None
         # self.muon_counter_label = QtGui.QLabel(self)
@@ -1052,14 +1345,15 @@ class VelocityWidget(BaseWidget):
 
         # add widgets to layout
         layout = QtWidgets.QGridLayout(self)
-        layout.addWidget(self.checkbox, 0, 0, 1, 3)
+        layout.addWidget(self.checkbox, 0, 0, 1, 4)
         # layout.addWidget(self.muon_counter_label, 1, 0)
         # layout.addWidget(self.last_event_label, 2, 0)
         layout.addWidget(self.active_since_label, 3, 0)
-        layout.addWidget(self.plot_canvas, 4, 0, 1, 3)
+        layout.addWidget(self.plot_canvas, 4, 0, 1, 4)
         layout.addWidget(navigation_toolbar, 5, 0)
-        layout.addWidget(self.fit_range_button, 5, 1)
-        layout.addWidget(self.fit_button, 5, 2)
+        layout.addWidget(self.binning_button, 5, 1)
+        layout.addWidget(self.fit_range_button, 5, 2)
+        layout.addWidget(self.fit_button, 5, 3)
 
         if self.parent.opts.get("MySQL") is not None:
             from muonic_mysql.consumer import MySqlConsumer
@@ -1073,11 +1367,23 @@ class VelocityWidget(BaseWidget):
         self.logger.debug("Using fit range of %s" % repr(self.fit_range))
         fit_results = gaussian_fit(
                 bincontent=np.asarray(self.plot_canvas.heights),
-                binning=self.binning, fitrange=self.fit_range)
+                binning=self.plot_canvas.binning, fitrange=self.fit_range)
 
         if fit_results is not None:
             self.plot_canvas.show_fit(*fit_results)
 
+    def on_binning_clicked(self):
+        """
+        Adjust the binning of the muon velocity histogram
+
+        :returns: None
+        """
+        binning = self.configure_binning([self.plot_canvas], (-1., 60.),
+                                         dimension='ns')
+
+        if binning is not None:
+            self.binning = binning
+
     def on_fit_range_clicked(self):
         """
         Adjust the fit range
@@ -1186,11 +1492,11 @@ class VelocityWidget(BaseWidget):
             self.parent.status_bar.addPermanentWidget(self.running_status)
 
             self.start_time = datetime.datetime.utcnow()
-            # self.mu_file.open("a")
-            # self.mu_file.write("# new velocity measurement run from: %s\n" %
-            #                    self.start_time.strftime("%a %d %b %Y %H:%M:%S UTC"))
+            self.mu_file.open("velocity measurement")
 
             self.active(True)
+            self.parent.records.attach("velocity", self.mu_file)
+            self.parent.registry.subscribe("velocity", self)
 
             # restart rate measurement
             self.parent.get_widget("rate").stop()
@@ -1200,17 +1506,13 @@ class VelocityWidget(BaseWidget):
             # self.daq_put("CE")
 
             # write pulses to file
-            # self.pulse_extractor.write_pulses(True)
+            self.parent.write_pulses(True)
         else:
             self.logger.info("Moun velocity config canceled")
             self.active(False)
             self.checkbox.setChecked(False)
             self.active_since_label.setText("")
 
-        for a in self.parent._analyzers:
-            if isinstance(a, VelocityAnalyzer):
-                a.disabled = False
-
 
     def stop(self):
         """
@@ -1227,26 +1529,21 @@ class VelocityWidget(BaseWidget):
         self.logger.info("Muon velocity mode now deactivated, returning to " +
                          "previous setting (if available)")
 
-        # self.mu_file.write("# stopped run on: %s\n" %
-        #                    stop_time.strftime("%a %d %b %Y %H:%M:%S UTC"))
-        # self.mu_file.close()
+        self.parent.records.detach("velocity")
+        self.mu_file.close()
+
+        self.active(False)
 
         # stop extracting pulses to file if pulse analyzer and decay
         # measurements are inactive and global setting is also false
-        # if (not self.parent.get_setting("write_pulses") and
-        #         not self.parent.is_widget_active("pulse") and
-        #         not self.parent.is_widget_active("decay")):
-        #     self.pulse_extractor.write_pulses(False)
+        self.parent.write_pulses(False)
 
-        self.active(False)
         self.checkbox.setChecked(False)
         self.active_since_label.setText("")
         self.parent.status_bar.removeWidget(self.running_status)
         self.parent.get_widget("rate").stop()
 
-        for a in self.parent._analyzers:
-            if isinstance(a, VelocityAnalyzer):
-                a.disabled = True
+        self.parent.registry.unsubscribe("velocity", self)
 
         if self.parent.opts.get("MySQL") is not None:
             for c in self.parent._consumers:
@@ -1255,31 +1552,25 @@ class VelocityWidget(BaseWidget):
 
     def finish(self):
         """
-        Cleanup, close and rename decay file
+        Cleanup, close and rename velocity file
 
         :returns: None
         """
-        # if not self.mu_file.closed:
-        #     stop_time = datetime.datetime.utcnow()
-        #
-        #     # add duration
-        #     self.measurement_duration += stop_time - self.start_time
-        #
-        #     self.mu_file.write("# stopped run on: %s\n" %
-        #                        stop_time.strftime("%a %d %b %Y %H:%M:%S UTC"))
-        #     self.mu_file.close()
-
-        # only rename if file actually exists
-        # if os.path.exists(self.mu_file.get_filename()):
-        #     try:
-        #         self.logger.info(("The muon velocity measurement was " +
-        #                           "active for %f hours") %
-        #                          get_hours_from_duration(
-        #                              self.measurement_duration))
-        #         rename_muonic_file(self.measurement_duration,
-        #                            self.mu_file.get_filename())
-        #     except (OSError, IOError):
-        #         pass
+        if not self.mu_file.closed:
+            stop_time = datetime.datetime.utcnow()
+
+            # add duration
+            self.measurement_duration += stop_time - self.start_time
+            self.parent.records.detach("velocity")
+
+        if self.mu_file.opened:
+            self.logger.info(("The muon velocity measurement was " +
+                              "active for %f hours") %
+                             (self.measurement_duration.total_seconds() /
+                              3600.))
+
+        # close the data file and put the hours into its name
+        self.mu_file.finish()
 
 
 class DecayWidget(BaseWidget):
@@ -1294,6 +1585,15 @@ class DecayWidget(BaseWidget):
     :type pulse_extractor: muonic.analysis.analyzer.PulseExtractor
     :param parent: parent widget
     """
+    # DAQ card configuration of the measurement: all channels, singles, no
+    # veto and a gate width of 0x040A * 10 ns
+    DECAY_DAQ_CONFIG = dict([("active_ch%d" % i, True) for i in range(4)] +
+                            [("coincidence%d" % i, i == 0)
+                             for i in range(4)] +
+                            [("veto", False)] +
+                            [("veto_ch%d" % i, False) for i in range(3)] +
+                            [("gate_width", 0x040A * 10)])
+
     def __init__(self, logger, opts, parent=None):
         BaseWidget.__init__(self, logger, opts, parent)
 
@@ -1319,17 +1619,18 @@ class DecayWidget(BaseWidget):
         self.last_event_time = None
         self.active_since = None
 
-        # self.mu_file = WrappedFile(filename)
+        # data file, written in the background
+        self.mu_file = self.parent.writer.open(data_filename("L"))
 
         # measurement duration and start time
         self.measurement_duration = datetime.timedelta()
         self.start_time = datetime.datetime.utcnow()
 
-        self.previous_coinc_time_03 = "00"
-        self.previous_coinc_time_02 = "0A"
+        # gate width in ns before the measurement, restored when it stops
+        self.previous_gate_width = None
 
         # lifetime plot canvas
-        self.plot_canvas = LifetimeCanvas(self, logger)
+        self.plot_canvas = LifetimeCanvas(self, logger, binning=self.binning)
 
         # we want the plot canvas to fill as much space as possible
         self.plot_canvas.setSizePolicy(
@@ -1351,9 +1652,12 @@ class DecayWidget(BaseWidget):
         # self.fit_range_button.setEnabled(False)
         self.fit_range_button.setEnabled(True)
 
+        self.binning_button = QtWidgets.QPushButton("Binning")
+
         self.checkbox.clicked.connect(self.on_checkbox_clicked)
         self.fit_button.clicked.connect(self.on_fit_clicked)
         self.fit_range_button.clicked.connect(self.on_fit_range_clicked)
+        self.binning_button.clicked.connect(self.on_binning_clicked)
 
         self.running_status = None
         # self.muon_counter_label = QtGui.QLabel(self)
@@ -1364,31 +1668,19 @@ class DecayWidget(BaseWidget):
 
         # add widgets to layout
         layout = QtWidgets.QGridLayout(self)
-        layout.addWidget(self.checkbox, 0, 0, 1, 3)
+        layout.addWidget(self.checkbox, 0, 0, 1, 4)
         # layout.addWidget(self.muon_counter_label, 1, 0)
         # layout.addWidget(self.last_event_label, 2, 0)
         layout.addWidget(self.active_since_label, 3, 0)
-        layout.addWidget(self.plot_canvas, 4, 0, 1, 3)
+        layout.addWidget(self.plot_canvas, 4, 0, 1, 4)
         layout.addWidget(navigation_toolbar, 5, 0)
-        layout.addWidget(self.fit_range_button, 5, 1)
-        layout.addWidget(self.fit_button, 5, 2)
+        layout.addWidget(self.binning_button, 5, 1)
+        layout.addWidget(self.fit_range_button, 5, 2)
+        layout.addWidget(self.fit_button, 5, 3)
 
         if self.parent.opts.get("MySQL") is not None:
             from muonic_mysql.consumer import MySqlConsumer
 
-    def set_previous_coincidence_times(self, time_03, time_02):
-        """
-        Sets the previous coincidence times obtained from the DAQ card
-
-        :param time_03: time 03
-        :type time_03: str
-        :param time_02: time 03
-        :type time_02: str
-        :return:
-        """
-        self.previous_coinc_time_03 = time_03
-        self.previous_coinc_time_02 = time_02
-
     def on_fit_clicked(self):
         """
         Fit the muon decay histogram
@@ -1396,11 +1688,24 @@ class DecayWidget(BaseWidget):
         :returns: None
         """
         fit_results = fit(bincontent=np.asarray(self.plot_canvas.heights),
-                          binning=self.binning, fitrange=self.fit_range)
+                          binning=self.plot_canvas.binning,
+                          fitrange=self.fit_range)
 
         if fit_results is not None:
             self.plot_canvas.show_fit(*fit_results)
 
+    def on_binning_clicked(self):
+        """
+        Adjust the binning of the muon decay histogram
+
+        :returns: None
+        """
+        binning = self.configure_binning([self.plot_canvas], (0., 20.),
+                                         dimension='microsecond')
+
+        if binning is not None:
+            self.binning = binning
+
     def on_fit_range_clicked(self):
         """
         Adjust the fit range
@@ -1548,40 +1853,32 @@ class DecayWidget(BaseWidget):
                                                "measurement active!")
             self.parent.status_bar.addPermanentWidget(self.running_status)
 
-            # configure DAQ card with coincidence/veto settings
-            self.daq_put("DC")
-            self.daq_put("CE")
-            self.daq_put("WC 03 04")
-            self.daq_put("WC 02 0A")
-
-            # this should set the veto to none (because we have a
-            # software veto) and the coincidence to single,
-            # so we take all pulses
-            self.daq_put("WC 00 0F")
+            # configure DAQ card with coincidence/veto settings, this
+            # should set the veto to none (because we have a software
+            # veto) and the coincidence to single, so we take all pulses
+            self.previous_gate_width = self.parent.daq_state.gate_width
+            self.parent.daq_writer.write(self.DECAY_DAQ_CONFIG,
+                                         commands=["CE"])
 
             self.start_time = datetime.datetime.utcnow()
-            # self.mu_file.open("a")
-            # self.mu_file.write("# new decay measurement run from: %s\n" %
-            #                    self.start_time.strftime("%a %d %b %Y %H:%M:%S UTC"))
+            self.mu_file.open("decay measurement")
 
             self.active(True)
+            self.parent.records.attach("decay", self.mu_file)
+            self.parent.registry.subscribe("decay", self)
 
             # restart rate measurement
             self.parent.get_widget("rate").stop()
             self.parent.get_widget("rate").start()
 
             # write pulses to file
-            # self.pulse_extractor.write_pulses(True)
+            self.parent.write_pulses(True)
         else:
             self.logger.info("Moun decay config canceled")
             self.active(False)
             self.checkbox.setChecked(False)
             self.active_since_label.setText("")
 
-        for a in self.parent._analyzers:
-            if isinstance(a, DecayAnalyzer):
-                a.disabled = False
-
     def stop(self):
         """
         Stop check for muon decay
@@ -1594,33 +1891,29 @@ class DecayWidget(BaseWidget):
         stop_time = datetime.datetime.utcnow()
         self.measurement_duration += stop_time - self.start_time
 
-        # reset coincidence times
-        self.daq_put("WC 03 " + self.previous_coinc_time_03)
-        self.daq_put("WC 02 " + self.previous_coinc_time_02)
+        # reset the gate width
+        if self.previous_gate_width is not None:
+            self.parent.daq_writer.write(
+                    {"gate_width": self.previous_gate_width})
 
         self.logger.info("Muon decay mode now deactivated, returning to " +
                          "previous setting (if available)")
 
-        # self.mu_file.write("# stopped run on: %s\n" %
-        #                    stop_time.strftime("%a %d %b %Y %H:%M:%S UTC"))
-        # self.mu_file.close()
+        self.parent.records.detach("decay")
+        self.mu_file.close()
+
+        self.active(False)
 
         # stop extracting pulses to file if pulse analyzer and velocity
         # measurements are inactive and global setting is also false
-        # if (not self.parent.get_setting("write_pulses") and
-        #         not self.parent.is_widget_active("pulse") and
-        #         not self.parent.is_widget_active("velocity")):
-        #     self.pulse_extractor.write_pulses(False)
+        self.parent.write_pulses(False)
 
-        self.active(False)
         self.checkbox.setChecked(False)
         self.active_since_label.setText("")
         self.parent.status_bar.removeWidget(self.running_status)
         self.parent.get_widget("rate").stop()
 
-        for a in self.parent._analyzers:
-            if isinstance(a, DecayAnalyzer):
-                a.disabled = True
+        self.parent.registry.unsubscribe("decay", self)
 
         if self.parent.opts.get("MySQL") is not None:
             for c in self.parent._consumers:
@@ -1634,27 +1927,21 @@ class DecayWidget(BaseWidget):
 
         :returns: None
         """
-        # if not self.mu_file.closed:
-        #     stop_time = datetime.datetime.utcnow()
-        #
-        #     # add duration
-        #     self.measurement_duration += stop_time - self.start_time
-        #
-        #     self.mu_file.write("# stopped run on: %s\n" %
-        #                        stop_time.strftime("%a %d %b %Y %H:%M:%S UTC"))
-        #     self.mu_file.close()
-
-        # only rename if file actually exists
-        # if os.path.exists(self.mu_file.get_filename()):
-        #     try:
-        #         self.logger.info(("The muon decay measurement was " +
-        #                           "active for %f hours") %
-        #                          get_hours_from_duration(
-        #                                  self.measurement_duration))
-        #         rename_muonic_file(self.measurement_duration,
-        #                            self.mu_file.get_filename())
-        #     except (OSError, IOError):
-        #         pass
+        if not self.mu_file.closed:
+            stop_time = datetime.datetime.utcnow()
+
+            # add duration
+            self.measurement_duration += stop_time - self.start_time
+            self.parent.records.detach("decay")
+
+        if self.mu_file.opened:
+            self.logger.info(("The muon decay measurement was " +
+                              "active for %f hours") %
+                             (self.measurement_duration.total_seconds() /
+                              3600.))
+
+        # close the data file and put the hours into its name
+        self.mu_file.finish()
 
 
 class DAQWidget(BaseWidget):
@@ -1664,46 +1951,125 @@ class DAQWidget(BaseWidget):
 
     :param logger: logger object
     :type logger: logging.Logger
-    :param filename: filename for the rate data file
-    :type filename: str
     :param parent: parent widget
     """
     def __init__(self, logger, parent=None):
         BaseWidget.__init__(self, logger, None, parent)
 
-        # raw output file
-        # self.output_file = WrappedFile(filename)
-        # self.write_raw_file = False
+        # raw output file, written in the background
+        self.output_file = self.parent.writer.open(data_filename("RAW"))
+        # compressed raw log instead of the raw file if requested
+        self.raw_log = None
         self.write_status = None
 
         # measurement start and duration
         self.measurement_duration = datetime.timedelta()
         self.start_time = datetime.datetime.utcnow()
 
-        # daq msg log
-        self.daq_msg_log = QtWidgets.QPlainTextEdit()
-        self.daq_msg_log.setReadOnly(True)
+        # daq msg log, the view only renders the visible lines of the
+        # message log kept by the application
+        self.daq_msg_model = DAQLogModel(self.parent.daq_messages, self)
+        self.daq_msg_log = QtWidgets.QListView()
+        self.daq_msg_log.setModel(self.daq_msg_model)
         self.daq_msg_log.setFont(QtGui.QFont("monospace"))
-        # 500 lines history
-        self.daq_msg_log.document().setMaximumBlockCount(500)
+        self.daq_msg_log.setUniformItemSizes(True)
+        self.daq_msg_log.setEditTriggers(
+                QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.daq_msg_log.setSelectionMode(
+                QtWidgets.QAbstractItemView.ExtendedSelection)
+
+        # filters by message type and text
+        self.kind_checkboxes = []
+        filter_layout = QtWidgets.QHBoxLayout()
+        filter_layout.addWidget(QtWidgets.QLabel("Show"))
+
+        for name in KIND_NAMES:
+            checkbox = QtWidgets.QCheckBox(name, self)
+            checkbox.setChecked(True)
+            checkbox.toggled.connect(self.on_filter_changed)
+            filter_layout.addWidget(checkbox)
+            self.kind_checkboxes.append(checkbox)
+
+        self.search_edit = QtWidgets.QLineEdit(self)
+        self.search_edit.setPlaceholderText("Search")
+        self.search_edit.setClearButtonEnabled(True)
+        self.search_edit.returnPressed.connect(self.on_filter_changed)
+        self.search_edit.textChanged.connect(self.on_search_changed)
+        filter_layout.addWidget(self.search_edit, 1)
+
+        # lines lost because the GUI could not keep up with the DAQ card
+        self.dropped_label = QtWidgets.QLabel(self)
 
         # input field and buttons
         self.label = QtWidgets.QLabel("Command")
         self.hello_edit = HistoryAwareLineEdit()
-        # self.file_button = QtGui.QPushButton("Save DAQ-File")
+        self.file_button = QtWidgets.QPushButton("Save DAQ-File")
 
         # connect signals
         self.hello_edit.returnPressed.connect(self.on_hello_clicked)
-        # QtCore.QObject.connect(self.file_button,
-        #                        QtCore.SIGNAL("clicked()"),
-        #                        self.on_file_clicked)
+        self.file_button.clicked.connect(self.on_file_clicked)
 
         # add widgets to layout
         layout = QtWidgets.QGridLayout(self)
-        layout.addWidget(self.daq_msg_log, 0, 0, 1, 3)
-        layout.addWidget(self.label, 1, 0)
-        layout.addWidget(self.hello_edit, 1, 1)
-        # layout.addWidget(self.file_button, 1, 2)
+        layout.addLayout(filter_layout, 0, 0, 1, 3)
+        layout.addWidget(self.daq_msg_log, 1, 0, 1, 3)
+        layout.addWidget(self.label, 2, 0)
+        layout.addWidget(self.hello_edit, 2, 1)
+        layout.addWidget(self.file_button, 2, 2)
+        layout.addWidget(self.dropped_label, 3, 0, 1, 3)
+
+        self.daq_msg_log.scrollToBottom()
+
+    def show_messages(self, dropped=0):
+        """
+        Show the DAQ messages added to the message log since the last call.
+        The view follows the new messages if it was scrolled to the end.
+
+        :param dropped: number of messages dropped so far
+        :type dropped: int
+        :returns: None
+        """
+        scroll_bar = self.daq_msg_log.verticalScrollBar()
+        at_end = scroll_bar.value() == scroll_bar.maximum()
+
+        self.daq_msg_model.refresh()
+
+        if at_end:
+            self.daq_msg_log.scrollToBottom()
+
+        if dropped:
+            self.dropped_label.setText("%d messages dropped" % dropped)
+
+    def on_search_changed(self, text):
+        """
+        Show all lines again when the search text is cleared. Other texts
+        are searched when return is pressed.
+
+        :param text: the search text
+        :type text: str
+        :returns: None
+        """
+        if not text and self.daq_msg_model.text is not None:
+            self.on_filter_changed()
+
+    def on_filter_changed(self):
+        """
+        Filter the message log by the checked message types and the search
+        text.
+
+        :returns: None
+        """
+        kinds = [kind for kind, checkbox in enumerate(self.kind_checkboxes)
+                 if checkbox.isChecked()]
+        if len(kinds) == len(self.kind_checkboxes):
+            kinds = None
+
+        start = time.perf_counter()
+        self.daq_msg_model.set_filter(kinds, str(self.search_edit.text()))
+        self.daq_msg_log.scrollToBottom()
+
+        self.logger.debug("Filtered the DAQ messages in %.0f ms" %
+                          ((time.perf_counter() - start) * 1000.))
 
     def on_hello_clicked(self):
         """
@@ -1717,72 +2083,64 @@ class DAQWidget(BaseWidget):
             self.hello_edit.add_hist_item(text)
         self.hello_edit.clear()
 
-    # def on_file_clicked(self):
-    #     """
-    #     Save the raw DAQ data to a automatically named file
-    #
-    #     :returns: None
-    #     """
-    #     if self.output_file.closed:
-    #         try:
-    #             self.file_button.setText("Stop saving DAQ-File")
-    #             self.daq_put("CE")
-    #
-    #             self.start_time = datetime.datetime.utcnow()
-    #             # self.output_file.open("a")
-    #             # self.output_file.write(
-    #             #         "# daq data run from: %s\n" %
-    #             #         self.start_time.strftime("%a %d %b %Y %H:%M:%S UTC"))
-    #
-    #             self.write_status = QtGui.QLabel("Writing to %s" %
-    #                                              repr(self.output_file))
-    #             self.parent.status_bar.addPermanentWidget(self.write_status)
-    #         except IOError as e:
-    #             self.logger.error("unable to open file '%s': %s" %
-    #                               (repr(self.output_file), str(e)))
-    #     else:
-    #         self.file_button.setText("Save DAQ-File")
-    #
-    #         stop_time = datetime.datetime.utcnow()
-    #         # add duration
-    #         self.measurement_duration += stop_time - self.start_time
-    #
-    #         self.output_file.write("# stopped run on: %s\n" %
-    #                                stop_time.strftime("%a %d %b %Y %H:%M:%S UTC"))
-    #         self.output_file.close()
-    #         self.parent.status_bar.removeWidget(self.write_status)
+    def on_file_clicked(self):
+        """
+        Start or stop saving the raw DAQ data to an automatically
+        named file
 
-    # def update(self):
-    #     """
-    #     Update daq msg log
-    #
-    #     :returns: None
-    #     """
-        # msg = self.daq_get_last_msg()
-        # self.daq_msg_log.appendPlainText(msg)
-        #
-        # if not self.output_file.closed:
-        #     self._write_to_file(msg)
+        :returns: None
+        """
+        if self.output_file.closed and self.raw_log is None:
+            self.file_button.setText("Stop saving DAQ-File")
+            self.daq_put("CE")
 
-    # def _write_to_file(self, msg):
-    #     """
-    #     Write the "RAW" file
-    #
-    #     :param msg: daq message
-    #     :type msg: str
-    #     :returns: None
-    #     """
-    #     if get_setting("write_daq_status"):
-    #         self.output_file.write(str(msg) + "\n")
-    #     else:
-    #         # only write lines containing trigger data, discard status lines
-    #         fields = msg.rstrip("\n").split(" ")
-    #         if (len(fields) == 16) and (len(fields[0]) == 8):
-    #             self.output_file.write(str(msg) + "\n")
-    #         else:
-    #             self.logger.debug(("Not writing line '%s' to file " +
-    #                                "because it does not contain " +
-    #                                "trigger data") % msg)
+            self.start_time = datetime.datetime.utcnow()
+            codec = self.parent.opts.get("compress_raw")
+
+            if codec:
+                filename = os.path.join(DATA_DIRECTORY, "%s_RAW.mraw" % (
+                        self.start_time.strftime("%Y-%m-%d_%H-%M-%S")))
+                self.raw_log = RawLogWriter(self.logger, filename,
+                                            codec=codec)
+                output_file = self.raw_log
+            else:
+                self.output_file.open("daq data")
+                output_file = self.output_file
+
+            self.parent.records.attach("raw", output_file)
+
+            self.write_status = QtWidgets.QLabel("Writing to %s" %
+                                                 repr(output_file))
+            self.parent.status_bar.addPermanentWidget(self.write_status)
+        else:
+            self.file_button.setText("Save DAQ-File")
+
+            stop_time = datetime.datetime.utcnow()
+            # add duration
+            self.measurement_duration += stop_time - self.start_time
+
+            self.parent.records.detach("raw")
+            self.close_raw_log()
+            self.output_file.close()
+            self.parent.status_bar.removeWidget(self.write_status)
+
+    def measuring(self):
+        """
+        Returns True while the raw data is saved.
+
+        :returns: bool
+        """
+        return not self.output_file.closed or self.raw_log is not None
+
+    def close_raw_log(self):
+        """
+        Close the compressed raw log if one is written.
+
+        :returns: None
+        """
+        if self.raw_log is not None:
+            self.raw_log.close()
+            self.raw_log = None
 
     def finish(self):
         """
@@ -1790,43 +2148,40 @@ class DAQWidget(BaseWidget):
 
         :returns: None
         """
-        # if not self.output_file.closed:
-        #     stop_time = datetime.datetime.utcnow()
-        #
-        #     # add duration
-        #     self.measurement_duration += stop_time - self.start_time
-        #
-        #     self.output_file.write("# stopped run on: %s\n" %
-        #                            stop_time.strftime("%a %d %b %Y %H:%M:%S UTC"))
-        #     self.output_file.close()
-
-        # only rename if file actually exists
-        # if os.path.exists(self.output_file.get_filename()):
-        #     try:
-        #         self.logger.info("The raw data was written for %f hours" %
-        #                          get_hours_from_duration(
-        #                                  self.measurement_duration))
-        #         rename_muonic_file(self.measurement_duration,
-        #                            self.output_file.get_filename())
-        #     except (OSError, IOError):
-        #         pass
+        if not self.output_file.closed or self.raw_log is not None:
+            stop_time = datetime.datetime.utcnow()
+
+            # add duration
+            self.measurement_duration += stop_time - self.start_time
+            self.parent.records.detach("raw")
+
+        self.close_raw_log()
+
+        if self.output_file.opened:
+            self.logger.info("The raw data was written for %f hours" %
+                             (self.measurement_duration.total_seconds() /
+                              3600.))
+
+        # close the raw file and put the hours into its name
+        self.output_file.finish()
 
 
 class GPSWidget(BaseWidget):
     """
     Shows GPS information
 
+    The GPS dumps are parsed from the raw DAQ messages by the GPS monitor of
+    the application, which also asks for them periodically. The widget only
+    shows the records it is given.
+
     :param logger: logger object
     :type logger: logging.Logger
     :param parent: parent widget
     """
-    GPS_DUMP_LENGTH = 13
 
     def __init__(self, logger, parent=None):
         BaseWidget.__init__(self, logger, None, parent)
 
-        self.gps_dump = []
-
         self.refresh_button = QtWidgets.QPushButton("Show GPS")
         self.refresh_button.clicked.connect(self.on_refresh_clicked)
 
@@ -1844,8 +2199,8 @@ class GPSWidget(BaseWidget):
         self.longitude_box = QtWidgets.QLabel("--")
         self.altitude_box = QtWidgets.QLabel("--")
         self.pos_fix_box = QtWidgets.QLabel("--")
-
-        self.msg_offset = 0
+        # summary of the time series of the readouts
+        self.history_box = QtWidgets.QLabel("--")
 
         # add widgets to layout
         layout = QtWidgets.QGridLayout(self)
@@ -1866,55 +2221,37 @@ class GPSWidget(BaseWidget):
         layout.addWidget(self.altitude_box, 3, 3)
         layout.addWidget(QtWidgets.QLabel("PosFix: "), 4, 2)
         layout.addWidget(self.pos_fix_box, 4, 3)
+        layout.addWidget(QtWidgets.QLabel("Readouts: "), 5, 0)
+        layout.addWidget(self.history_box, 5, 1, 1, 3)
         layout.addWidget(self.gps_status_log, 6, 0, 1, 4)
         layout.addWidget(self.refresh_button, 7, 0, 1, 4)
 
+        # show what was read out before the widget was created
+        if self.parent.gps.last is not None:
+            self.show_record(self.parent.gps.last, self.parent.gps.series())
+
     def on_refresh_clicked(self):
         """
-        Display/refresh the GPS information
+        Ask the DAQ card for the GPS information. The answer is shown by
+        show_record when it arrives.
 
         :returns: None
         """
-        self.refresh_button.setEnabled(False)
-        self.gps_dump = []
         self.logger.info('Reading GPS.')
-        self.parent.process_incoming()
-        self.active(True)
-        self.daq_put('DG')
-        self.parent.process_incoming()
-
-    def _extract_gps_info(self, line, strip_string):
-        """
-        Extract GPS info from 'line' and strip away 'strip_string'.
+        self.status_box.setText("Reading...")
+        self.parent.gps.poll()
 
-        :param line: line number of gps output
-        :type line: int
-        :param strip_string: string to strip away
-        :type strip_string: str
-        :returns: str
+    def show_record(self, record, series):
         """
-        result = str(self.gps_dump[line+self.msg_offset]).strip()
-        return result.replace(strip_string, '').strip()
+        Display the GPS information of a readout.
 
-    def update(self):
-        """
-        Readout the GPS information and display it in the tab.
-
-        :returns: bool
+        :param record: the readout
+        :type record: muonic_gui.daq.gps.GPSRecord
+        :param series: the time series of the readouts, see
+            :meth:`muonic_gui.daq.gps.GPSMonitor.series`
+        :type series: dict
+        :returns: None
         """
-        if len(self.gps_dump) > 0:
-            if not self.gps_dump[0].startswith('DG'):
-                self.gps_dump = []
-                return False
-        if len(self.gps_dump) <= self.GPS_DUMP_LENGTH:
-            self.gps_dump.append(self.daq_get_last_msg())
-        if len(self.gps_dump) != self.GPS_DUMP_LENGTH:
-            return False
-
-        # sometimes, the widget will not register the line where the DG command is put
-        if not self.gps_dump[1].startswith('DG'):
-            self.msg_offset = -1
-
         gps_time = ''
         pos_fix = 0
         latitude = ''
@@ -1924,31 +2261,29 @@ class GPSWidget(BaseWidget):
         status = "Invalid"
         checksum = "Error"
 
-        self.refresh_button.setEnabled(True)
-
-        try:
-            if self._extract_gps_info(3, "Status:") == "A (valid)":
-                status = "Valid"
-                gps_time = self._extract_gps_info(2, "Date+Time:")
-                pos_fix = int(self._extract_gps_info(4, "PosFix#:"))
-                latitude = self._extract_gps_info(5, "Latitude:")
-                longitude = self._extract_gps_info(6, "Longitude:")
-                altitude = self._extract_gps_info(7, "Altitude:")
-                satellites = int(self._extract_gps_info(8, "Sats used:"))
-
-                if self._extract_gps_info(12, "ChkSumErr:") == '0':
-                    checksum = "No Error"
-
-                self.logger.info('Valid GPS signal: found %d ' % satellites)
-            else:
-                self.logger.info('Invalid GPS signal.')
-
-            self.gps_dump = []
-        except Exception as e:
-            self.logger.warning('Error evaluating GPS information. Error %s'%str(e))
-            self.gps_dump = []
-            self.active(False)
-            return False
+        if record.valid:
+            status = "Valid"
+            if record.time is not None:
+                gps_time = record.time.strftime("%d.%m.%Y %H:%M:%S.%f")[:-3]
+            pos_fix = record.pos_fix or 0
+            if record.latitude is not None:
+                latitude = "%.5f\u00b0 %s" % (abs(record.latitude),
+                                                "N" if record.latitude >= 0
+                                                else "S")
+            if record.longitude is not None:
+                longitude = "%.5f\u00b0 %s" % (abs(record.longitude),
+                                                 "E" if record.longitude >= 0
+                                                 else "W")
+            if record.altitude is not None:
+                altitude = "%.1f m" % record.altitude
+            satellites = record.satellites or 0
+
+            if record.checksum_errors == 0:
+                checksum = "No Error"
+
+            self.logger.info('Valid GPS signal: found %d ' % satellites)
+        else:
+            self.logger.info('Invalid GPS signal.')
 
         self.gps_time_box.setText(gps_time)
         self.pos_fix_box.setText(str(pos_fix))
@@ -1959,6 +2294,17 @@ class GPSWidget(BaseWidget):
         self.status_box.setText(status)
         self.checksum_box.setText(checksum)
 
+        readouts = len(series["time"])
+        if readouts:
+            found = series["satellites"][series["satellites"] >= 0]
+            self.history_box.setText(
+                    "%d, %.0f%% valid, satellites %s, %d with checksum "
+                    "errors" % (
+                        readouts, 100. * series["valid"].mean(),
+                        "%d-%d" % (found.min(), found.max()) if found.size
+                        else "--",
+                        np.count_nonzero(series["checksum_errors"] > 0)))
+
         self.gps_status_log.appendPlainText('******************************')
         self.gps_status_log.appendPlainText('STATUS     : %s' % status)
         self.gps_status_log.appendPlainText('TIME       : %s' % gps_time)
@@ -1968,6 +2314,3 @@ class GPSWidget(BaseWidget):
         self.gps_status_log.appendPlainText('Satellites : %d' % satellites)
         self.gps_status_log.appendPlainText('Checksum   : %s' % checksum)
         self.gps_status_log.appendPlainText('******************************')
-
-        self.active(False)
-        return True
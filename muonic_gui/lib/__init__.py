@@ -0,0 +1,9 @@
+"""
+Data structures and helpers shared by the gui and the headless parts of
+muonic_gui
+"""
+from .buffers import RawValueBuffer, LineRingBuffer
+from .bridge import EventBridge
+from .daqlog import DAQMessageLog
+from .profiling import SamplingProfiler
+from .registry import AnalyzerRegistry
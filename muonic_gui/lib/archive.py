@@ -0,0 +1,539 @@
+"""
+Provides a binary archive of the extracted events which can be read back
+with numpy.memmap without parsing or copying.
+
+An archive is a directory holding three files of little endian records:
+
+- events.bin: one fixed size record per event with the trigger time, the
+  number of its first edge pair and the number of edge pairs per channel
+- edges.bin: the rising and falling edges of all events, one pair per
+  pulse, channel by channel
+- index.bin: for every 'index_stride'-th event its number and the latest
+  trigger time seen up to it
+
+and archive.json with the format version and the start of the day the
+trigger times count from. The trigger times of the pulse extractor are
+seconds since the start of the GPS day, they are continued across
+midnight, so they grow over the whole archive. Events stay in the order
+they were extracted, single trigger times out of order, e.g. around a
+rollover of the trigger counter, are kept as they are.
+
+Convert a raw data file with::
+
+    python -m muonic_gui.lib.archive convert RAW_FILE ARCHIVE
+"""
+import argparse
+import calendar
+import datetime
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+__all__ = ["EVENT_DTYPE", "EDGE_DTYPE", "INDEX_DTYPE", "EventArchiveWriter",
+           "EventArchive"]
+
+ARCHIVE_VERSION = 1
+
+EVENT_DTYPE = np.dtype([("trigger_time", "<f8"),
+                        ("first_edge", "<u8"),
+                        ("edge_counts", "<u2", (4,))])
+EDGE_DTYPE = np.dtype([("rising", "<f4"), ("falling", "<f4")])
+INDEX_DTYPE = np.dtype([("trigger_time", "<f8"), ("event", "<u8")])
+
+EVENTS_FILE = "events.bin"
+EDGES_FILE = "edges.bin"
+INDEX_FILE = "index.bin"
+META_FILE = "archive.json"
+
+SECONDS_PER_DAY = 86400.
+
+
+def _day_start(date=None):
+    """
+    Seconds since the epoch of the start of a UTC day.
+
+    :param date: the day, today if None
+    :type date: datetime.date
+    :returns: float
+    """
+    if date is None:
+        date = datetime.datetime.utcnow().date()
+
+    return float(calendar.timegm(date.timetuple()))
+
+
+class EventArchiveWriter(object):
+    """
+    Appends extracted events to an archive. Events are collected in memory
+    and handed to a background thread every 'buffer_events' events and on
+    :meth:`flush`, so writing to disk never blocks the thread appending the
+    events, usually the acquisition thread. :meth:`close` waits until
+    everything is written.
+
+    An existing archive is continued.
+
+    :param logger: logger object
+    :type logger: logging.Logger
+    :param path: directory of the archive
+    :type path: str
+    :param date: UTC day of the first event, today if None
+    :type date: datetime.date
+    :param index_stride: events per entry of the index
+    :type index_stride: int
+    :param buffer_events: events collected before writing
+    :type buffer_events: int
+    """
+    def __init__(self, logger, path, date=None, index_stride=1024,
+                 buffer_events=4096):
+        self.logger = logger
+        self.path = path
+        self.buffer_events = buffer_events
+
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+        meta_filename = os.path.join(path, META_FILE)
+
+        if os.path.exists(meta_filename):
+            with open(meta_filename) as f:
+                meta = json.load(f)
+            _check_version(meta)
+        else:
+            meta = {"version": ARCHIVE_VERSION,
+                    "day_start": _day_start(date),
+                    "index_stride": index_stride}
+            with open(meta_filename, "w") as f:
+                json.dump(meta, f)
+
+        self.day_start = meta["day_start"]
+        self.index_stride = meta["index_stride"]
+
+        # continue after the last complete event, the counts include the
+        # events and edges handed to the writer thread
+        events = _load(os.path.join(path, EVENTS_FILE), EVENT_DTYPE)
+        self.events_written = len(events)
+        self.edges_written = 0
+        self._day_offset = 0.
+        self._last_time = None
+        self._max_time = None
+
+        if len(events):
+            last = events[-1]
+            self.edges_written = int(last["first_edge"] +
+                                     last["edge_counts"].sum())
+            self._last_time = float(last["trigger_time"])
+            self._max_time = float(events["trigger_time"].max())
+            self._day_offset = (self._last_time // SECONDS_PER_DAY *
+                                SECONDS_PER_DAY)
+        del events
+
+        self._events = []
+        self._edges = []
+        self._index = []
+
+        self._files = [open(os.path.join(path, name), "ab")
+                       for name in (EDGES_FILE, EVENTS_FILE, INDEX_FILE)]
+
+        # drop partial records of an interrupted write
+        index_entries = -(-self.events_written // self.index_stride)
+
+        for f, dtype, count in zip(self._files,
+                                   (EDGE_DTYPE, EVENT_DTYPE, INDEX_DTYPE),
+                                   (self.edges_written, self.events_written,
+                                    index_entries)):
+            f.truncate(count * dtype.itemsize)
+
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run,
+                                        name="EventArchiveWriter")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def append(self, pulses):
+        """
+        Add an event as returned by the pulse extractor. Events without
+        any pulse are skipped.
+
+        :param pulses: trigger time in seconds since the start of the day
+            and the rising and falling edge pairs of channel 0-3
+        :type pulses: tuple
+        :returns: None
+        """
+        counts = [len(channel) for channel in pulses[1:5]]
+
+        if not any(counts):
+            return
+
+        trigger_time = pulses[0] + self._day_offset
+
+        # the trigger time starts over at midnight
+        if (self._last_time is not None and
+                trigger_time < self._last_time - SECONDS_PER_DAY / 2.):
+            self._day_offset += SECONDS_PER_DAY
+            trigger_time += SECONDS_PER_DAY
+
+        if self._max_time is None or trigger_time > self._max_time:
+            self._max_time = trigger_time
+
+        event = self.events_written + len(self._events)
+
+        if event % self.index_stride == 0:
+            self._index.append((self._max_time, event))
+
+        first_edge = self.edges_written + len(self._edges)
+
+        self._events.append((trigger_time, first_edge, counts))
+        for channel in pulses[1:5]:
+            self._edges.extend(channel)
+
+        self._last_time = trigger_time
+
+        if len(self._events) >= self.buffer_events:
+            self.flush()
+
+    def flush(self):
+        """
+        Hand the collected events to the writer thread.
+
+        :returns: None
+        """
+        if not self._events:
+            return
+
+        self._queue.put((self._edges, self._events, self._index))
+
+        self.events_written += len(self._events)
+        self.edges_written += len(self._edges)
+
+        self._events = []
+        self._edges = []
+        self._index = []
+
+    def _run(self):
+        """
+        Write loop of the background thread.
+
+        :returns: None
+        """
+        while True:
+            batch = self._queue.get()
+
+            if batch is None:
+                break
+
+            try:
+                self._write(*batch)
+            except (IOError, OSError) as e:
+                self.logger.error("Unable to write to the archive %s: %s" %
+                                  (self.path, e))
+
+    def _write(self, edges, events, index):
+        """
+        Write collected events to the files.
+
+        :param edges: the edge pairs
+        :type edges: list of tuple
+        :param events: the events
+        :type events: list of tuple
+        :param index: the index entries
+        :type index: list of tuple
+        :returns: None
+        """
+        edges = np.array(edges, dtype=EDGE_DTYPE) if edges \
+            else np.zeros(0, dtype=EDGE_DTYPE)
+        events = np.array(events, dtype=EVENT_DTYPE)
+        index = np.array(index, dtype=INDEX_DTYPE)
+
+        # edges go first, so every written event refers to written edges
+        for f, records in zip(self._files, (edges, events, index)):
+            f.write(records.tobytes())
+            f.flush()
+
+    def close(self):
+        """
+        Write the collected events and close the archive.
+
+        :returns: None
+        """
+        self.flush()
+
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+        for f in self._files:
+            f.close()
+
+        self.logger.info("Archived %d events in %s" %
+                         (self.events_written, self.path))
+
+
+class EventArchive(object):
+    """
+    Read access to an archive. The records are memory mapped, so opening
+    an archive is cheap and selections are views into the files.
+
+    :param path: directory of the archive
+    :type path: str
+    """
+    def __init__(self, path):
+        self.path = path
+
+        with open(os.path.join(path, META_FILE)) as f:
+            meta = json.load(f)
+
+        _check_version(meta)
+
+        self.day_start = meta["day_start"]
+        self.index_stride = meta["index_stride"]
+
+        self.events = _load(os.path.join(path, EVENTS_FILE), EVENT_DTYPE)
+        self.edges = _load(os.path.join(path, EDGES_FILE), EDGE_DTYPE)
+        self.index = _load(os.path.join(path, INDEX_FILE), INDEX_DTYPE)
+
+        # ignore events written while the edges were not yet complete
+        if len(self.events):
+            ends = (self.events["first_edge"] +
+                    self.events["edge_counts"].sum(axis=1))
+            complete = np.searchsorted(ends, len(self.edges), side="right")
+            self.events = self.events[:complete]
+
+    def __len__(self):
+        return len(self.events)
+
+    def to_epoch(self, trigger_time):
+        """
+        Seconds since the epoch of archive trigger times.
+
+        :param trigger_time: trigger times
+        :type trigger_time: float or numpy.ndarray
+        :returns: float or numpy.ndarray
+        """
+        return trigger_time + self.day_start
+
+    def search(self, start=None, stop=None):
+        """
+        The range of event numbers from the first one with a trigger time
+        at or after 'start' to the first one at or after 'stop', ignoring
+        trigger times below a previous one. Only the index and the events
+        within two index entries of the limits are read.
+
+        :param start: first trigger time, from the beginning if None
+        :type start: float
+        :param stop: trigger time after the last event, to the end if None
+        :type stop: float
+        :returns: tuple -- first event number and the one after the last
+        """
+        return (self._find(start, 0), self._find(stop, len(self.events)))
+
+    def _find(self, trigger_time, default):
+        """
+        Number of the first event at or after 'trigger_time'.
+
+        :param trigger_time: the trigger time
+        :type trigger_time: float
+        :param default: returned if 'trigger_time' is None
+        :type default: int
+        :returns: int
+        """
+        if trigger_time is None:
+            return default
+
+        entry = np.searchsorted(self.index["trigger_time"], trigger_time)
+        low = int(self.index["event"][entry - 1]) if entry > 0 else 0
+        high = (int(self.index["event"][entry]) + 1
+                if entry < len(self.index) else len(self.events))
+        high = min(high, len(self.events))
+
+        latest = np.maximum.accumulate(self.events["trigger_time"][low:high])
+
+        return low + int(np.searchsorted(latest, trigger_time))
+
+    def select(self, start=None, stop=None):
+        """
+        The events with trigger times from 'start' up to 'stop' as a view.
+
+        :param start: first trigger time
+        :type start: float
+        :param stop: trigger time after the last event
+        :type stop: float
+        :returns: numpy.memmap -- records of EVENT_DTYPE
+        """
+        first, last = self.search(start, stop)
+        return self.events[first:last]
+
+    def event_edges(self, event):
+        """
+        The edge pairs of an event per channel, as views.
+
+        :param event: the event number
+        :type event: int
+        :returns: list of numpy.ndarray -- records of EDGE_DTYPE
+        """
+        record = self.events[event]
+        offsets = int(record["first_edge"]) + np.concatenate(
+                ([0], np.cumsum(record["edge_counts"], dtype=np.int64)))
+
+        return [self.edges[offsets[i]:offsets[i + 1]] for i in range(4)]
+
+    def iter_pulses(self, start=None, stop=None):
+        """
+        Replay the events in the form returned by the pulse extractor, with
+        the trigger times of the archive.
+
+        :param start: first trigger time
+        :type start: float
+        :param stop: trigger time after the last event
+        :type stop: float
+        :returns: generator of tuple
+        """
+        first, last = self.search(start, stop)
+
+        if first == last:
+            return
+
+        events = np.array(self.events[first:last])
+        begin = int(events["first_edge"][0])
+        end = int(events["first_edge"][-1] +
+                  events["edge_counts"][-1].sum())
+        edges = np.array(self.edges[begin:end]).tolist()
+
+        offsets = events["first_edge"] - begin
+        counts = events["edge_counts"].tolist()
+
+        for trigger_time, offset, channel_counts in zip(
+                events["trigger_time"].tolist(), offsets.tolist(), counts):
+            pulses = [trigger_time]
+            for count in channel_counts:
+                pulses.append(edges[offset:offset + count])
+                offset += count
+            yield tuple(pulses)
+
+
+def _check_version(meta):
+    """
+    Raise ValueError if the archive has an unknown format.
+
+    :param meta: content of the archive.json file
+    :type meta: dict
+    :returns: None
+    """
+    if meta.get("version") != ARCHIVE_VERSION:
+        raise ValueError("unsupported event archive version %r" %
+                         meta.get("version"))
+
+
+def _load(filename, dtype):
+    """
+    Map the complete records of a file, read only.
+
+    :param filename: the filename
+    :type filename: str
+    :param dtype: the record type
+    :type dtype: numpy.dtype
+    :returns: numpy.ndarray
+    """
+    if not os.path.exists(filename):
+        return np.zeros(0, dtype=dtype)
+
+    count = os.path.getsize(filename) // dtype.itemsize
+
+    if count == 0:
+        return np.zeros(0, dtype=dtype)
+
+    return np.memmap(filename, dtype=dtype, mode="r", shape=(count,))
+
+
+def convert(logger, raw_filename, path, date=None):
+    """
+    Extract the events of a raw data file into an archive.
+
+    :param logger: logger object
+    :type logger: logging.Logger
+    :param raw_filename: file with the raw DAQ messages
+    :type raw_filename: str
+    :param path: directory of the archive
+    :type path: str
+    :param date: UTC day of the first event, today if None
+    :type date: datetime.date
+    :returns: int -- the number of archived events
+    """
+    from muonic_gui.analysis.analyzer import PulseExtractor
+
+    extractor = PulseExtractor(logger)
+    writer = EventArchiveWriter(logger, path, date=date)
+    first = writer.events_written
+
+    with open(raw_filename) as f:
+        for line in f:
+            if line.startswith("#"):
+                continue
+            try:
+                pulses = extractor.extract(line)
+            except (ValueError, IndexError):
+                continue
+            if pulses is not None:
+                writer.append(pulses)
+
+    writer.close()
+
+    return writer.events_written - first
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+            description="Convert raw DAQ data to an event archive or " +
+                        "summarize an archive")
+    subparsers = parser.add_subparsers(dest="command")
+
+    convert_parser = subparsers.add_parser(
+            "convert", help="extract the events of a raw data file")
+    convert_parser.add_argument("raw_file")
+    convert_parser.add_argument("archive")
+    convert_parser.add_argument("--date", default=None,
+                                help="UTC day of the first event, YYYY-MM-DD")
+
+    info_parser = subparsers.add_parser("info", help="summarize an archive")
+    info_parser.add_argument("archive")
+
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger("muonic_gui.archive")
+
+    if args.command == "convert":
+        date = None
+        if args.date is not None:
+            date = datetime.datetime.strptime(args.date, "%Y-%m-%d").date()
+
+        start = time.time()
+        count = convert(logger, args.raw_file, args.archive, date=date)
+        logger.info("Converted %d events in %.1f s" %
+                    (count, time.time() - start))
+    elif args.command == "info":
+        start = time.time()
+        archive = EventArchive(args.archive)
+        count = sum(1 for _ in archive.iter_pulses())
+
+        if count:
+            times = archive.to_epoch(archive.events["trigger_time"][[0, -1]])
+            print("%d events, %d edge pairs, from %s to %s UTC" % (
+                    len(archive), len(archive.edges),
+                    datetime.datetime.utcfromtimestamp(times[0]),
+                    datetime.datetime.utcfromtimestamp(times[1])))
+        else:
+            print("empty archive")
+
+        print("replayed in %.2f s" % (time.time() - start))
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
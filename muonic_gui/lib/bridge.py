@@ -0,0 +1,139 @@
+"""
+Provides a bridge which hands the analyzer results from the acquisition
+thread to the thread updating the plots in batches
+"""
+import collections
+
+__all__ = ["EventBridge", "coalesce_latest", "coalesce_concat",
+           "coalesce_all"]
+
+
+def coalesce_latest(records):
+    """
+    Keep only the newest record, e.g. for rate samples where only the
+    current value is shown.
+
+    :param records: the queued records, oldest first
+    :type records: list
+    :returns: the newest record
+    """
+    return records[-1]
+
+
+def coalesce_concat(records):
+    """
+    Concatenate records which are sequences of values, e.g. decay times.
+
+    :param records: the queued records, oldest first
+    :type records: list of lists or numpy.ndarray
+    :returns: list
+    """
+    values = []
+    for record in records:
+        values.extend(record)
+    return values
+
+
+def coalesce_all(records):
+    """
+    Keep all records.
+
+    :param records: the queued records, oldest first
+    :type records: list
+    :returns: list
+    """
+    return records
+
+
+class EventBridge(object):
+    """
+    Per-kind queues between one producer thread and one consumer thread.
+
+    The producer only appends records, which is atomic for a deque, so it
+    never waits for the consumer. The consumer periodically calls
+    :meth:`drain` and gets all records queued since the last call, merged
+    into one value per kind by the coalescing function of that kind. This
+    way one update of the GUI absorbs any number of events.
+
+    :param max_records: maximum number of queued records per kind, older
+        records are dropped if the consumer falls behind
+    :type max_records: int
+    """
+
+    def __init__(self, max_records=100000):
+        self.max_records = max_records
+
+        self._queues = collections.OrderedDict()
+        self._coalesce = dict()
+        # records put and taken per kind, each only written by one thread
+        self._put = dict()
+        self._taken = dict()
+
+    def register(self, kind, coalesce=coalesce_all):
+        """
+        Add a queue for records of kind 'kind'.
+
+        :param kind: the record kind, e.g. 'rate'
+        :type kind: str
+        :param coalesce: function merging a list of records into one value
+        :type coalesce: callable
+        :returns: None
+        """
+        self._queues[kind] = collections.deque(maxlen=self.max_records)
+        self._coalesce[kind] = coalesce
+        self._put[kind] = 0
+        self._taken[kind] = 0
+
+    def put(self, kind, record):
+        """
+        Queue a record. Called from the producer thread.
+
+        :param kind: the record kind
+        :type kind: str
+        :param record: the record
+        :returns: None
+        """
+        self._queues[kind].append(record)
+        self._put[kind] += 1
+
+    def pending(self):
+        """
+        Number of queued records per kind
+
+        :returns: dict
+        """
+        return dict((kind, len(queue)) for kind, queue in self._queues.items())
+
+    def dropped(self):
+        """
+        Number of records dropped per kind because the consumer fell
+        behind
+
+        :returns: dict
+        """
+        return dict((kind, self._put[kind] - self._taken[kind] - len(queue))
+                    for kind, queue in self._queues.items())
+
+    def drain(self):
+        """
+        Take all queued records and coalesce them. Called from the consumer
+        thread.
+
+        :returns: list of tuples -- kind and coalesced value for each kind
+            with queued records, in the order the kinds were registered
+        """
+        batches = []
+
+        for kind, queue in self._queues.items():
+            # only take what is there now, records arriving meanwhile are
+            # left for the next call
+            records = []
+            for _ in range(len(queue)):
+                records.append(queue.popleft())
+
+            self._taken[kind] += len(records)
+
+            if records:
+                batches.append((kind, self._coalesce[kind](records)))
+
+        return batches
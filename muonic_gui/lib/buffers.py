@@ -0,0 +1,240 @@
+"""
+Provides compact buffers for the data collected by muonic_gui
+"""
+import collections
+
+import numpy as np
+
+__all__ = ["RawValueBuffer", "LineRingBuffer"]
+
+
+class RawValueBuffer(object):
+    """
+    Growable float32 array keeping the raw values of a histogram, so it can
+    be rebinned at any time.
+
+    Once 'max_values' values are stored, further values are reservoir
+    sampled: the buffer then always holds a uniform random sample of all
+    values seen so far and histograms are scaled up by the ratio of seen to
+    stored values.
+
+    :param max_values: maximum number of values to store
+    :type max_values: int
+    :param initial_size: number of values to allocate at first
+    :type initial_size: int
+    :param seed: seed of the random generator used for downsampling
+    :type seed: int
+    """
+    DEFAULT_MAX_VALUES = 1000000
+
+    def __init__(self, max_values=DEFAULT_MAX_VALUES, initial_size=1024,
+                 seed=None):
+        self.max_values = max_values
+        self.initial_size = max(1, min(initial_size, max_values))
+
+        self._values = np.empty(self.initial_size, dtype=np.float32)
+        self._size = 0
+        self.total = 0
+
+        self._random = np.random.RandomState(seed)
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def values(self):
+        """
+        The stored values, a view into the buffer
+
+        :returns: numpy.ndarray
+        """
+        return self._values[:self._size]
+
+    @property
+    def scale(self):
+        """
+        Number of values seen per stored value
+
+        :returns: float
+        """
+        if self._size == 0:
+            return 1.
+        return float(self.total) / self._size
+
+    def extend(self, values):
+        """
+        Add 'values' to the buffer.
+
+        :param values: the new values
+        :type values: list or numpy.ndarray
+        :returns: None
+        """
+        values = np.asarray(values, dtype=np.float32).ravel()
+
+        if values.size == 0:
+            return
+
+        # fill the free space first, growing the array on the way
+        free = self.max_values - self._size
+        stored = values[:free]
+
+        if stored.size:
+            self._reserve(self._size + stored.size)
+            self._values[self._size:self._size + stored.size] = stored
+            self._size += stored.size
+            self.total += stored.size
+
+        sampled = values[stored.size:]
+
+        if sampled.size == 0:
+            return
+
+        # reservoir sampling, value number n replaces a random slot with
+        # probability max_values / n
+        counts = np.arange(self.total + 1, self.total + sampled.size + 1)
+        slots = (self._random.random_sample(sampled.size) *
+                 counts).astype(np.int64)
+        keep = slots < self.max_values
+
+        # numpy assigns the last of repeated slots, as a sequential loop would
+        self._values[slots[keep]] = sampled[keep]
+        self.total += sampled.size
+
+    def histogram(self, binning):
+        """
+        Histogram the values with the bin edges 'binning', scaled to the
+        number of values seen.
+
+        :param binning: the bin edges
+        :type binning: numpy.ndarray
+        :returns: tuple -- bin contents, underflow and overflow
+        """
+        values = self.values
+        bincontent = np.histogram(values, binning)[0] * self.scale
+        underflow = np.count_nonzero(values < binning[0]) * self.scale
+        overflow = np.count_nonzero(values > binning[-1]) * self.scale
+
+        return bincontent, underflow, overflow
+
+    def restore(self, values, total=None):
+        """
+        Replace the contents with values saved before, e.g. from a session
+        snapshot.
+
+        :param values: the stored values
+        :type values: numpy.ndarray
+        :param total: number of values seen, defaults to the number of values
+        :type total: int
+        :returns: None
+        """
+        values = np.asarray(values, dtype=np.float32).ravel()[:self.max_values]
+
+        self._values = np.empty(max(self.initial_size, values.size),
+                                dtype=np.float32)
+        self._values[:values.size] = values
+        self._size = values.size
+
+        if total is None:
+            total = values.size
+        self.total = max(int(total), values.size)
+
+    def clear(self):
+        """
+        Remove all values and release the memory.
+
+        :returns: None
+        """
+        self._values = np.empty(self.initial_size, dtype=np.float32)
+        self._size = 0
+        self.total = 0
+
+    def _reserve(self, size):
+        """
+        Grow the array to hold at least 'size' values.
+
+        :param size: number of values
+        :type size: int
+        :returns: None
+        """
+        if size <= len(self._values):
+            return
+
+        capacity = len(self._values)
+        while capacity < size:
+            capacity *= 2
+
+        values = np.empty(min(capacity, self.max_values), dtype=np.float32)
+        values[:self._size] = self._values[:self._size]
+        self._values = values
+
+
+class LineRingBuffer(object):
+    """
+    Bounded buffer of text lines passed from one producer thread to one
+    consumer thread, e.g. from the acquisition thread to the GUI.
+
+    No lock is needed: appending to and popping from a deque are atomic and
+    each counter is only written by one of the two threads. If the consumer
+    falls behind, the oldest lines are dropped and counted.
+
+    :param max_lines: maximum number of buffered lines
+    :type max_lines: int
+    """
+
+    def __init__(self, max_lines=10000):
+        self.max_lines = max_lines
+
+        self._lines = collections.deque(maxlen=max_lines)
+        # written by the producer only
+        self._appended = 0
+        # written by the consumer only
+        self._drained = 0
+
+    def __len__(self):
+        return len(self._lines)
+
+    @property
+    def dropped(self):
+        """
+        Number of lines dropped because the buffer was full. Should be read
+        from the consumer thread, so no drain runs at the same time.
+
+        :returns: int
+        """
+        # read the length last, a concurrent append then makes the result
+        # one too small for a moment instead of counting a drop
+        appended = self._appended
+        return max(0, appended - self._drained - len(self._lines))
+
+    def append(self, line):
+        """
+        Add a line, dropping the oldest line if the buffer is full. Must
+        only be called from the producer thread.
+
+        :param line: the line
+        :type line: str
+        :returns: None
+        """
+        self._lines.append(line)
+        self._appended += 1
+
+    def drain(self, max_lines):
+        """
+        Remove and return up to 'max_lines' of the oldest lines. Must only
+        be called from the consumer thread.
+
+        :param max_lines: maximum number of lines to return
+        :type max_lines: int
+        :returns: list of str
+        """
+        lines = []
+
+        for _ in range(max_lines):
+            try:
+                lines.append(self._lines.popleft())
+            except IndexError:
+                break
+
+        self._drained += len(lines)
+
+        return lines
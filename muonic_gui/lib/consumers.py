@@ -0,0 +1,137 @@
+"""
+Provides a consumer which collects analyzer results and hands them on to
+another consumer in batches
+"""
+import time
+
+from muonic.lib.consumers import AbstractMuonicConsumer
+from muonic_gui.lib.tracing import TRACER
+
+__all__ = ["BatchConsumer"]
+
+
+class BatchConsumer(AbstractMuonicConsumer):
+    """
+    Wraps a consumer and buffers the pulse, decay and velocity results of
+    the analyzers. A buffer is handed on as soon as it holds 'buf_size'
+    items or its oldest item is older than 'max_delay' seconds.
+
+    Buffers are handed on with the push_*_batch methods of the wrapped
+    consumer if it has them, and item by item otherwise. Raw data, rates
+    and histograms are rare or already buffered elsewhere and are passed on
+    immediately.
+
+    :param logger: logger object
+    :type logger: logging.Logger
+    :param consumer: the consumer to feed
+    :type consumer: muonic.lib.consumers.AbstractMuonicConsumer
+    :param buf_size: number of items per batch
+    :type buf_size: int
+    :param max_delay: maximum time in seconds an item is held back
+    :type max_delay: float
+    """
+    KINDS = ("pulse", "decay", "velocity")
+
+    def __init__(self, logger, consumer, buf_size=100, max_delay=0.5):
+        AbstractMuonicConsumer.__init__(self, logger=logger)
+        self.consumer = consumer
+        self.buf_size = buf_size
+        self.max_delay = max_delay
+
+        # per kind: values, event times, metas and time of the oldest item
+        self._buffers = dict((kind, ([], [], [])) for kind in self.KINDS)
+        self._oldest = dict((kind, None) for kind in self.KINDS)
+
+    def run(self, run_id=None):
+        self.consumer.run(run_id)
+
+    def stop(self):
+        self.flush()
+        self.consumer.stop()
+
+    def flush(self, kind=None):
+        """
+        Hand on buffered items.
+
+        :param kind: one of KINDS, all kinds if None
+        :type kind: str
+        :returns: None
+        """
+        for k in (self.KINDS if kind is None else [kind]):
+            values, event_times, metas = self._buffers[k]
+
+            if not values:
+                continue
+
+            self._buffers[k] = ([], [], [])
+            self._oldest[k] = None
+
+            batch_push = getattr(self.consumer, "push_%s_batch" % k, None)
+
+            if batch_push is not None:
+                batch_push(values, event_times, metas)
+            else:
+                push = getattr(self.consumer, "push_%s" % k)
+                for item in zip(values, event_times, metas):
+                    push(*item)
+
+    def _add(self, kind, value, event_time, meta):
+        """
+        Buffer an item and hand on all buffers which are full or too old.
+
+        :param kind: one of KINDS
+        :type kind: str
+        :param value: the analyzer result
+        :param event_time: time of the event
+        :type event_time: datetime.datetime
+        :param meta: meta information of the event
+        :type meta: dict
+        :returns: None
+        """
+        if TRACER.enabled:
+            TRACER.push(kind, meta)
+
+        values, event_times, metas = self._buffers[kind]
+        values.append(value)
+        event_times.append(event_time)
+        metas.append(meta)
+
+        if self._oldest[kind] is None:
+            self._oldest[kind] = time.time()
+
+        if len(values) >= self.buf_size:
+            self.flush(kind)
+
+        self._flush_expired()
+
+    def _flush_expired(self):
+        """
+        Hand on the buffers with items older than max_delay.
+
+        :returns: None
+        """
+        now = time.time()
+
+        for kind, oldest in list(self._oldest.items()):
+            if oldest is not None and now - oldest > self.max_delay:
+                self.flush(kind)
+
+    def push_raw(self, data, meta):
+        self.consumer.push_raw(data, meta)
+        # raw data arrives all the time, so use it to check the buffers
+        self._flush_expired()
+
+    def push_rate(self, rates, counts, time_window, query_time, meta):
+        self.consumer.push_rate(rates, counts, time_window, query_time, meta)
+
+    def push_histogram(self, name, bincontent, binning, reset):
+        self.consumer.push_histogram(name, bincontent, binning, reset)
+
+    def push_pulse(self, pulse_widths, event_time, meta):
+        self._add("pulse", pulse_widths, event_time, meta)
+
+    def push_decay(self, decay_time, event_time, meta):
+        self._add("decay", decay_time, event_time, meta)
+
+    def push_velocity(self, flight_time, event_time, meta):
+        self._add("velocity", flight_time, event_time, meta)
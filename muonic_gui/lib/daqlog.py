@@ -0,0 +1,372 @@
+"""
+Provides an in-memory log of the raw DAQ messages which holds hours of
+traffic and can be filtered and searched without going through every line.
+
+The lines are kept in blocks of 'BLOCK_LINES' lines. A full block is joined
+into one byte string and compressed, which keeps an hour of messages of a
+busy card within some tens of megabytes. Next to the compressed text every
+block keeps the start offsets and the message types of its lines, so
+filtering by type never decompresses anything, and a bit set of the
+trigrams in its text. A search only decompresses the blocks whose bit set
+contains all trigrams of the searched text, for rare texts like a status
+message or a command reply these are very few. The most recently read
+blocks stay decompressed, so scrolling through the log is cheap.
+
+Lines are addressed by their absolute number, counted from the first line
+ever added. Once more than 'max_lines' lines are held, the oldest blocks
+are dropped.
+"""
+import collections
+import zlib
+
+import numpy as np
+
+__all__ = ["DATA", "DS", "ST", "DG", "REPLY", "KIND_NAMES", "DAQMessageLog"]
+
+# message types
+DATA, DS, ST, DG, REPLY = range(5)
+KIND_NAMES = ("data", "DS", "ST", "DG", "replies")
+
+# number of fields of a data line
+DATA_FIELDS = 16
+
+# first and last line of the GPS dump
+GPS_DUMP_START = ("DG", "Date+Time:")
+GPS_DUMP_END = "ChkSumErr:"
+
+# number of bits of the trigram bit set of a block
+TRIGRAM_BITS_LOG2 = 15
+TRIGRAM_BITS = 1 << TRIGRAM_BITS_LOG2
+
+
+def _trigram_bits(data):
+    """
+    Bit numbers of the trigrams of 'data' in the trigram bit set.
+
+    :param data: the text
+    :type data: bytes
+    :returns: numpy.ndarray
+    """
+    chars = np.frombuffer(data, dtype=np.uint8).astype(np.uint32)
+
+    if chars.size < 3:
+        return np.zeros(0, dtype=np.uint32)
+
+    trigrams = (chars[:-2] << 16) | (chars[1:-1] << 8) | chars[2:]
+
+    # multiplicative hashing, the top bits are the bit number
+    hashed = (trigrams.astype(np.uint64) * 2654435761) & 0xFFFFFFFF
+    return (hashed >> (32 - TRIGRAM_BITS_LOG2)).astype(np.uint32)
+
+
+class _Block(object):
+    """
+    A full block of lines.
+
+    :param lines: the lines
+    :type lines: list of str
+    :param kinds: the message types of the lines
+    :type kinds: list of int
+    """
+
+    def __init__(self, lines, kinds):
+        # the lines must not contain the separator
+        text = "\n".join(lines)
+        if text.count("\n") != len(lines) - 1:
+            text = "\n".join(line.replace("\n", " ") for line in lines)
+
+        data = text.encode("utf-8", "replace")
+        newlines = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == 10)
+
+        # start of each line and the end of the data
+        self.offsets = np.empty(len(lines) + 1, dtype=np.int32)
+        self.offsets[0] = 0
+        self.offsets[1:-1] = newlines + 1
+        self.offsets[-1] = len(data) + 1
+
+        self.kinds = np.array(kinds, dtype=np.uint8)
+        self.size = len(data)
+
+        trigrams = np.zeros(TRIGRAM_BITS, dtype=bool)
+        trigrams[_trigram_bits(data)] = True
+        self.trigrams = np.packbits(trigrams)
+
+        self.compressed = zlib.compress(data, 1)
+
+    def may_contain(self, bits):
+        """
+        Returns False if the text does not contain all trigrams.
+
+        :param bits: bit numbers of the trigrams
+        :type bits: numpy.ndarray
+        :returns: bool
+        """
+        found = (self.trigrams[bits >> 3] >> (7 - (bits & 7))) & 1
+        return bool(found.all())
+
+    def text(self):
+        """
+        The decompressed lines, joined by newlines.
+
+        :returns: bytes
+        """
+        return zlib.decompress(self.compressed)
+
+
+class DAQMessageLog(object):
+    """
+    Log of the raw DAQ messages. Not thread safe, all methods have to be
+    called from the same thread, usually the GUI thread.
+
+    :param max_lines: number of lines to keep at least
+    :type max_lines: int
+    :param cache_blocks: number of decompressed blocks to keep
+    :type cache_blocks: int
+    """
+    BLOCK_LINES = 4096
+
+    def __init__(self, max_lines=4000000, cache_blocks=8):
+        self.max_lines = max_lines
+        self.cache_blocks = cache_blocks
+
+        self._blocks = collections.deque()
+        # absolute number of the first block held
+        self._first_block = 0
+
+        # the lines of the block being filled
+        self._lines = []
+        self._kinds = []
+
+        # decompressed blocks by absolute block number
+        self._cache = collections.OrderedDict()
+
+        # collecting the lines of a GPS dump
+        self._in_gps_dump = False
+
+        self.counts = [0] * len(KIND_NAMES)
+
+    def __len__(self):
+        return self.end - self.first
+
+    @property
+    def first(self):
+        """
+        Absolute number of the oldest line held
+
+        :returns: int
+        """
+        return self._first_block * self.BLOCK_LINES
+
+    @property
+    def end(self):
+        """
+        Absolute number of the next line added
+
+        :returns: int
+        """
+        return ((self._first_block + len(self._blocks)) * self.BLOCK_LINES +
+                len(self._lines))
+
+    @property
+    def compressed_size(self):
+        """
+        Bytes used by the compressed blocks
+
+        :returns: int
+        """
+        return sum(len(block.compressed) for block in self._blocks)
+
+    def classify(self, line):
+        """
+        The message type of 'line'.
+
+        :param line: a raw DAQ message
+        :type line: str
+        :returns: int
+        """
+        if line.startswith("DS"):
+            return DS
+        if line.startswith("ST"):
+            return ST
+        if line.startswith(GPS_DUMP_START):
+            self._in_gps_dump = True
+            return DG
+        if len(line.split()) == DATA_FIELDS:
+            return DATA
+        if self._in_gps_dump:
+            if line.startswith(GPS_DUMP_END):
+                self._in_gps_dump = False
+            return DG
+        return REPLY
+
+    def extend(self, lines):
+        """
+        Add lines to the log.
+
+        :param lines: raw DAQ messages
+        :type lines: list of str
+        :returns: None
+        """
+        for line in lines:
+            kind = self.classify(line)
+            self.counts[kind] += 1
+
+            self._lines.append(line)
+            self._kinds.append(kind)
+
+            if len(self._lines) == self.BLOCK_LINES:
+                self._blocks.append(_Block(self._lines, self._kinds))
+                self._lines = []
+                self._kinds = []
+
+        while len(self._blocks) > 1 and \
+                len(self) - self.BLOCK_LINES >= self.max_lines:
+            self._cache.pop(self._first_block, None)
+            block = self._blocks.popleft()
+            self._first_block += 1
+
+            for kind in range(len(self.counts)):
+                self.counts[kind] -= int(np.count_nonzero(
+                        block.kinds == kind))
+
+    def _block_text(self, number):
+        """
+        The decompressed text of block 'number', from the cache if
+        possible.
+
+        :param number: absolute block number
+        :type number: int
+        :returns: bytes
+        """
+        text = self._cache.pop(number, None)
+
+        if text is None:
+            text = self._blocks[number - self._first_block].text()
+
+            while len(self._cache) >= self.cache_blocks:
+                self._cache.popitem(last=False)
+
+        self._cache[number] = text
+
+        return text
+
+    def line(self, number):
+        """
+        The line with the absolute number 'number'.
+
+        :param number: absolute line number
+        :type number: int
+        :returns: str
+        """
+        if not self.first <= number < self.end:
+            raise IndexError("line %d is not in the log" % number)
+
+        block_number, row = divmod(number, self.BLOCK_LINES)
+        index = block_number - self._first_block
+
+        if index == len(self._blocks):
+            return self._lines[row]
+
+        offsets = self._blocks[index].offsets
+        text = self._block_text(block_number)
+
+        return text[offsets[row]:offsets[row + 1] - 1].decode("utf-8",
+                                                              "replace")
+
+    def kind(self, number):
+        """
+        The message type of the line with the absolute number 'number'.
+
+        :param number: absolute line number
+        :type number: int
+        :returns: int
+        """
+        block_number, row = divmod(number, self.BLOCK_LINES)
+        index = block_number - self._first_block
+
+        if index == len(self._blocks):
+            return self._kinds[row]
+        return int(self._blocks[index].kinds[row])
+
+    def find(self, kinds=None, text=None, start=None):
+        """
+        Absolute numbers of the lines of the types 'kinds' containing
+        'text', beginning with line 'start'.
+
+        :param kinds: the message types, all if None
+        :type kinds: list of int
+        :param text: text the lines have to contain, any if None or empty
+        :type text: str
+        :param start: absolute number of the first line to look at, the
+            oldest line if None
+        :type start: int
+        :returns: numpy.ndarray
+        """
+        start = self.first if start is None else max(start, self.first)
+        needle = text.encode("utf-8", "replace") if text else None
+        bits = _trigram_bits(needle) if needle else None
+
+        found = []
+
+        first_block = start // self.BLOCK_LINES
+        for block_number in range(first_block,
+                                  self._first_block + len(self._blocks)):
+            block = self._blocks[block_number - self._first_block]
+            base = block_number * self.BLOCK_LINES
+
+            mask = np.ones(len(block.kinds), dtype=bool)
+            mask[:max(0, start - base)] = False
+
+            if kinds is not None:
+                mask &= np.isin(block.kinds, kinds)
+
+            if needle is not None and mask.any():
+                if not block.may_contain(bits):
+                    continue
+                mask &= self._contains(block, block_number, needle)
+
+            found.append(base + np.flatnonzero(mask))
+
+        # the lines of the block being filled
+        base = self.end - len(self._lines)
+        found.append(np.array(
+                [base + row for row, (line, kind) in enumerate(
+                    zip(self._lines, self._kinds))
+                 if base + row >= start and
+                 (kinds is None or kind in kinds) and
+                 (needle is None or text in line)],
+                dtype=np.int64))
+
+        return np.concatenate(found).astype(np.int64)
+
+    def _contains(self, block, number, needle):
+        """
+        Mask of the lines of a block containing 'needle'.
+
+        :param block: the block
+        :type block: _Block
+        :param number: absolute block number
+        :type number: int
+        :param needle: the text to find
+        :type needle: bytes
+        :returns: numpy.ndarray
+        """
+        data = np.frombuffer(self._block_text(number), dtype=np.uint8)
+        chars = np.frombuffer(needle, dtype=np.uint8)
+
+        # positions of the first character, narrowed down character by
+        # character, so no Python loop runs over the matches
+        positions = np.flatnonzero(data[:data.size - chars.size + 1] ==
+                                   chars[0])
+        for i in range(1, chars.size):
+            positions = positions[data[positions + i] == chars[i]]
+
+        rows = np.searchsorted(block.offsets, positions, side="right") - 1
+
+        # matches spanning two lines do not count
+        rows = rows[positions + chars.size < block.offsets[rows + 1]]
+
+        mask = np.zeros(len(block.kinds), dtype=bool)
+        mask[rows] = True
+
+        return mask
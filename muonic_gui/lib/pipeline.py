@@ -0,0 +1,475 @@
+"""
+Provides the acquisition side of the GUI without Qt: the wiring of the
+analyzers and consumers, the consumer queueing the analyzer results for
+display and a headless pipeline to load test all of it without a display.
+
+Run a load test with::
+
+    python -m muonic_gui.lib.pipeline --duration 30
+"""
+import argparse
+import collections
+import logging
+import threading
+import time
+
+from muonic.lib.app import App
+from muonic.lib.analyzers import DummyAnalyzer, RateAnalyzer, PulseAnalyzer
+from muonic.lib.analyzers import DecayAnalyzer, VelocityAnalyzer
+from muonic.lib.consumers import AbstractMuonicConsumer
+from muonic_gui.analysis.aggregation import AggregatingConsumer
+from muonic_gui.daq.commands import DAQCommander
+from muonic_gui.daq.simulator import EventGenerator, SimulatedDAQProvider
+from muonic_gui.lib.bridge import EventBridge, coalesce_concat
+from muonic_gui.lib.bridge import coalesce_latest
+from muonic_gui.lib.buffers import LineRingBuffer
+from muonic_gui.lib.consumers import BatchConsumer
+from muonic_gui.lib.registry import AnalyzerRegistry
+from muonic_gui.lib.tracing import TRACER
+
+__all__ = ["ANALYZER_KINDS", "create_analyzers", "wrap_consumer",
+           "PipelineConsumer", "HeadlessPipeline"]
+
+# measurement kinds of the analyzers created by create_analyzers
+ANALYZER_KINDS = ("raw", "rate", "pulse", "decay", "velocity")
+
+
+def create_analyzers(logger, consumers, opts):
+    """
+    Create the analyzers feeding 'consumers' and a registry holding them.
+    All analyzers are disabled until somebody subscribes to their kind.
+
+    :param logger: logger object
+    :type logger: logging.Logger
+    :param consumers: the consumers to feed
+    :type consumers: list
+    :param opts: the options of muonic
+    :type opts: dict
+    :returns: tuple -- list of analyzers and the AnalyzerRegistry
+    """
+    analyzers = [DummyAnalyzer(logger=logger, consumers=consumers, **opts),
+                 RateAnalyzer(logger=logger, consumers=consumers, **opts),
+                 PulseAnalyzer(logger=logger, consumers=consumers, **opts),
+                 DecayAnalyzer(logger=logger, consumers=consumers, **opts),
+                 VelocityAnalyzer(logger=logger, consumers=consumers, **opts)]
+
+    registry = AnalyzerRegistry(logger)
+
+    for kind, analyzer in zip(ANALYZER_KINDS, analyzers):
+        registry.register(kind, analyzer)
+
+    return analyzers, registry
+
+
+def wrap_consumer(logger, consumer, opts):
+    """
+    Put the batching and the histogram aggregation in front of 'consumer'
+    as requested by the options 'buf_size' and 'aggregate_histograms'.
+
+    :param logger: logger object
+    :type logger: logging.Logger
+    :param consumer: the consumer at the end of the chain
+    :type consumer: muonic.lib.consumers.AbstractMuonicConsumer
+    :param opts: the options of muonic
+    :type opts: dict
+    :returns: tuple -- the consumer to register with the analyzers and the
+        AggregatingConsumer or None
+    """
+    aggregator = None
+
+    # let the analyzer results arrive in batches if requested
+    if opts.get("buf_size"):
+        consumer = BatchConsumer(logger, consumer,
+                                 buf_size=opts.get("buf_size"))
+
+    # histogram on the acquisition side unless switched off
+    if opts.get("aggregate_histograms", True):
+        aggregator = AggregatingConsumer(logger, consumer)
+        consumer = aggregator
+
+    return consumer, aggregator
+
+
+class PipelineConsumer(AbstractMuonicConsumer):
+    """
+    Queues the analyzer results for display. The results are put into an
+    event bridge and the raw messages into a ring buffer, from where the
+    thread doing the display takes them in batches.
+
+    Results of kinds nobody subscribed to in 'registry' are dropped right
+    away. Raw messages are fed to 'daq_state', if set, to track the
+    configuration of the card, to 'daq_commands', if set, to complete the
+    replies to DAQ commands, and to 'gps', if set, to parse the GPS dumps.
+
+    :param logger: logger object
+    :type logger: logging.Logger
+    """
+    # number of raw DAQ messages kept until they are shown
+    DAQ_LOG_LENGTH = 10000
+
+    def __init__(self, logger):
+        AbstractMuonicConsumer.__init__(self, logger=logger)
+
+        self.registry = None
+        self.daq_state = None
+        self.daq_commands = None
+        self.gps = None
+
+        # raw DAQ messages from the acquisition thread
+        self.daq_log = LineRingBuffer(max_lines=self.DAQ_LOG_LENGTH)
+
+        # analyzer results from the acquisition thread
+        self.events = EventBridge()
+        self.events.register("rate", coalesce_latest)
+        self.events.register("pulse", coalesce_concat)
+        self.events.register("decay", coalesce_concat)
+        self.events.register("velocity", coalesce_concat)
+        self.events.register("histogram", coalesce_concat)
+        self.events.register("gps", coalesce_latest)
+        self.events.register("daq_state", coalesce_latest)
+
+    def subscribed(self, kind):
+        """
+        Returns True if results of kind 'kind' are wanted.
+
+        :param kind: the measurement kind
+        :type kind: str
+        :returns: bool
+        """
+        return self.registry is None or self.registry.subscribed(kind)
+
+    def run(self, run_id=None):
+        self.running = True
+
+    def stop(self):
+        self.running = False
+
+    def push_raw(self, data, meta):
+        if TRACER.enabled:
+            TRACER.ingest()
+        # the state first, so it is up to date when a request completes
+        if self.daq_state is not None:
+            self.daq_state.feed(data)
+        if self.daq_commands is not None:
+            self.daq_commands.feed(data)
+        if self.gps is not None:
+            self.gps.feed(data)
+        self.daq_log.append(data)
+
+    def push_pulse(self, pulse_widths, event_time, meta):
+        self.push_pulse_batch([pulse_widths], [event_time], [meta])
+
+    def push_pulse_batch(self, pulse_widths, event_times, metas):
+        """
+        Queue the pulse widths of several events.
+
+        :param pulse_widths: pulse widths per channel of each event
+        :type pulse_widths: list
+        :param event_times: times of the events
+        :type event_times: list of datetime.datetime
+        :param metas: meta information of each event
+        :type metas: list of dict
+        :returns: None
+        """
+        if not self.subscribed("pulse"):
+            return
+
+        if TRACER.enabled:
+            for meta in metas:
+                TRACER.push("pulse", meta)
+            TRACER.handed("pulse")
+
+        records = []
+
+        for widths, meta in zip(pulse_widths, metas):
+            # the extracted pulses travel along with the analyzer message
+            pulses = None
+            if isinstance(meta, dict):
+                pulses = meta.get("pulses")
+            records.append((widths, pulses))
+
+        self.events.put("pulse", records)
+
+    def push_histogram(self, name, bincontent, binning, reset):
+        """
+        Queue the change of the bin contents of an aggregated histogram.
+
+        :param name: histogram name
+        :type name: str
+        :param bincontent: the change of the bin contents
+        :type bincontent: numpy.ndarray
+        :param binning: start, stop and number of bin edges
+        :type binning: tuple
+        :param reset: the contents replace all previous contents
+        :type reset: bool
+        :returns: None
+        """
+        self.events.put("histogram", [(name, bincontent, binning, reset)])
+
+    def push_rate(self, rates, counts, time_window, query_time, meta):
+        if not self.subscribed("rate"):
+            return
+        self.events.put("rate", (rates, counts, time_window, query_time))
+
+    def push_decay(self, decay_time, event_time, meta):
+        self.push_decay_batch([decay_time], [event_time], [meta])
+
+    def push_decay_batch(self, decay_times, event_times, metas):
+        """
+        Queue the decay times of several events.
+
+        :param decay_times: the decay times
+        :type decay_times: list or numpy.ndarray
+        :param event_times: times of the events
+        :type event_times: list of datetime.datetime
+        :param metas: meta information of each event
+        :type metas: list of dict
+        :returns: None
+        """
+        if not self.subscribed("decay"):
+            return
+
+        if TRACER.enabled:
+            for meta in metas:
+                TRACER.push("decay", meta)
+            TRACER.handed("decay")
+
+        self.events.put("decay", decay_times)
+
+    def push_velocity(self, flight_time, event_time, meta):
+        self.push_velocity_batch([flight_time], [event_time], [meta])
+
+    def push_velocity_batch(self, flight_times, event_times, metas):
+        """
+        Queue the flight times of several events.
+
+        :param flight_times: the flight times
+        :type flight_times: list or numpy.ndarray
+        :param event_times: times of the events
+        :type event_times: list of datetime.datetime
+        :param metas: meta information of each event
+        :type metas: list of dict
+        :returns: None
+        """
+        if not self.subscribed("velocity"):
+            return
+
+        if TRACER.enabled:
+            for meta in metas:
+                TRACER.push("velocity", meta)
+            TRACER.handed("velocity")
+
+        self.events.put("velocity", flight_times)
+
+
+class HeadlessPipeline(object):
+    """
+    The acquisition pipeline of the GUI, wired like in
+    :class:`muonic_gui.gui.application.Application`, fed by a simulated DAQ
+    card and drained without a display. It measures the sustained
+    throughput, the queue depths and the dropped messages.
+
+    The results are either dropped after counting or, with a renderer,
+    drawn on offscreen plots.
+
+    :param logger: logger object
+    :type logger: logging.Logger
+    :param opts: the options of muonic
+    :type opts: dict
+    :param generator: the event generator of the simulated card
+    :type generator: muonic_gui.daq.simulator.EventGenerator
+    :param realtime: emit the events at the rate of the generator instead
+        of as fast as they are taken
+    :type realtime: bool
+    :param renderer: offscreen renderer to draw the results on
+    :type renderer: muonic_gui.plots.headless.HeadlessRenderer
+    :param kinds: measurement kinds to subscribe to
+    :type kinds: list of str
+    """
+    # seconds between two drains, like the timers of the GUI
+    INTERVAL = 0.1
+
+    def __init__(self, logger, opts, generator=None, realtime=False,
+                 renderer=None, kinds=ANALYZER_KINDS):
+        self.logger = logger
+        self.renderer = renderer
+
+        self.consumer = PipelineConsumer(logger)
+        consumer, self.aggregator = wrap_consumer(logger, self.consumer, opts)
+
+        self._consumers = [consumer]
+        self._analyzers, self.registry = create_analyzers(
+                logger, self._consumers, opts)
+        self.consumer.registry = self.registry
+
+        for kind in kinds:
+            self.registry.subscribe(kind, self)
+
+        self.provider = SimulatedDAQProvider(logger, generator,
+                                             realtime=realtime)
+
+        # open the gate for decays like the decay widget does
+        if "decay" in kinds:
+            self.provider.put("WC 03 04")
+
+        self._app = App(options=opts, analyzers=self._analyzers,
+                        logger=logger)
+        self._app.daq = self.provider
+        self.consumer.daq_commands = DAQCommander(logger, self.provider.put)
+
+        self.received = collections.Counter()
+        self.max_pending = collections.Counter()
+
+    def handle(self, kind, value):
+        """
+        Count a batch of results and draw them if there is a renderer.
+
+        :param kind: the result kind
+        :type kind: str
+        :param value: the coalesced results
+        :returns: None
+        """
+        self.received[kind] += 1 if kind == "rate" else len(value)
+
+        if self.renderer is None:
+            return
+
+        if kind == "rate":
+            rates, counts, time_window, query_time = value
+            self.renderer.update("rate", list(rates[0:5]) + [time_window])
+        elif kind == "decay":
+            self.renderer.update("lifetime", value)
+        elif kind == "velocity":
+            self.renderer.update("velocity", value)
+        elif kind == "pulse":
+            for i in range(4):
+                self.renderer.update("pulse_width_ch%d" % i,
+                                     [w for record in value
+                                      for w in record[0][i]])
+        elif kind == "histogram":
+            for name, bincontent, binning, reset in value:
+                self.renderer.add_bin_counts(name, bincontent, binning,
+                                             reset)
+
+    def drain(self):
+        """
+        Take everything queued since the last call.
+
+        :returns: None
+        """
+        for kind, depth in self.consumer.events.pending().items():
+            self.max_pending[kind] = max(self.max_pending[kind], depth)
+        self.max_pending["raw"] = max(self.max_pending["raw"],
+                                      len(self.consumer.daq_log))
+
+        for kind, value in self.consumer.events.drain():
+            self.handle(kind, value)
+
+        self.received["raw"] += len(self.consumer.daq_log.drain(
+                self.consumer.DAQ_LOG_LENGTH))
+
+    def run(self, duration):
+        """
+        Run the pipeline for 'duration' seconds.
+
+        :param duration: run time in seconds
+        :type duration: float
+        :returns: dict -- the report, see :meth:`report`
+        """
+        thread = threading.Thread(target=self._app.run,
+                                  name="HeadlessPipeline")
+
+        self.provider.start()
+        if self.aggregator is not None:
+            self.aggregator.start()
+        if self.renderer is not None:
+            self.renderer.start()
+        thread.start()
+
+        start = time.perf_counter()
+        events_before = self.provider.generator.events
+        stop = start + duration
+
+        while time.perf_counter() < stop:
+            time.sleep(self.INTERVAL)
+            self.drain()
+
+        elapsed = time.perf_counter() - start
+        events = self.provider.generator.events - events_before
+
+        self._app.stop()
+        self.provider.stop()
+        thread.join(timeout=10.0)
+
+        if self.aggregator is not None:
+            self.aggregator.stop()
+        if self.renderer is not None:
+            self.renderer.stop()
+        self.drain()
+
+        return self.report(elapsed, events)
+
+    def report(self, elapsed, events):
+        """
+        Summarize a run.
+
+        :param elapsed: run time in seconds
+        :type elapsed: float
+        :param events: number of events produced by the simulated card
+        :type events: int
+        :returns: dict -- events/s, lines/s, results/s per kind, maximum
+            queue depth per kind and dropped records per kind
+        """
+        dropped = self.consumer.events.dropped()
+        dropped["raw"] = self.consumer.daq_log.dropped
+
+        return {"duration": elapsed,
+                "events_per_second": events / elapsed,
+                "lines_per_second": self.provider.lines / elapsed,
+                "results_per_second": dict(
+                        (kind, count / elapsed)
+                        for kind, count in self.received.items()),
+                "max_pending": dict(self.max_pending),
+                "dropped": dropped}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+            description="Load test of the muonic_gui acquisition pipeline "
+                        "with a simulated DAQ card")
+    parser.add_argument("--duration", type=float, default=10.,
+                        help="run time in seconds")
+    parser.add_argument("--rate", type=float, default=1000.,
+                        help="event rate of the simulated card in Hz")
+    parser.add_argument("--realtime", action="store_true",
+                        help="emit the events at the given rate instead of "
+                             "as fast as possible")
+    parser.add_argument("--output-dir", default=None,
+                        help="draw the results on offscreen plots and write "
+                             "them to this directory")
+    parser.add_argument("--time-window", type=float, default=5.,
+                        help="time window of the rate measurement")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger("muonic_gui.pipeline")
+
+    renderer = None
+    if args.output_dir is not None:
+        from muonic_gui.plots.headless import HeadlessRenderer
+        renderer = HeadlessRenderer(logger, args.output_dir)
+
+    pipeline = HeadlessPipeline(
+            logger, {"time_window": args.time_window},
+            generator=EventGenerator(rate=args.rate),
+            realtime=args.realtime, renderer=renderer)
+
+    result = pipeline.run(args.duration)
+
+    print("events/s:  %.0f" % result["events_per_second"])
+    print("lines/s:   %.0f" % result["lines_per_second"])
+    for kind in sorted(result["results_per_second"]):
+        print("%-10s %8.1f/s  max pending %6d  dropped %d" % (
+                kind, result["results_per_second"][kind],
+                result["max_pending"].get(kind, 0),
+                result["dropped"].get(kind, 0)))
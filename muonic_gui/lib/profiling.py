@@ -0,0 +1,305 @@
+"""
+Provides a sampling profiler for the running application which groups the
+time spent by subsystem, e.g. pulse extraction or drawing a canvas.
+
+A background thread takes the stacks of all other threads in a fixed
+interval. Each sample is attributed to the innermost frame belonging to a
+known subsystem, so the time spent in numpy or matplotlib below a call of
+e.g. 'update_plot' counts for the canvas. Unlike cProfile, which only
+profiles the thread enabling it, this covers the acquisition and the GUI
+thread at once without touching them.
+"""
+import collections
+import datetime
+import os
+import sys
+import threading
+import time
+
+__all__ = ["SUBSYSTEMS", "SamplingProfiler"]
+
+# subsystems as name, file the code lives in and qualified function name
+# prefixes, the first matching rule wins
+SUBSYSTEMS = [
+    ("pulse extraction", os.path.join("analysis", "analyzer.py"),
+     ("PulseExtractor.",)),
+    ("triggers", os.path.join("analysis", "analyzer.py"),
+     ("VelocityTrigger.", "DecayTriggerThorough.")),
+    ("fitting", os.path.join("analysis", "fit.py"), ("",)),
+    ("DAQ log", os.path.join("gui", "widgets.py"), ("DAQWidget.",)),
+    ("DAQ log", os.path.join("gui", "application.py"),
+     ("Application.update_raw_daq",)),
+    ("DAQ log", os.path.join("lib", "daqlog.py"), ("",)),
+    ("DAQ log", os.path.join("gui", "helpers.py"), ("DAQLogModel.",)),
+    ("histogram aggregation", os.path.join("analysis", "aggregation.py"),
+     ("",))
+]
+
+# functions drawing a canvas, reported per class of the canvas or model
+UPDATE_PLOT_FUNCTIONS = ("update_plot", "update_plot_batch")
+
+
+def _qualified_name(frame):
+    """
+    The qualified name of the function of a frame. Code objects only know
+    it from Python 3.11 on, before the class is taken from 'self'.
+
+    :param frame: the frame
+    :type frame: frame
+    :returns: str
+    """
+    code = frame.f_code
+    name = getattr(code, "co_qualname", None)
+
+    if name is not None:
+        return name
+
+    owner = frame.f_locals.get("self")
+    if owner is not None:
+        return "%s.%s" % (type(owner).__name__, code.co_name)
+
+    return code.co_name
+
+
+class SamplingProfiler(object):
+    """
+    Samples the stacks of all threads but its own and counts the samples
+    per thread, subsystem and function.
+
+    :param logger: logger object
+    :type logger: logging.Logger
+    :param interval: seconds between two samples
+    :type interval: float
+    :param subsystems: rules to attribute frames to subsystems
+    :type subsystems: list of tuple
+    """
+    def __init__(self, logger, interval=0.005, subsystems=SUBSYSTEMS):
+        self.logger = logger
+        self.interval = interval
+        self.subsystems = subsystems
+
+        self.samples = collections.Counter()
+        self.subsystem_samples = collections.Counter()
+        self.function_samples = collections.Counter()
+        self.rounds = 0
+
+        self.start_time = None
+        self.stop_time = None
+        self._classified = dict()
+        self._names = dict()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def is_running(self):
+        """
+        Returns True if the profiler is sampling.
+
+        :returns: bool
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, duration=None):
+        """
+        Start sampling in the background.
+
+        :param duration: seconds after which to stop sampling on its own,
+            None to sample until stop is called
+        :type duration: float
+        :returns: None
+        """
+        if self._thread is not None:
+            return
+
+        self.samples.clear()
+        self.subsystem_samples.clear()
+        self.function_samples.clear()
+        self.rounds = 0
+
+        self.start_time = time.time()
+        self.stop_time = None
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, args=(duration,),
+                                        name="SamplingProfiler")
+        self._thread.daemon = True
+        self._thread.start()
+
+        self.logger.info("Profiling started")
+
+    def stop(self):
+        """
+        Stop sampling.
+
+        :returns: None
+        """
+        if self._thread is None:
+            return
+
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+
+        self.logger.info("Profiling stopped after %.1f s" %
+                         (self.stop_time - self.start_time))
+
+    def _run(self, duration):
+        """
+        Sample loop of the background thread.
+
+        :param duration: seconds to sample, None for no limit
+        :type duration: float
+        :returns: None
+        """
+        own_ident = threading.get_ident()
+        end = None if duration is None else time.perf_counter() + duration
+
+        while not self._stop_event.wait(self.interval):
+            names = dict((thread.ident, thread.name)
+                         for thread in threading.enumerate())
+
+            for ident, frame in sys._current_frames().items():
+                if ident != own_ident:
+                    self._sample(names.get(ident, str(ident)), frame)
+
+            self.rounds += 1
+
+            if end is not None and time.perf_counter() >= end:
+                break
+
+        self.stop_time = time.time()
+
+    def _classify(self, frame):
+        """
+        The subsystem a frame belongs to.
+
+        :param frame: the frame
+        :type frame: frame
+        :returns: str or None -- subsystem, None if unknown
+        """
+        code = frame.f_code
+
+        if code.co_name in UPDATE_PLOT_FUNCTIONS:
+            owner = frame.f_locals.get("self")
+            if owner is not None:
+                return "%s (%s)" % (code.co_name, owner.__class__.__name__)
+
+        try:
+            return self._classified[code]
+        except KeyError:
+            pass
+
+        subsystem = None
+        name = self._name(frame)
+
+        for rule, filename, prefixes in self.subsystems:
+            if (code.co_filename.endswith(filename) and
+                    name.startswith(prefixes)):
+                subsystem = rule
+                break
+
+        self._classified[code] = subsystem
+        return subsystem
+
+    def _name(self, frame):
+        """
+        The qualified name of the function of a frame, cached per code
+        object.
+
+        :param frame: the frame
+        :type frame: frame
+        :returns: str
+        """
+        try:
+            return self._names[frame.f_code]
+        except KeyError:
+            name = self._names[frame.f_code] = _qualified_name(frame)
+            return name
+
+    def _sample(self, thread_name, frame):
+        """
+        Count one sample of a thread.
+
+        :param thread_name: name of the sampled thread
+        :type thread_name: str
+        :param frame: innermost frame of the thread
+        :type frame: frame
+        :returns: None
+        """
+        code = frame.f_code
+        self.samples[thread_name] += 1
+        self.function_samples[(thread_name, "%s (%s:%d)" % (
+                self._name(frame), os.path.basename(code.co_filename),
+                code.co_firstlineno))] += 1
+
+        subsystem = None
+
+        while frame is not None and subsystem is None:
+            subsystem = self._classify(frame)
+            frame = frame.f_back
+
+        self.subsystem_samples[(thread_name, subsystem or "other")] += 1
+
+    def report(self, top=15):
+        """
+        The profile as text, grouped by thread and subsystem.
+
+        :param top: number of functions shown per thread
+        :type top: int
+        :returns: str
+        """
+        elapsed = (self.stop_time or time.time()) - self.start_time
+        # the sample interval actually reached
+        interval = elapsed / max(self.rounds, 1)
+
+        lines = ["muonic profile from %s, %.1f s, one sample every %.1f ms" %
+                 (datetime.datetime.fromtimestamp(self.start_time)
+                  .strftime("%Y-%m-%d %H:%M:%S"), elapsed, interval * 1000.)]
+
+        for thread_name, total in self.samples.most_common():
+            lines += ["", "Thread '%s', %d samples" % (thread_name, total),
+                      "", "  %-44s %8s %7s" % ("subsystem", "seconds", "%")]
+
+            for (name, subsystem), count in \
+                    self.subsystem_samples.most_common():
+                if name == thread_name:
+                    lines.append("  %-44s %8.2f %6.1f%%" % (
+                            subsystem, count * interval,
+                            100. * count / total))
+
+            lines += ["", "  %-44s %8s %7s" % ("innermost function",
+                                               "seconds", "%")]
+            shown = 0
+
+            for (name, function), count in \
+                    self.function_samples.most_common():
+                if name != thread_name:
+                    continue
+                if shown == top:
+                    break
+                lines.append("  %-44s %8.2f %6.1f%%" % (
+                        function[:44], count * interval,
+                        100. * count / total))
+                shown += 1
+
+        return "\n".join(lines) + "\n"
+
+    def save(self, directory):
+        """
+        Write the report to a file in 'directory'.
+
+        :param directory: the directory
+        :type directory: str
+        :returns: str -- the filename
+        """
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        filename = os.path.join(directory, "%s_profile.txt" % (
+                datetime.datetime.fromtimestamp(self.start_time)
+                .strftime("%Y-%m-%d_%H-%M-%S")))
+
+        with open(filename, "w") as f:
+            f.write(self.report())
+
+        self.logger.info("Profile written to %s" % filename)
+
+        return filename
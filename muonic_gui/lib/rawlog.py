@@ -0,0 +1,609 @@
+"""
+Provides a compressed log of the raw DAQ messages which can still be read
+from any point in time.
+
+The messages are collected in blocks of about 'block_size' characters, and
+every block is compressed on its own with zlib or lzma. A block in the log
+file is a frame header, with the size of the compressed data and the
+number of lines, followed by the compressed lines. For every block an
+index file next to the log holds its offset, the earliest and latest GPS
+time and the first trigger count, so a reader only decompresses the
+blocks overlapping the time range asked for. If the index is lost, it is
+rebuilt from the frames.
+
+Compress a raw data file and replay a part of it with::
+
+    python -m muonic_gui.lib.rawlog compress RAW_FILE LOG_FILE
+    python -m muonic_gui.lib.rawlog cat LOG_FILE --start "2018-10-26 22:38"
+"""
+import argparse
+import calendar
+import datetime
+import logging
+import lzma
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+import zlib
+
+import numpy as np
+
+__all__ = ["CODECS", "line_time", "RawLogWriter", "RawLogReader"]
+
+MAGIC = b"MUONRAW1"
+FRAME = struct.Struct("<4sII")
+FRAME_MAGIC = b"MBLK"
+
+# compression of the blocks, the codec id is stored in the file header
+CODECS = {"zlib": (0, lambda data, level: zlib.compress(data, level),
+                   zlib.decompress, 6),
+          "lzma": (1, lambda data, level: lzma.compress(data, preset=level),
+                   lzma.decompress, 6)}
+
+INDEX_DTYPE = np.dtype([("offset", "<u8"),
+                        ("compressed_size", "<u4"),
+                        ("lines", "<u4"),
+                        ("first_time", "<f8"),
+                        ("last_time", "<f8"),
+                        ("first_trigger_count", "<i8")])
+
+# days as ddmmyy in seconds since the epoch
+_day_cache = dict()
+
+
+def line_time(fields):
+    """
+    The GPS time of a data line in seconds since the epoch.
+
+    :param fields: the fields of the line
+    :type fields: list of str
+    :returns: float or None -- None if the line has no GPS time
+    """
+    if len(fields) != 16:
+        return None
+
+    try:
+        day = _day_cache[fields[11]]
+    except KeyError:
+        date = fields[11]
+        try:
+            day = float(calendar.timegm((2000 + int(date[4:6]),
+                                         int(date[2:4]), int(date[0:2]),
+                                         0, 0, 0)))
+        except (ValueError, IndexError):
+            return None
+        _day_cache[date] = day
+
+    t = fields[10]
+
+    try:
+        return (day + int(t[0:2]) * 3600 + int(t[2:4]) * 60 +
+                float(t[4:]))
+    except ValueError:
+        return None
+
+
+def _index_filename(filename):
+    """
+    The name of the index file of a log.
+
+    :param filename: name of the log file
+    :type filename: str
+    :returns: str
+    """
+    return filename + ".idx"
+
+
+class RawLogWriter(object):
+    """
+    Writes raw DAQ messages to a compressed log. Full blocks are
+    compressed and written in a background thread, so writing a line only
+    appends it to the current block.
+
+    Lines may be written from another thread than the one closing the log,
+    lines written after :meth:`close` are dropped and counted.
+
+    :param logger: logger object
+    :type logger: logging.Logger
+    :param filename: name of the log file, an existing log is continued
+    :type filename: str
+    :param codec: 'zlib' or 'lzma'
+    :type codec: str
+    :param block_size: characters per block before compression
+    :type block_size: int
+    :param level: compression level, the default of the codec if None
+    :type level: int
+    """
+    def __init__(self, logger, filename, codec="zlib", block_size=1 << 20,
+                 level=None):
+        if codec not in CODECS:
+            raise ValueError("unknown codec %r, use one of %s" %
+                             (codec, ", ".join(sorted(CODECS))))
+
+        self.logger = logger
+        self.filename = filename
+        self.block_size = block_size
+
+        codec_id, self._compress, _, default_level = CODECS[codec]
+        self.level = default_level if level is None else level
+
+        directory = os.path.dirname(filename)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        if os.path.exists(filename) and os.path.getsize(filename):
+            # continue an existing log with its own codec
+            reader = RawLogReader(filename)
+            if reader.codec != codec:
+                raise ValueError("%s is compressed with %s" %
+                                 (filename, reader.codec))
+            self._file = open(filename, "r+b")
+            self._file.seek(reader.end)
+            self._file.truncate()
+            self._index_file = open(_index_filename(filename), "wb")
+            self._index_file.write(reader.index.tobytes())
+        else:
+            self._file = open(filename, "wb")
+            self._file.write(MAGIC + bytes([codec_id]))
+            self._index_file = open(_index_filename(filename), "wb")
+
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.dropped = 0
+
+        # guards the current block against a concurrent close
+        self._lock = threading.Lock()
+        self._closed = False
+
+        self._lines = []
+        self._size = 0
+        self._first_time = None
+        self._last_time = None
+        self._first_trigger_count = -1
+
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run,
+                                        name="RawLogWriter")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __repr__(self):
+        return self.filename
+
+    def write(self, line):
+        """
+        Add a DAQ message.
+
+        :param line: the message
+        :type line: str
+        :returns: None
+        """
+        line = line.rstrip("\n")
+        fields = line.split(" ")
+        line_seconds = None
+        trigger_count = -1
+
+        if len(fields) == 16:
+            line_seconds = line_time(fields)
+
+            try:
+                trigger_count = int(fields[0], 16)
+            except ValueError:
+                pass
+
+        with self._lock:
+            if self._closed:
+                if not self.dropped:
+                    self.logger.warning("Dropping lines written after "
+                                        "closing %s" % self.filename)
+                self.dropped += 1
+                return
+
+            if line_seconds is not None:
+                if self._first_time is None:
+                    self._first_time = self._last_time = line_seconds
+                else:
+                    self._first_time = min(self._first_time, line_seconds)
+                    self._last_time = max(self._last_time, line_seconds)
+
+            if self._first_trigger_count < 0:
+                self._first_trigger_count = trigger_count
+
+            self._lines.append(line)
+            self._size += len(line) + 1
+
+            if self._size >= self.block_size:
+                self._hand_on()
+
+    def flush(self):
+        """
+        Hand the current block to the background thread.
+
+        :returns: None
+        """
+        with self._lock:
+            if not self._closed:
+                self._hand_on()
+
+    def _hand_on(self):
+        """
+        Queue the current block for the background thread. Must be called
+        with the lock held.
+
+        :returns: None
+        """
+        if not self._lines:
+            return
+
+        nan = float("nan")
+        self._queue.put(("\n".join(self._lines) + "\n",
+                         len(self._lines),
+                         nan if self._first_time is None
+                         else self._first_time,
+                         nan if self._last_time is None else self._last_time,
+                         self._first_trigger_count))
+
+        self._lines = []
+        self._size = 0
+        self._first_time = None
+        self._last_time = None
+        self._first_trigger_count = -1
+
+    def close(self):
+        """
+        Write the last block and close the log.
+
+        :returns: None
+        """
+        with self._lock:
+            if self._closed:
+                return
+
+            self._hand_on()
+            self._closed = True
+            self._queue.put(None)
+
+        self._thread.join()
+
+        self._file.close()
+        self._index_file.close()
+
+        if self.bytes_out:
+            self.logger.info("Wrote %s, compressed to %.1f%%" %
+                             (self.filename,
+                              100. * self.bytes_out / self.bytes_in))
+
+    def _run(self):
+        """
+        Compress and write the blocks.
+
+        :returns: None
+        """
+        while True:
+            block = self._queue.get()
+
+            if block is None:
+                break
+
+            text, lines, first_time, last_time, first_trigger_count = block
+            data = text.encode("ascii", "replace")
+            compressed = self._compress(data, self.level)
+
+            try:
+                offset = self._file.tell()
+                self._file.write(FRAME.pack(FRAME_MAGIC, len(compressed),
+                                            lines))
+                self._file.write(compressed)
+                self._file.flush()
+
+                self._index_file.write(np.array(
+                        [(offset, len(compressed), lines, first_time,
+                          last_time, first_trigger_count)],
+                        dtype=INDEX_DTYPE).tobytes())
+                self._index_file.flush()
+            except (IOError, OSError) as e:
+                self.logger.error("Unable to write to %s: %s" %
+                                  (self.filename, e))
+                continue
+
+            self.bytes_in += len(data)
+            self.bytes_out += FRAME.size + len(compressed)
+
+
+class RawLogReader(object):
+    """
+    Reads a compressed log of raw DAQ messages.
+
+    :param filename: name of the log file
+    :type filename: str
+    """
+    def __init__(self, filename):
+        self.filename = filename
+
+        with open(filename, "rb") as f:
+            header = f.read(len(MAGIC) + 1)
+
+        if len(header) != len(MAGIC) + 1 or header[:len(MAGIC)] != MAGIC:
+            raise ValueError("%s is not a raw DAQ log" % filename)
+
+        for name, (codec_id, _, decompress, _) in CODECS.items():
+            if codec_id == header[-1]:
+                self.codec = name
+                self._decompress = decompress
+                break
+        else:
+            raise ValueError("%s uses an unknown codec" % filename)
+
+        self.index = self._load_index()
+
+    @property
+    def end(self):
+        """
+        Offset after the last complete block.
+
+        :returns: int
+        """
+        if not len(self.index):
+            return len(MAGIC) + 1
+
+        last = self.index[-1]
+        return int(last["offset"]) + FRAME.size + int(last["compressed_size"])
+
+    def _load_index(self):
+        """
+        Read the index, or rebuild it if it does not match the log.
+
+        :returns: numpy.ndarray -- records of INDEX_DTYPE
+        """
+        size = os.path.getsize(self.filename)
+        index_filename = _index_filename(self.filename)
+
+        if os.path.exists(index_filename):
+            index = np.fromfile(index_filename, dtype=INDEX_DTYPE)
+
+            # blocks written after the index entry are ignored
+            ends = (index["offset"] + FRAME.size +
+                    index["compressed_size"].astype(np.uint64))
+            index = index[ends <= size]
+
+            if self._check_index(index):
+                return index
+
+        return self.rebuild_index()
+
+    def _check_index(self, index):
+        """
+        Returns True if the last entry of 'index' points to a frame.
+
+        :param index: the index
+        :type index: numpy.ndarray
+        :returns: bool
+        """
+        if not len(index):
+            return os.path.getsize(self.filename) == len(MAGIC) + 1
+
+        with open(self.filename, "rb") as f:
+            f.seek(int(index["offset"][-1]))
+            frame = f.read(FRAME.size)
+
+        return (len(frame) == FRAME.size and
+                FRAME.unpack(frame)[0] == FRAME_MAGIC)
+
+    def rebuild_index(self):
+        """
+        Build the index by decompressing all blocks.
+
+        :returns: numpy.ndarray -- records of INDEX_DTYPE
+        """
+        entries = []
+
+        with open(self.filename, "rb") as f:
+            offset = len(MAGIC) + 1
+            f.seek(offset)
+
+            while True:
+                frame = f.read(FRAME.size)
+                if len(frame) < FRAME.size:
+                    break
+
+                magic, compressed_size, lines = FRAME.unpack(frame)
+                data = f.read(compressed_size)
+
+                if magic != FRAME_MAGIC or len(data) < compressed_size:
+                    break
+
+                times = []
+                first_trigger_count = -1
+
+                for line in self._decompress(data).decode("ascii").split(
+                        "\n"):
+                    fields = line.split(" ")
+                    line_seconds = line_time(fields)
+                    if line_seconds is None:
+                        continue
+                    times.append(line_seconds)
+                    if first_trigger_count < 0:
+                        first_trigger_count = int(fields[0], 16)
+
+                nan = float("nan")
+                entries.append((offset, compressed_size, lines,
+                                min(times) if times else nan,
+                                max(times) if times else nan,
+                                first_trigger_count))
+                offset += FRAME.size + compressed_size
+
+        return np.array(entries, dtype=INDEX_DTYPE)
+
+    def blocks(self, start=None, stop=None):
+        """
+        Numbers of the blocks with GPS times overlapping the range from
+        'start' to 'stop'. Blocks without GPS times are taken along with
+        the blocks around them.
+
+        :param start: seconds since the epoch, from the beginning if None
+        :type start: float
+        :param stop: seconds since the epoch, to the end if None
+        :type stop: float
+        :returns: numpy.ndarray of int
+        """
+        first = self.index["first_time"]
+        last = self.index["last_time"]
+
+        selected = np.ones(len(self.index), dtype=bool)
+
+        # comparisons with NaN are False, so blocks without times stay
+        if start is not None:
+            selected &= ~(last < start)
+        if stop is not None:
+            selected &= ~(first >= stop)
+
+        return np.flatnonzero(selected)
+
+    def read_block(self, block):
+        """
+        The lines of a block.
+
+        :param block: the block number
+        :type block: int
+        :returns: list of str
+        """
+        entry = self.index[block]
+
+        with open(self.filename, "rb") as f:
+            f.seek(int(entry["offset"]) + FRAME.size)
+            data = f.read(int(entry["compressed_size"]))
+
+        return self._decompress(data).decode("ascii").splitlines()
+
+    def lines(self, start=None, stop=None):
+        """
+        The lines of all blocks overlapping a time range.
+
+        :param start: seconds since the epoch, from the beginning if None
+        :type start: float
+        :param stop: seconds since the epoch, to the end if None
+        :type stop: float
+        :returns: generator of str
+        """
+        with open(self.filename, "rb") as f:
+            for block in self.blocks(start, stop):
+                entry = self.index[block]
+                f.seek(int(entry["offset"]) + FRAME.size)
+                data = f.read(int(entry["compressed_size"]))
+
+                for line in self._decompress(data).decode(
+                        "ascii").splitlines():
+                    yield line
+
+    def replay(self, extractor, start=None, stop=None):
+        """
+        Feed the lines of a time range to a pulse extractor.
+
+        :param extractor: the pulse extractor
+        :type extractor: muonic_gui.analysis.analyzer.PulseExtractor
+        :param start: seconds since the epoch, from the beginning if None
+        :type start: float
+        :param stop: seconds since the epoch, to the end if None
+        :type stop: float
+        :returns: generator of tuple -- the extracted pulses
+        """
+        for line in self.lines(start, stop):
+            try:
+                pulses = extractor.extract(line)
+            except (ValueError, IndexError):
+                continue
+
+            if pulses is not None:
+                yield pulses
+
+
+def _parse_time(text):
+    """
+    Seconds since the epoch of a UTC time given as text.
+
+    :param text: time as 'YYYY-MM-DD HH:MM[:SS]'
+    :type text: str
+    :returns: float or None
+    """
+    if text is None:
+        return None
+
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return float(calendar.timegm(
+                    datetime.datetime.strptime(text, fmt).timetuple()))
+        except ValueError:
+            pass
+
+    raise ValueError("invalid time %r" % text)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+            description="Compress raw DAQ data and read it back")
+    subparsers = parser.add_subparsers(dest="command")
+
+    compress_parser = subparsers.add_parser(
+            "compress", help="compress a raw data file")
+    compress_parser.add_argument("raw_file")
+    compress_parser.add_argument("log_file")
+    compress_parser.add_argument("--codec", choices=sorted(CODECS),
+                                 default="zlib")
+    compress_parser.add_argument("--block-size", type=int, default=1 << 20)
+
+    cat_parser = subparsers.add_parser(
+            "cat", help="print the lines of a time range")
+    cat_parser.add_argument("log_file")
+    cat_parser.add_argument("--start", default=None,
+                            help="UTC time as 'YYYY-MM-DD HH:MM:SS'")
+    cat_parser.add_argument("--stop", default=None,
+                            help="UTC time as 'YYYY-MM-DD HH:MM:SS'")
+
+    info_parser = subparsers.add_parser("info", help="summarize a log")
+    info_parser.add_argument("log_file")
+
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger("muonic_gui.rawlog")
+
+    if args.command == "compress":
+        start = time.time()
+        writer = RawLogWriter(logger, args.log_file, codec=args.codec,
+                              block_size=args.block_size)
+
+        with open(args.raw_file) as f:
+            for line in f:
+                writer.write(line)
+
+        writer.close()
+        logger.info("Compressed in %.1f s" % (time.time() - start))
+    elif args.command == "cat":
+        reader = RawLogReader(args.log_file)
+
+        for line in reader.lines(_parse_time(args.start),
+                                 _parse_time(args.stop)):
+            sys.stdout.write(line + "\n")
+    elif args.command == "info":
+        reader = RawLogReader(args.log_file)
+        index = reader.index
+
+        print("%s: %s, %d blocks, %d lines, %d bytes" % (
+                args.log_file, reader.codec, len(index),
+                int(index["lines"].sum()), os.path.getsize(args.log_file)))
+
+        times = index["first_time"][~np.isnan(index["first_time"])]
+        if len(times):
+            print("from %s to %s UTC" % (
+                    datetime.datetime.utcfromtimestamp(times.min()),
+                    datetime.datetime.utcfromtimestamp(
+                        np.nanmax(index["last_time"]))))
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Provides a registry which switches the analyzers on and off depending on
+who subscribed to their results
+"""
+import collections
+import threading
+
+__all__ = ["AnalyzerRegistry"]
+
+
+class AnalyzerRegistry(object):
+    """
+    Analyzers keyed by the kind of measurement they produce, e.g. 'rate' or
+    'decay'.
+
+    Widgets subscribe to the kinds they show. An analyzer only runs while
+    its kind has at least one subscriber, so no results are computed that
+    nobody looks at. Consumers ask :meth:`subscribed` before building and
+    delivering results of a kind.
+
+    Subscriptions are changed from the GUI thread, :meth:`subscribed` may be
+    called from any thread.
+
+    :param logger: logger object
+    :type logger: logging.Logger
+    """
+
+    def __init__(self, logger):
+        self.logger = logger
+
+        self._analyzers = collections.defaultdict(list)
+        self._subscribers = collections.defaultdict(set)
+        self._active = set()
+        self._lock = threading.Lock()
+
+    def register(self, kind, analyzer):
+        """
+        Register 'analyzer' as producer of results of kind 'kind'. The
+        analyzer is disabled until somebody subscribes to the kind.
+
+        :param kind: the measurement kind
+        :type kind: str
+        :param analyzer: the analyzer
+        :type analyzer: muonic.lib.analyzers.BaseAnalyzer
+        :returns: None
+        """
+        with self._lock:
+            self._analyzers[kind].append(analyzer)
+            analyzer.disabled = kind not in self._active
+
+    def analyzers(self, kind):
+        """
+        The analyzers producing results of kind 'kind'.
+
+        :param kind: the measurement kind
+        :type kind: str
+        :returns: list
+        """
+        return list(self._analyzers.get(kind, []))
+
+    def subscribe(self, kind, subscriber):
+        """
+        Subscribe to the results of kind 'kind' and enable its analyzers.
+        Subscribing twice has no effect.
+
+        :param kind: the measurement kind
+        :type kind: str
+        :param subscriber: the subscriber, e.g. a widget
+        :type subscriber: object
+        :returns: None
+        """
+        with self._lock:
+            self._subscribers[kind].add(subscriber)
+
+            if kind not in self._active:
+                self._set_active(kind, True)
+
+    def unsubscribe(self, kind, subscriber):
+        """
+        Cancel a subscription. The analyzers of kind 'kind' are disabled
+        when the last subscriber is gone.
+
+        :param kind: the measurement kind
+        :type kind: str
+        :param subscriber: the subscriber
+        :type subscriber: object
+        :returns: None
+        """
+        with self._lock:
+            subscribers = self._subscribers[kind]
+            subscribers.discard(subscriber)
+
+            if not subscribers and kind in self._active:
+                self._set_active(kind, False)
+
+    def subscribed(self, kind):
+        """
+        Returns True if somebody subscribed to results of kind 'kind'.
+
+        :param kind: the measurement kind
+        :type kind: str
+        :returns: bool
+        """
+        return kind in self._active
+
+    def _set_active(self, kind, active):
+        """
+        Enable or disable the analyzers of kind 'kind'. Must be called with
+        the lock held.
+
+        :param kind: the measurement kind
+        :type kind: str
+        :param active: enable the analyzers
+        :type active: bool
+        :returns: None
+        """
+        if active:
+            self._active.add(kind)
+        else:
+            self._active.discard(kind)
+
+        for analyzer in self._analyzers[kind]:
+            analyzer.disabled = not active
+
+        self.logger.debug("%s analyzers %s" %
+                          (kind, "enabled" if active else "disabled"))
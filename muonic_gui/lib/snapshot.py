@@ -0,0 +1,206 @@
+"""
+Provides session snapshots, so the measurements survive a restart of
+muonic_gui.
+
+A snapshot holds the state of all measurements, i.e. the histograms with
+their raw values, the rate history and the start times and durations of
+the widgets, as nested dicts of numpy arrays. It is saved to a single
+uncompressed npz file: the raw values are float32 already and hardly
+compress, while an uncompressed file is read in a few milliseconds. The
+file is written next to the old one and then moved over it, so a crash
+while saving leaves the previous snapshot intact.
+"""
+import datetime
+import os
+import time
+import zipfile
+
+import numpy as np
+
+from muonic_gui.lib.writers import DATA_DIRECTORY
+
+__all__ = ["SNAPSHOT_FILENAME", "to_timestamp", "from_timestamp",
+           "SessionSnapshot"]
+
+# default location of the snapshot
+SNAPSHOT_FILENAME = os.path.join(DATA_DIRECTORY, "session.npz")
+
+# separates the levels of the nested dicts in the keys of the npz file
+KEY_SEPARATOR = "/"
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def to_timestamp(time_):
+    """
+    Seconds since the epoch of a naive UTC datetime, NaN for None.
+
+    :param time_: the time
+    :type time_: datetime.datetime or None
+    :returns: float
+    """
+    if time_ is None:
+        return float("nan")
+    return (time_ - _EPOCH).total_seconds()
+
+
+def from_timestamp(timestamp):
+    """
+    Naive UTC datetime of seconds since the epoch, None for NaN.
+
+    :param timestamp: seconds since the epoch
+    :type timestamp: float
+    :returns: datetime.datetime or None
+    """
+    timestamp = float(timestamp)
+
+    if np.isnan(timestamp):
+        return None
+    return _EPOCH + datetime.timedelta(seconds=timestamp)
+
+
+def _flatten(state, prefix=""):
+    """
+    Flatten nested dicts into one dict with the joined keys.
+
+    :param state: nested dicts of arrays
+    :type state: dict
+    :param prefix: key prefix of this level
+    :type prefix: str
+    :returns: dict
+    """
+    flat = dict()
+
+    for key, value in state.items():
+        key = prefix + key
+
+        if isinstance(value, dict):
+            flat.update(_flatten(value, key + KEY_SEPARATOR))
+        else:
+            flat[key] = np.asarray(value)
+
+    return flat
+
+
+def _unflatten(flat):
+    """
+    Nested dicts of a dict with joined keys.
+
+    :param flat: dict with joined keys
+    :type flat: dict
+    :returns: dict
+    """
+    state = dict()
+
+    for key, value in flat.items():
+        level = state
+        parts = key.split(KEY_SEPARATOR)
+
+        for part in parts[:-1]:
+            level = level.setdefault(part, dict())
+        level[parts[-1]] = value
+
+    return state
+
+
+class SessionSnapshot(object):
+    """
+    Saves and loads the state of all measurements.
+
+    :param logger: logger object
+    :type logger: logging.Logger
+    :param filename: the snapshot file
+    :type filename: str
+    """
+    VERSION = 1
+
+    def __init__(self, logger, filename=SNAPSHOT_FILENAME):
+        self.logger = logger
+        self.filename = filename
+
+        # seconds the last save took
+        self.save_time = 0.
+
+    def exists(self):
+        """
+        Returns True if there is a snapshot.
+
+        :returns: bool
+        """
+        return os.path.exists(self.filename)
+
+    def save(self, state):
+        """
+        Save 'state' atomically, replacing the previous snapshot.
+
+        :param state: nested dicts of numpy arrays or scalars
+        :type state: dict
+        :returns: None
+        """
+        start = time.perf_counter()
+
+        directory = os.path.dirname(self.filename)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        flat = _flatten(state)
+        flat["version"] = np.int64(self.VERSION)
+        flat["saved"] = np.float64(to_timestamp(datetime.datetime.utcnow()))
+
+        # np.savez appends .npz to names without it
+        tmp_filename = self.filename + ".tmp.npz"
+
+        with open(tmp_filename, "wb") as f:
+            np.savez(f, **flat)
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(tmp_filename, self.filename)
+
+        self.save_time = time.perf_counter() - start
+        self.logger.debug("Saved session snapshot in %.0f ms" %
+                          (self.save_time * 1000.))
+
+    def load(self):
+        """
+        Load the snapshot.
+
+        :returns: dict or None -- the saved state, None if there is no
+            usable snapshot
+        """
+        if not self.exists():
+            return None
+
+        start = time.perf_counter()
+
+        try:
+            with np.load(self.filename, allow_pickle=False) as npz:
+                flat = dict((key, npz[key]) for key in npz.files)
+        except (IOError, OSError, ValueError, zipfile.BadZipfile) as e:
+            self.logger.warning("Failed to load the session snapshot %s: %s" %
+                                (self.filename, e))
+            return None
+
+        version = int(flat.pop("version", 0))
+
+        if version != self.VERSION:
+            self.logger.warning("Ignoring session snapshot of version %d" %
+                                version)
+            return None
+
+        saved = from_timestamp(flat.pop("saved", float("nan")))
+
+        self.logger.info("Loaded session snapshot of %s in %.0f ms" % (
+            saved.strftime("%d.%m.%Y %H:%M:%S") if saved else "unknown time",
+            (time.perf_counter() - start) * 1000.))
+
+        return _unflatten(flat)
+
+    def remove(self):
+        """
+        Delete the snapshot, e.g. to start from scratch next time.
+
+        :returns: None
+        """
+        if self.exists():
+            os.remove(self.filename)
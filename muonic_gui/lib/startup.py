@@ -0,0 +1,84 @@
+"""
+Provides a benchmark for the startup time of muonic_gui.
+
+Every module is imported in a fresh interpreter, so the import times do not
+depend on the modules imported before. Run it with::
+
+    python -m muonic_gui.lib.startup
+"""
+import subprocess
+import sys
+
+__all__ = ["STARTUP_MODULES", "HEAVY_MODULES", "benchmark_imports"]
+
+# the modules imported on the way to the main window
+STARTUP_MODULES = ("muonic_gui.lib",
+                   "muonic_gui.plots.models",
+                   "muonic_gui.analysis.fit",
+                   "muonic_gui.gui.plot_canvases",
+                   "muonic_gui.gui.widgets",
+                   "muonic_gui.gui.application")
+
+# modules which should only be imported when they are needed
+HEAVY_MODULES = ("scipy", "scipy.optimize", "matplotlib.pylab",
+                 "matplotlib.pyplot")
+
+_MEASURE = """
+import sys, time
+start = time.perf_counter()
+import %s
+duration = time.perf_counter() - start
+print(duration)
+print(" ".join(name for name in %r if name in sys.modules))
+"""
+
+
+def benchmark_imports(modules=STARTUP_MODULES, repeat=3):
+    """
+    Measure the time importing each of 'modules' takes in a fresh
+    interpreter and check which of the heavy modules got imported with it.
+
+    :param modules: the modules to import
+    :type modules: list of str
+    :param repeat: number of imports to take the fastest of
+    :type repeat: int
+    :returns: dict -- import time in seconds and the heavy modules imported
+        for each module, None if the import failed
+    """
+    results = dict()
+
+    for module in modules:
+        best = None
+        heavy = []
+
+        for _ in range(repeat):
+            process = subprocess.run(
+                    [sys.executable, "-c", _MEASURE % (module, HEAVY_MODULES)],
+                    stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                    universal_newlines=True)
+
+            if process.returncode != 0:
+                best = None
+                break
+
+            lines = process.stdout.splitlines()
+            duration = float(lines[-2])
+            heavy = lines[-1].split()
+
+            if best is None or duration < best:
+                best = duration
+
+        results[module] = None if best is None else (best, heavy)
+
+    return results
+
+
+if __name__ == "__main__":
+    for module, result in benchmark_imports().items():
+        if result is None:
+            print("%-32s import failed" % module)
+        else:
+            duration, heavy = result
+            print("%-32s %7.1f ms  %s" % (module, duration * 1000.,
+                                          ", ".join(heavy)))
+    print("The time to the first window is logged by the application.")
@@ -0,0 +1,269 @@
+"""
+Provides optional tracing of the latency from a DAQ message arriving until
+its result is drawn.
+
+A trace is a dict of monotonic timestamps travelling with the meta
+information of a result under the key 'trace'. The stages are stamped
+where the message passes: ingest when the raw message reaches the GUI,
+push when a result of it enters the consumers of the GUI and draw when the
+canvas showing it was drawn. The time between two stamped stages is
+collected in one latency histogram per stage.
+
+A trace is only completed by a draw after its result reached the canvas:
+it is handed on when the result is queued for the GUI thread, or its bin
+content change is taken by the histogram aggregation, and applied when the
+GUI thread added it to the plot.
+
+The analyzers of muonic handle one message after the other in the
+acquisition thread, the raw message first. A result therefore belongs to
+the last message ingested by the thread pushing it, i.e. the message which
+completed the event. The time spent in the extraction and the triggers is
+part of the push stage, it cannot be stamped separately from outside of
+the muonic analyzers.
+
+Every hook first checks :attr:`Tracer.enabled`, so tracing costs a single
+attribute lookup while it is switched off.
+"""
+import collections
+import threading
+import time
+
+import numpy as np
+
+__all__ = ["LatencyHistogram", "Tracer", "TRACER"]
+
+
+class LatencyHistogram(object):
+    """
+    Histogram of latencies with logarithmic bins from one microsecond to
+    100 seconds, 20 bins per decade.
+    """
+    EDGES = np.logspace(-6, 2, 161)
+
+    def __init__(self):
+        # first and last bin take the under- and overflow
+        self.counts = np.zeros(len(self.EDGES) + 1, dtype=np.int64)
+        self.total = 0
+
+    def record(self, latency):
+        """
+        Add a latency.
+
+        :param latency: the latency in seconds
+        :type latency: float
+        :returns: None
+        """
+        self.counts[np.searchsorted(self.EDGES, latency)] += 1
+        self.total += 1
+
+    def percentile(self, q):
+        """
+        The latency below which 'q' percent of the recorded latencies lie,
+        as the upper edge of the bin holding it.
+
+        :param q: the percentage
+        :type q: float
+        :returns: float or None -- latency in seconds, None if empty
+        """
+        if not self.total:
+            return None
+
+        index = int(np.searchsorted(np.cumsum(self.counts),
+                                    q / 100. * self.total))
+        return self.EDGES[min(index, len(self.EDGES) - 1)]
+
+
+class Tracer(object):
+    """
+    Stamps the stages of the analyzer messages and collects the latencies
+    between them.
+
+    Results waiting to be drawn are kept per kind, e.g. 'decay', and move
+    on with :meth:`handed` and :meth:`applied` until the canvas showing
+    that kind reports a draw with :meth:`drawn`.
+
+    :param max_pending: maximum number of traces waiting for a draw per
+        kind and step, older ones are dropped
+    :type max_pending: int
+    """
+    STAGES = ("ingest", "push", "draw")
+    KINDS = ("pulse", "decay", "velocity")
+
+    def __init__(self, max_pending=10000):
+        self.max_pending = max_pending
+        self.enabled = False
+
+        self.histograms = dict()
+        # traces by kind which were pushed, handed on to the GUI thread
+        # and applied to the plots
+        self._pending = dict()
+        self._handed = dict()
+        self._ready = dict()
+        # ingest time of the message handled by the acquisition thread
+        self._current = threading.local()
+        self._lock = threading.Lock()
+
+        self.reset()
+
+    def set_enabled(self, enabled):
+        """
+        Switch tracing on or off. Switching it on starts with empty
+        histograms.
+
+        :param enabled: trace the messages
+        :type enabled: bool
+        :returns: None
+        """
+        if enabled and not self.enabled:
+            self.reset()
+        self.enabled = enabled
+
+    def reset(self):
+        """
+        Drop all collected latencies and waiting traces.
+
+        :returns: None
+        """
+        with self._lock:
+            self.histograms = dict((stage, LatencyHistogram())
+                                   for stage in self.STAGES[1:] + ("total",))
+            for traces in (self._pending, self._handed, self._ready):
+                for kind in self.KINDS:
+                    traces[kind] = collections.deque(maxlen=self.max_pending)
+
+    def ingest(self):
+        """
+        Stamp the arrival of a raw message. Results pushed afterwards by the
+        calling thread are traced from this message.
+
+        :returns: None
+        """
+        self._current.ingest = time.perf_counter()
+
+    def push(self, kind, meta):
+        """
+        Stamp the push stage on the trace of a result entering the
+        consumers and keep it until its canvas is drawn. Only the first
+        consumer of a chain stamps.
+
+        :param kind: the result kind, e.g. 'decay'
+        :type kind: str
+        :param meta: meta information of the result
+        :type meta: dict
+        :returns: None
+        """
+        trace = meta.get("trace") if isinstance(meta, dict) else None
+
+        if trace is None:
+            trace = dict()
+            ingest = getattr(self._current, "ingest", None)
+            if ingest is not None:
+                trace["ingest"] = ingest
+            if isinstance(meta, dict):
+                meta["trace"] = trace
+        elif "push" in trace:
+            return
+
+        trace["push"] = time.perf_counter()
+
+        with self._lock:
+            if kind in self._pending:
+                self._pending[kind].append(trace)
+
+    def _move(self, source, target, kind):
+        """
+        Move the traces of kind 'kind' from 'source' to 'target'.
+
+        :param source: the traces by kind to take
+        :type source: dict
+        :param target: the traces by kind to add to
+        :type target: dict
+        :param kind: the result kind
+        :type kind: str
+        :returns: None
+        """
+        with self._lock:
+            if kind in source:
+                target[kind].extend(source[kind])
+                source[kind].clear()
+
+    def handed(self, kind):
+        """
+        The results of kind 'kind' pushed so far are queued for the GUI
+        thread. Called before queuing them, or before taking the bin
+        content changes which include them.
+
+        :param kind: the result kind
+        :type kind: str
+        :returns: None
+        """
+        self._move(self._pending, self._handed, kind)
+
+    def applied(self, kind):
+        """
+        The results of kind 'kind' handed on so far are added to the plots.
+        Called by the GUI thread after adding the results it took from the
+        queue.
+
+        :param kind: the result kind
+        :type kind: str
+        :returns: None
+        """
+        self._move(self._handed, self._ready, kind)
+
+    def drawn(self, kind):
+        """
+        Complete the traces of kind 'kind' applied to the plots. Called
+        after a canvas showing this kind was drawn.
+
+        :param kind: the result kind
+        :type kind: str
+        :returns: None
+        """
+        now = time.perf_counter()
+
+        with self._lock:
+            ready = self._ready.get(kind)
+            while ready:
+                trace = ready.popleft()
+                trace["draw"] = now
+                self._record(trace)
+
+    def _record(self, trace):
+        """
+        Add the latencies of a complete trace to the histograms. Must be
+        called with the lock held.
+
+        :param trace: the trace
+        :type trace: dict
+        :returns: None
+        """
+        previous = None
+
+        for stage in self.STAGES:
+            if stage not in trace:
+                continue
+            if previous is not None:
+                self.histograms[stage].record(trace[stage] - trace[previous])
+            previous = stage
+
+        if "ingest" in trace:
+            self.histograms["total"].record(trace["draw"] - trace["ingest"])
+
+    def percentiles(self, qs=(50, 99)):
+        """
+        Latency percentiles of each stage, the stage named by its end.
+
+        :param qs: the percentages
+        :type qs: tuple of float
+        :returns: dict -- per stage the number of latencies and the
+            percentiles in seconds, None for empty histograms
+        """
+        with self._lock:
+            return dict((stage, (histogram.total,
+                                 [histogram.percentile(q) for q in qs]))
+                        for stage, histogram in self.histograms.items())
+
+
+# tracer shared by the acquisition thread and the GUI
+TRACER = Tracer()
@@ -0,0 +1,539 @@
+"""
+Provides the output of the data files of muonic_gui.
+
+Writing never happens in the thread producing the data. The records of all
+files are queued and a single background thread writes them in large
+chunks, syncs the files to disk from time to time and closes and renames
+them when asked to. The acquisition and the GUI thread only ever append to
+a queue, so a slow disk can not stall them.
+"""
+import collections
+import datetime
+import os
+import queue
+import threading
+import time
+
+from muonic.lib.consumers import AbstractMuonicConsumer
+
+__all__ = ["DATA_DIRECTORY", "data_filename", "format_pulses",
+           "AsyncFileWriter", "OutputFile", "RecordConsumer"]
+
+# where the data files go
+DATA_DIRECTORY = os.path.join(os.path.expanduser("~"), "muonic_data")
+
+# placeholder in the filenames for the hours the file was written to
+HOURS_PLACEHOLDER = "HOURS"
+
+# time format of the run comments in the files
+RUN_TIME_FORMAT = "%a %d %b %Y %H:%M:%S UTC"
+
+
+def data_filename(kind, start_time=None, directory=DATA_DIRECTORY):
+    """
+    The name of a data file, e.g. for kind 'R' the rates file. The
+    placeholder for the hours is replaced by :meth:`OutputFile.finish`.
+
+    :param kind: short name of the measurement, e.g. 'R', 'L', 'V', 'P'
+    :type kind: str
+    :param start_time: start of the measurement, now if None
+    :type start_time: datetime.datetime
+    :param directory: directory of the file
+    :type directory: str
+    :returns: str
+    """
+    if start_time is None:
+        start_time = datetime.datetime.utcnow()
+
+    return os.path.join(directory, "%s_%s_%s.txt" % (
+            start_time.strftime("%Y-%m-%d_%H-%M-%S"), kind,
+            HOURS_PLACEHOLDER))
+
+
+def format_pulses(pulses):
+    """
+    A line of the pulse file.
+
+    :param pulses: trigger time and the pulses of channel 0-3
+    :type pulses: tuple
+    :returns: str
+    """
+    return "%f %r %r %r %r\n" % tuple(pulses)
+
+
+class AsyncFileWriter(object):
+    """
+    Writes the records of several files in a background thread.
+
+    The records of a file are collected until 'chunk_size' characters are
+    pending or 'flush_interval' seconds have passed, and then written in
+    one go. Every 'fsync_interval' seconds the files are synced to disk.
+    If more than 'max_queue' records are waiting, further records are
+    dropped and counted rather than making the caller wait.
+
+    :param logger: logger object
+    :type logger: logging.Logger
+    :param chunk_size: characters collected per file before writing
+    :type chunk_size: int
+    :param flush_interval: seconds after which pending records are written
+    :type flush_interval: float
+    :param fsync_interval: seconds between two syncs to disk
+    :type fsync_interval: float
+    :param max_queue: maximum number of queued records
+    :type max_queue: int
+    """
+    # time span for the write rate in seconds
+    RATE_WINDOW = 10.0
+
+    _STOP = object()
+
+    def __init__(self, logger, chunk_size=1 << 16, flush_interval=1.0,
+                 fsync_interval=10.0, max_queue=100000):
+        self.logger = logger
+        self.chunk_size = chunk_size
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.max_queue = max_queue
+
+        self.bytes_written = 0
+        self.dropped = 0
+
+        self._queue = queue.Queue()
+        # open files of the writer thread as file object, pending records
+        # and number of pending characters
+        self._files = dict()
+        self._written = collections.deque()
+        self._thread = None
+
+    def open(self, filename):
+        """
+        A handle of file 'filename'. The file itself is opened by
+        :meth:`OutputFile.open`.
+
+        :param filename: the filename
+        :type filename: str
+        :returns: OutputFile
+        """
+        return OutputFile(self, filename)
+
+    def put(self, output_file, op, payload=None):
+        """
+        Queue an operation on a file. Records are dropped if the queue is
+        full, all other operations are always queued.
+
+        :param output_file: the file
+        :type output_file: OutputFile
+        :param op: one of 'open', 'write', 'close' and 'rename'
+        :type op: str
+        :param payload: the record or the new filename
+        :type payload: str
+        :returns: None
+        """
+        if op == "write" and self._queue.qsize() >= self.max_queue:
+            self.dropped += 1
+            return
+
+        self._queue.put((output_file, op, payload))
+
+    def queue_depth(self):
+        """
+        Number of queued operations.
+
+        :returns: int
+        """
+        return self._queue.qsize()
+
+    def bytes_per_second(self):
+        """
+        The write rate of the last seconds.
+
+        :returns: float
+        """
+        written = list(self._written)
+
+        if len(written) < 2:
+            return 0.
+
+        elapsed = written[-1][0] - written[0][0]
+
+        if elapsed <= 0:
+            return 0.
+
+        return (written[-1][1] - written[0][1]) / elapsed
+
+    def open_files(self):
+        """
+        Names of the open files.
+
+        :returns: list of str
+        """
+        return sorted(output_file.filename
+                      for output_file in list(self._files))
+
+    def start(self):
+        """
+        Start writing in the background.
+
+        :returns: None
+        """
+        if self._thread is not None:
+            return
+
+        self._thread = threading.Thread(target=self._run,
+                                        name="AsyncFileWriter")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Write everything queued so far, close all files and stop the
+        background thread.
+
+        :returns: None
+        """
+        if self._thread is None:
+            return
+
+        self._queue.put(self._STOP)
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        """
+        Write loop of the background thread.
+
+        :returns: None
+        """
+        last_flush = last_fsync = time.monotonic()
+
+        while True:
+            timeout = max(0., last_flush + self.flush_interval -
+                          time.monotonic())
+
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is self._STOP:
+                break
+
+            if item is not None:
+                self._handle(*item)
+
+            now = time.monotonic()
+
+            if now - last_flush >= self.flush_interval:
+                for output_file in list(self._files):
+                    self._flush(output_file)
+                last_flush = now
+
+                self._written.append((now, self.bytes_written))
+                while now - self._written[0][0] > self.RATE_WINDOW:
+                    self._written.popleft()
+
+            if now - last_fsync >= self.fsync_interval:
+                for output_file in list(self._files):
+                    self._flush(output_file, sync=True)
+                last_fsync = now
+
+        for output_file in list(self._files):
+            self._close(output_file)
+
+    def _handle(self, output_file, op, payload):
+        """
+        Carry out a queued operation.
+
+        :param output_file: the file
+        :type output_file: OutputFile
+        :param op: the operation
+        :type op: str
+        :param payload: the record or the new filename
+        :type payload: str
+        :returns: None
+        """
+        try:
+            if op == "write":
+                entry = self._files.get(output_file)
+
+                # records arriving after the file was closed are dropped
+                if entry is None:
+                    return
+
+                entry[1].append(payload)
+                entry[2] += len(payload)
+
+                if entry[2] >= self.chunk_size:
+                    self._flush(output_file)
+            elif op == "open":
+                if output_file not in self._files:
+                    directory = os.path.dirname(output_file.filename)
+                    if directory and not os.path.isdir(directory):
+                        os.makedirs(directory)
+                    self._files[output_file] = [
+                            open(output_file.filename, "a"), [], 0]
+            elif op == "close":
+                self._close(output_file)
+            elif op == "rename":
+                if os.path.exists(output_file.filename):
+                    os.rename(output_file.filename, payload)
+                    self.logger.info("Renamed %s to %s" %
+                                     (output_file.filename, payload))
+                output_file.filename = payload
+        except (IOError, OSError) as e:
+            self.logger.error("Unable to %s file %s: %s" %
+                              (op, output_file.filename, e))
+
+    def _flush(self, output_file, sync=False):
+        """
+        Write the pending records of a file.
+
+        :param output_file: the file
+        :type output_file: OutputFile
+        :param sync: also sync the file to disk
+        :type sync: bool
+        :returns: None
+        """
+        f, records, size = self._files[output_file]
+
+        try:
+            if records:
+                f.write("".join(records))
+                self.bytes_written += size
+                del records[:]
+                self._files[output_file][2] = 0
+
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        except (IOError, OSError) as e:
+            self.logger.error("Unable to write to file %s: %s" %
+                              (output_file.filename, e))
+
+    def _close(self, output_file):
+        """
+        Write the pending records of a file and close it.
+
+        :param output_file: the file
+        :type output_file: OutputFile
+        :returns: None
+        """
+        if output_file not in self._files:
+            return
+
+        self._flush(output_file, sync=True)
+
+        try:
+            self._files.pop(output_file)[0].close()
+        except (IOError, OSError) as e:
+            self.logger.error("Unable to close file %s: %s" %
+                              (output_file.filename, e))
+
+
+class OutputFile(object):
+    """
+    A data file written by an :class:`AsyncFileWriter`. All methods only
+    queue the work and return right away.
+
+    The file can be opened and closed several times, e.g. once per
+    measurement run, and keeps track of the time it was open for.
+
+    :param writer: the writer
+    :type writer: AsyncFileWriter
+    :param filename: the filename
+    :type filename: str
+    """
+    def __init__(self, writer, filename):
+        self.writer = writer
+        self.filename = filename
+        self.closed = True
+        self.opened = False
+
+        self.measurement_duration = datetime.timedelta()
+        self.start_time = None
+
+    def __repr__(self):
+        return self.filename
+
+    def open(self, title=None):
+        """
+        Open the file for appending.
+
+        :param title: name of the run written as a comment, e.g. 'rate
+            measurement', nothing is written if None
+        :type title: str
+        :returns: None
+        """
+        if not self.closed:
+            return
+
+        self.closed = False
+        self.opened = True
+        self.start_time = datetime.datetime.utcnow()
+        self.writer.put(self, "open")
+
+        if title is not None:
+            self.write("# new %s run from: %s\n" % (
+                    title, self.start_time.strftime(RUN_TIME_FORMAT)))
+
+    def write(self, text):
+        """
+        Append text to the file.
+
+        :param text: the text
+        :type text: str
+        :returns: None
+        """
+        if not self.closed:
+            self.writer.put(self, "write", text)
+
+    def close(self):
+        """
+        Note the end of the run in the file and close it.
+
+        :returns: None
+        """
+        if self.closed:
+            return
+
+        stop_time = datetime.datetime.utcnow()
+        self.measurement_duration += stop_time - self.start_time
+
+        self.write("# stopped run on: %s\n" %
+                   stop_time.strftime(RUN_TIME_FORMAT))
+        self.closed = True
+        self.writer.put(self, "close")
+
+    def get_hours(self):
+        """
+        Hours the file was open for.
+
+        :returns: float
+        """
+        return self.measurement_duration.total_seconds() / 3600.
+
+    def finish(self):
+        """
+        Close the file and put the hours it was open for into its name.
+
+        :returns: None
+        """
+        self.close()
+
+        if self.opened and HOURS_PLACEHOLDER in self.filename:
+            self.writer.put(self, "rename", self.filename.replace(
+                    HOURS_PLACEHOLDER, "%.2fh" % self.get_hours()))
+
+
+class RecordConsumer(AbstractMuonicConsumer):
+    """
+    Writes the analyzer results to the files attached for their kind, right
+    from the acquisition thread and independent of the histogram
+    aggregation in front of the GUI. The extracted pulses can also go to
+    an event archive.
+
+    :param logger: logger object
+    :type logger: logging.Logger
+    :param write_daq_status: write the status messages of the DAQ card to
+        the raw file as well, not only the lines with trigger data
+    :type write_daq_status: bool
+    """
+    def __init__(self, logger, write_daq_status=False):
+        AbstractMuonicConsumer.__init__(self, logger=logger)
+        self.write_daq_status = write_daq_status
+        self.files = dict()
+        self.archive = None
+
+    def attach(self, kind, output_file):
+        """
+        Write the results of kind 'kind' to 'output_file'.
+
+        :param kind: one of 'raw', 'rate', 'pulse', 'decay' and 'velocity'
+        :type kind: str
+        :param output_file: the file
+        :type output_file: OutputFile
+        :returns: None
+        """
+        self.files[kind] = output_file
+
+    def detach(self, kind):
+        """
+        Stop writing the results of kind 'kind'.
+
+        :param kind: the result kind
+        :type kind: str
+        :returns: None
+        """
+        self.files.pop(kind, None)
+
+    def set_archive(self, archive):
+        """
+        Archive the extracted pulses in 'archive' or stop archiving them if
+        it is None.
+
+        :param archive: the archive
+        :type archive: muonic_gui.lib.archive.EventArchiveWriter
+        :returns: None
+        """
+        self.archive = archive
+
+    def run(self, run_id=None):
+        self.running = True
+
+    def stop(self):
+        self.running = False
+
+    def push_raw(self, data, meta):
+        output_file = self.files.get("raw")
+
+        if output_file is None:
+            return
+
+        if not self.write_daq_status:
+            # only write lines containing trigger data
+            fields = data.rstrip("\n").split(" ")
+            if len(fields) != 16 or len(fields[0]) != 8:
+                return
+
+        output_file.write(data.rstrip("\n") + "\n")
+
+    def push_rate(self, rates, counts, time_window, query_time, meta):
+        output_file = self.files.get("rate")
+
+        if output_file is None:
+            return
+
+        utcdt = datetime.datetime.utcfromtimestamp(query_time or time.time())
+        output_file.write("%s %s %s %f\n" % (
+                utcdt.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3],
+                " ".join("%f" % rate for rate in rates[:5]),
+                " ".join("%f" % count for count in counts[:5]),
+                time_window))
+
+    def push_pulse(self, pulse_widths, event_time, meta):
+        if not isinstance(meta, dict) or meta.get("pulses") is None:
+            return
+
+        output_file = self.files.get("pulse")
+
+        if output_file is not None:
+            output_file.write(format_pulses(meta["pulses"]))
+
+        archive = self.archive
+
+        if archive is not None:
+            archive.append(meta["pulses"])
+
+    def push_decay(self, decay_time, event_time, meta):
+        output_file = self.files.get("decay")
+
+        if output_file is not None:
+            output_file.write("%s Decay %s\n" % (event_time,
+                                                 repr(decay_time)))
+
+    def push_velocity(self, flight_time, event_time, meta):
+        output_file = self.files.get("velocity")
+
+        if output_file is not None:
+            output_file.write("%s Flight time %s\n" % (event_time,
+                                                       repr(flight_time)))
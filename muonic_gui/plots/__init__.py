@@ -0,0 +1,8 @@
+"""
+Backend independent plot models and a headless renderer for them
+"""
+from .models import *
+from .budget import RenderBudget
+from .text import StaticTextCache, STATIC_TEXT_CACHE
+from .text import benchmark_text_rendering
+from .headless import HeadlessRenderer, HeadlessConsumer
@@ -0,0 +1,119 @@
+"""
+Provides a controller which adapts the render quality of the plots to the
+time spent drawing them.
+"""
+import collections
+
+__all__ = ["RenderBudget"]
+
+
+class RenderBudget(object):
+    """
+    Collects the draw times of the plots and switches optional decorations
+    off step by step while the frame budget is exceeded. Decorations are
+    switched on again in reverse order when drawing is fast again.
+
+    The quality level is the number of decorations switched off, so level 0
+    is full quality.
+
+    :param logger: logger object
+    :type logger: logging.Logger
+    :param frame_budget: maximum average draw time of a plot in seconds
+    :type frame_budget: float
+    :param restore_ratio: restore a decoration if all plots draw faster
+        than this fraction of the frame budget
+    :type restore_ratio: float
+    :param window: number of draws to average and to wait between changes
+    :type window: int
+    """
+    # ordered by what is dropped first
+    DECORATIONS = ("errorbars", "markers", "antialiasing", "legend")
+    LEVEL_NAMES = ("full", "no errorbars", "no markers",
+                   "no antialiasing", "no legend")
+
+    def __init__(self, logger, frame_budget=0.05, restore_ratio=0.5,
+                 window=10):
+        self.logger = logger
+        self.frame_budget = frame_budget
+        self.restore_ratio = restore_ratio
+        self.window = window
+
+        self.level = 0
+        self.draw_times = dict()
+        self._draws_since_change = 0
+
+    def allows(self, decoration):
+        """
+        Returns True if the decoration should be drawn at the current level.
+
+        :param decoration: one of DECORATIONS
+        :type decoration: str
+        :returns: bool
+        """
+        return self.DECORATIONS.index(decoration) >= self.level
+
+    def level_name(self):
+        """
+        Human readable name of the current quality level.
+
+        :returns: str
+        """
+        return self.LEVEL_NAMES[self.level]
+
+    def record(self, name, duration):
+        """
+        Record the draw time of plot 'name' and adapt the quality level.
+
+        :param name: plot name
+        :type name: str
+        :param duration: draw time in seconds
+        :type duration: float
+        :returns: None
+        """
+        if name not in self.draw_times:
+            self.draw_times[name] = collections.deque(maxlen=self.window)
+        self.draw_times[name].append(duration)
+
+        self._draws_since_change += 1
+
+        # give the plots some draws at the new level before judging again
+        if self._draws_since_change < self.window:
+            return
+
+        slowest = max(self.mean_draw_times().values())
+
+        if slowest > self.frame_budget and self.level < len(self.DECORATIONS):
+            self._set_level(self.level + 1, slowest)
+        elif (slowest < self.restore_ratio * self.frame_budget and
+                self.level > 0):
+            self._set_level(self.level - 1, slowest)
+
+    def mean_draw_times(self):
+        """
+        Average draw time of each plot over the last draws.
+
+        :returns: dict
+        """
+        return dict((name, sum(times) / len(times))
+                    for name, times in self.draw_times.items() if times)
+
+    def _set_level(self, level, slowest):
+        """
+        Change the quality level.
+
+        :param level: the new level
+        :type level: int
+        :param slowest: the slowest average draw time
+        :type slowest: float
+        :returns: None
+        """
+        self.level = level
+        self._draws_since_change = 0
+
+        # the draw times of the previous level are meaningless now
+        for times in self.draw_times.values():
+            times.clear()
+
+        self.logger.info(("Render quality set to '%s', slowest plot " +
+                          "took %.1f ms") % (self.level_name(),
+                                             slowest * 1000.))
@@ -0,0 +1,230 @@
+"""
+Provides a renderer which writes snapshots of the muonic plots to disk
+without a display. Rendering is done with the Agg backend in a background
+thread, so PyQt5 is never imported.
+"""
+import os
+import threading
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from muonic.lib.consumers import AbstractMuonicConsumer
+from muonic_gui.plots.models import LifetimePlot, PulseWidthPlot
+from muonic_gui.plots.models import ScalarsPlot, VelocityPlot
+
+__all__ = ["HeadlessRenderer", "HeadlessConsumer"]
+
+
+class HeadlessRenderer(object):
+    """
+    Keeps the rate, lifetime, velocity and pulse width plots and writes
+    them as image files in a fixed interval. Only plots which changed since
+    the last snapshot are rendered again.
+
+    Files are written to a temporary name first and then moved into place,
+    so other programs never see half written snapshots.
+
+    :param logger: logger object
+    :type logger: logging.Logger
+    :param output_dir: directory for the snapshots
+    :type output_dir: str
+    :param interval: seconds between two snapshots
+    :type interval: float
+    :param formats: file formats to write
+    :type formats: tuple of str
+    :param dpi: resolution of the snapshots
+    :type dpi: int
+    """
+    DEFAULT_FORMATS = ("png", "svg")
+
+    def __init__(self, logger, output_dir, interval=60.,
+                 formats=DEFAULT_FORMATS, dpi=72):
+        self.logger = logger
+        self.output_dir = output_dir
+        self.interval = interval
+        self.formats = formats
+        self.dpi = dpi
+
+        self.models = dict()
+        self.models["rate"] = ScalarsPlot(logger)
+        self.models["lifetime"] = LifetimePlot(logger)
+        self.models["velocity"] = VelocityPlot(logger)
+
+        for i in range(4):
+            self.models["pulse_width_ch%d" % i] = PulseWidthPlot(
+                    logger, title="Pulse Widths Ch %d" % i)
+
+        # one lock per plot, so updates from the acquisition thread only
+        # wait while this very plot is rendered
+        self._locks = dict()
+
+        for name, model in self.models.items():
+            FigureCanvasAgg(model.fig)
+            self._locks[name] = threading.Lock()
+
+        self._dirty = set(self.models)
+        self._dirty_lock = threading.Lock()
+
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        if not os.path.isdir(self.output_dir):
+            os.makedirs(self.output_dir)
+
+    def update(self, name, *args, **kwargs):
+        """
+        Update the plot with name 'name'. Safe to call from any thread.
+
+        :param name: plot name
+        :type name: str
+        :returns: None
+        """
+        with self._locks[name]:
+            self.models[name].update_plot(*args, **kwargs)
+
+        with self._dirty_lock:
+            self._dirty.add(name)
+
+    def add_bin_counts(self, name, bincontent, binning, reset=False):
+        """
+        Add bin contents histogrammed elsewhere to the histogram 'name', see
+        :meth:`muonic_gui.plots.models.BaseHistogramPlot.add_bin_counts`.
+        Safe to call from any thread.
+
+        :param name: plot name
+        :type name: str
+        :returns: None
+        """
+        with self._locks[name]:
+            self.models[name].add_bin_counts(bincontent, binning, reset=reset)
+
+        with self._dirty_lock:
+            self._dirty.add(name)
+
+    def render(self):
+        """
+        Write snapshots of all plots which changed since the last call.
+
+        :returns: list of str -- the files written
+        """
+        with self._dirty_lock:
+            names = sorted(self._dirty)
+            self._dirty.clear()
+
+        written = []
+
+        for name in names:
+            with self._locks[name]:
+                for fmt in self.formats:
+                    written.append(self._write(name, fmt))
+
+        if written:
+            self.logger.debug("Wrote plot snapshots %s" % written)
+
+        return written
+
+    def _write(self, name, fmt):
+        """
+        Render a single plot to a file.
+
+        :param name: plot name
+        :type name: str
+        :param fmt: file format
+        :type fmt: str
+        :returns: str -- the file name
+        """
+        filename = os.path.join(self.output_dir, "%s.%s" % (name, fmt))
+        tmp_filename = filename + ".tmp"
+
+        self.models[name].cache_static_text()
+        self.models[name].fig.savefig(tmp_filename, format=fmt, dpi=self.dpi,
+                                      facecolor="white")
+        os.replace(tmp_filename, filename)
+
+        return filename
+
+    def _run(self):
+        """
+        Render loop of the background thread.
+
+        :returns: None
+        """
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.render()
+            except Exception as e:
+                self.logger.error("Rendering plot snapshots failed: %s" % e)
+
+    def start(self):
+        """
+        Start writing snapshots in the background.
+
+        :returns: None
+        """
+        if self._thread is not None:
+            return
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run,
+                                        name="HeadlessRenderer")
+        self._thread.daemon = True
+        self._thread.start()
+
+        self.logger.info("Writing plot snapshots to %s every %.1f s" %
+                         (self.output_dir, self.interval))
+
+    def stop(self):
+        """
+        Stop the background thread and write a last snapshot.
+
+        :returns: None
+        """
+        if self._thread is None:
+            return
+
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+
+        self.render()
+
+
+class HeadlessConsumer(AbstractMuonicConsumer):
+    """
+    Consumer feeding the analyzer results into a headless renderer. It can
+    be registered with muonic in place of the GUI on stations without a
+    display.
+
+    :param logger: logger object
+    :type logger: logging.Logger
+    :param renderer: the renderer to feed
+    :type renderer: HeadlessRenderer
+    """
+
+    def __init__(self, logger, renderer):
+        AbstractMuonicConsumer.__init__(self, logger=logger)
+        self.renderer = renderer
+
+    def run(self, run_id=None):
+        self.renderer.start()
+
+    def stop(self):
+        self.renderer.stop()
+
+    def push_raw(self, data, meta):
+        pass
+
+    def push_pulse(self, pulse_widths, event_time, meta):
+        for i in range(4):
+            self.renderer.update("pulse_width_ch%d" % i, pulse_widths[i])
+
+    def push_rate(self, rates, counts, time_window, query_time, meta):
+        data = list(rates[0:5])
+        data.append(time_window)
+        self.renderer.update("rate", data)
+
+    def push_decay(self, decay_time, event_time, meta):
+        self.renderer.update("lifetime", [decay_time])
+
+    def push_velocity(self, flight_time, event_time, meta):
+        self.renderer.update("velocity", [flight_time])
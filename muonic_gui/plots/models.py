@@ -0,0 +1,1032 @@
+"""
+Provides the backend independent plot models for muonic.
+
+A plot model owns a matplotlib figure and knows how to update it with new
+data. It does not know how the figure is shown, so the same models are used
+by the Qt canvases of the GUI and by the headless renderer.
+"""
+from matplotlib.figure import Figure
+from matplotlib.collections import LineCollection
+
+import numpy as np
+
+from muonic_gui.lib.buffers import RawValueBuffer
+from muonic_gui.plots.text import STATIC_TEXT_CACHE
+
+__all__ = ["BasePlot", "BaseHistogramPlot", "PulsePlot", "ScalarsPlot",
+           "LifetimePlot", "VelocityPlot", "PulseWidthPlot"]
+
+
+class BasePlot(object):
+    """
+    Base class for plot models
+
+    :param logger: logger object
+    :type logger: logging.Logger
+    :param ymin: minimum y-value
+    :type ymin: float
+    :param ymax: maximum y-value
+    :type ymax: float
+    :param xmin: minimum x-value
+    :type xmin: float
+    :param xmax: maximum x-value
+    :type xmax: float
+    :param xlabel: label of the x-axis
+    :type xlabel: str
+    :param ylabel: label of the y-axis
+    :type ylabel: str
+    :param grid: draw grid
+    :type grid: bool
+    :param spacing: left and right spacing of the subplots
+    :type spacing: tuple
+    """
+    # kind of the analyzer results shown, for the latency tracing
+    TRACE_KIND = None
+
+    def __init__(self, logger, ymin=0, ymax=10, xmin=0, xmax=10,
+                 xlabel="xlabel", ylabel="ylabel", grid=True, title=None,
+                 spacing=(0.1, 0.9)):
+
+        self.logger = logger
+
+        # initialization of the figure, the canvas is attached by the view
+        self.fig = Figure(facecolor="white", dpi=72)
+        self.fig.subplots_adjust(left=spacing[0], right=spacing[1])
+
+        # called by request_draw, set by the view showing the figure
+        self.draw_callback = None
+
+        # optional render budget deciding about optional decorations
+        self.budget = None
+        self.name = self.__class__.__name__.replace("Plot", "")
+
+        # cache for the rendered axis labels, titles and legend entries
+        self.text_cache = STATIC_TEXT_CACHE
+
+        # setup subplot, axis and grid
+        self.ax = self.fig.add_subplot(111)
+        self.ax.set_ylim(ymin=ymin, ymax=ymax)
+        self.ax.set_xlim(xmin=xmin, xmax=xmax)
+        self.ax.set_xlabel(xlabel)
+        self.ax.set_ylabel(ylabel)
+        self.ax.set_autoscale_on(False)
+        self.ax.grid(grid)
+
+        # store the limits for later use
+        self.xmin = xmin
+        self.xmax = xmax
+        self.ymin = ymin
+        self.ymax = ymax
+        self.xlabel = xlabel
+        self.ylabel = ylabel
+
+        self.title = None
+
+    def request_draw(self):
+        """
+        Ask the view to redraw the figure. Views decide themselves when to
+        actually render, so this is cheap to call after every update.
+
+        :returns: None
+        """
+        if self.draw_callback is not None:
+            self.draw_callback()
+
+    def cache_static_text(self):
+        """
+        Let the axis labels, the title and the legend entries draw from the
+        text cache. Clearing the axes or creating a legend replaces text
+        artists, so this is called before each draw.
+
+        :returns: None
+        """
+        if self.text_cache is None:
+            return
+
+        texts = [self.ax.xaxis.label, self.ax.yaxis.label, self.ax.title]
+
+        legend = self.ax.get_legend()
+        if legend is not None:
+            texts += legend.get_texts()
+
+        for text in texts:
+            self.text_cache.install(text)
+
+    def decoration(self, name):
+        """
+        Returns True if the optional decoration 'name' should be drawn,
+        see :class:`muonic_gui.plots.budget.RenderBudget`.
+
+        :param name: decoration name
+        :type name: str
+        :returns: bool
+        """
+        return self.budget is None or self.budget.allows(name)
+
+    def update_plot(self, *args):
+        """
+        Instructions to update the plot. Needs to be implemented in subclasses.
+
+        :Returns: None
+        """
+        raise NotImplementedError("implement this method")
+
+
+class BaseHistogramPlot(BasePlot):
+    """
+    A base class for all plots with a histogram
+
+    The raw values are kept, so the histogram can be rebinned and its range
+    changed at any time without losing the collected data. New values are
+    only added to the bin contents and the bars of the drawn histogram are
+    changed in place, the raw values are histogrammed again and the axes
+    redrawn only after a rebinning, a restore or a reset.
+
+    :param logger: logger object
+    :type logger: logging.Logger
+    :param binning: the binning to use for this plot
+    :type binning: list or tuple or numpy.ndarray
+    :param hist_color: the color of the histogram
+    :type hist_color: str
+    :param max_values: maximum number of raw values to keep, see
+        :class:`muonic_gui.lib.buffers.RawValueBuffer`
+    :type max_values: int
+    :param kwargs: additional keyword arguments
+    :param kwargs: dict
+    """
+
+    def __init__(self, logger, binning, hist_color="b",
+                 max_values=RawValueBuffer.DEFAULT_MAX_VALUES, **kwargs):
+        BasePlot.__init__(self, logger, **kwargs)
+
+        self.hist_color = hist_color
+        self.raw_values = RawValueBuffer(max_values=max_values)
+        self.log_y = False
+        self.fit_lines = []
+
+        # bin contents histogrammed elsewhere, e.g. on the acquisition side
+        self.aggregated = None
+        # called with the new binning when the histogram is rebinned
+        self.rebin_callback = None
+
+        self.heights = []
+        self.dimension = r"$\mu$s"
+
+        self.underflow = 0
+        self.overflow = 0
+
+        # bin contents of the raw values, and the drawn bars and error bars
+        self._counts = None
+        self._patches = []
+        self._errorbars = None
+        self._decorations = None
+
+        self._set_binning(np.asarray(binning))
+        self._draw_histogram()
+
+    @property
+    def binning_range(self):
+        """
+        The binning as (start, stop, number of bin edges), the form used by
+        the fit functions in :mod:`muonic_gui.analysis.fit`
+
+        :returns: tuple
+        """
+        return self.binning[0], self.binning[-1], len(self.binning)
+
+    def _set_binning(self, binning):
+        """
+        Set the bin edges and the x-range which follows from them.
+
+        :param binning: the bin edges
+        :type binning: numpy.ndarray
+        :returns: None
+        """
+        self.binning = binning
+        self.bincontent = np.zeros(len(self.binning) - 1)
+        (self._counts, self.underflow,
+         self.overflow) = self.raw_values.histogram(self.binning)
+
+        # fixed xrange for histogram
+        self.xmin = self.binning[0]
+        self.xmax = (self.binning[-1] +
+                     (self.binning[:-1] - self.binning[1:])[-1])
+
+    def rebin(self, binning):
+        """
+        Histogram the collected values again with a new binning.
+
+        :param binning: start, stop and number of bin edges
+        :type binning: tuple
+        :returns: None
+        """
+        self._set_binning(np.linspace(binning[0], binning[1], binning[2]))
+
+        # the aggregated contents are sent again for the new binning
+        if self.aggregated is not None:
+            self.aggregated = np.zeros(len(self.binning) - 1)
+        if self.rebin_callback is not None:
+            self.rebin_callback(self.binning_range)
+
+        self._draw_histogram()
+        self.request_draw()
+
+    def set_log_y(self, enabled):
+        """
+        Switch between a linear and a logarithmic y-axis.
+
+        :param enabled: use a logarithmic y-axis
+        :type enabled: bool
+        :returns: None
+        """
+        self.log_y = enabled
+        self._draw_histogram()
+        self.request_draw()
+
+    def add_bin_counts(self, bincontent, binning, reset=False):
+        """
+        Add bin contents histogrammed elsewhere. Contents for another
+        binning than the current one are ignored, they are outdated by a
+        rebinning.
+
+        :param bincontent: the change of the bin contents
+        :type bincontent: numpy.ndarray
+        :param binning: start, stop and number of bin edges of the contents
+        :type binning: tuple
+        :param reset: the contents replace all previous contents
+        :type reset: bool
+        :returns: None
+        """
+        if not np.allclose(binning, self.binning_range):
+            return
+
+        if reset or self.aggregated is None:
+            self.aggregated = np.array(bincontent, dtype=np.float64)
+        else:
+            self.aggregated += bincontent
+
+        self._update_histogram()
+        self.request_draw()
+
+    def get_state(self):
+        """
+        Copy of the collected values, e.g. for a session snapshot.
+
+        :returns: dict -- binning, raw values and the number of values seen
+        """
+        return {"binning": np.array(self.binning_range, dtype=np.float64),
+                "values": self.raw_values.values.copy(),
+                "total": np.int64(self.raw_values.total)}
+
+    def restore(self, state):
+        """
+        Replace the collected values with ones saved by get_state.
+
+        :param state: the saved values
+        :type state: dict
+        :returns: None
+        """
+        binning = state["binning"]
+        self._set_binning(np.linspace(binning[0], binning[1],
+                                      int(binning[2])))
+        self.raw_values.restore(state["values"], state.get("total"))
+        self.aggregated = None
+
+        (self._counts, self.underflow,
+         self.overflow) = self.raw_values.histogram(self.binning)
+
+        self._draw_histogram()
+        self.request_draw()
+
+    def reset(self):
+        """
+        Remove all collected values.
+
+        :returns: None
+        """
+        self.raw_values.clear()
+        self.aggregated = None
+
+        (self._counts, self.underflow,
+         self.overflow) = self.raw_values.histogram(self.binning)
+
+        self._draw_histogram()
+        self.request_draw()
+
+    def update_plot(self, data):
+        """
+        Update the plot
+
+        :param data: the data to plot
+        :type data: list of lists
+        :return: None
+        """
+        if not len(data):
+            return
+
+        values = np.asarray(data, dtype=np.float32).ravel()
+        self.raw_values.extend(values)
+
+        # only the new values are histogrammed
+        self._counts += np.histogram(values, self.binning)[0]
+        self.underflow += np.count_nonzero(values < self.binning[0])
+        self.overflow += np.count_nonzero(values > self.binning[-1])
+
+        self._update_histogram()
+        self.request_draw()
+
+    def _sum_bincontent(self):
+        """
+        Sum the contents of the raw values and the aggregated contents.
+
+        :returns: None
+        """
+        self.bincontent = self._counts
+        if self.aggregated is not None:
+            self.bincontent = self.bincontent + self.aggregated
+
+        # self.heights contains the bincontent!
+        self.heights = self.bincontent.tolist()
+
+    def _update_histogram(self):
+        """
+        Change the heights of the drawn bars and error bars to the current
+        bin contents.
+
+        :returns: None
+        """
+        # the render budget changed the decorations
+        if self._decorations != (self.decoration("antialiasing"),
+                                 self.decoration("errorbars")):
+            self._draw_histogram()
+            return
+
+        self._sum_bincontent()
+
+        for patch, height in zip(self._patches, self.bincontent):
+            patch.set_height(height)
+
+        if self._errorbars is not None:
+            bincenters = (self.binning[1:] + self.binning[:-1]) / 2.
+            errors = np.sqrt(self.bincontent)
+            self._errorbars.lines[2][0].set_segments(
+                    [[(x, y - e), (x, y + e)] for x, y, e in
+                     zip(bincenters, self.bincontent, errors)])
+
+        self._set_ylim()
+
+    def _set_ylim(self):
+        """
+        Fit the y-range to the bin contents.
+
+        :returns: None
+        """
+        ymax = (self.bincontent + np.sqrt(self.bincontent)).max()
+
+        if self.log_y:
+            self.ax.set_ylim(ymin=0.5, ymax=max(ymax, 1.) * 2)
+        else:
+            self.ax.set_ylim(ymin=0, ymax=ymax * 1.1 if ymax else self.ymax)
+
+    def _draw_histogram(self):
+        """
+        Draw the histogram of the collected values from scratch.
+
+        :returns: None
+        """
+        self._sum_bincontent()
+
+        # avoid memory leak
+        self.ax.clear()
+        self.fit_lines = []
+
+        if self.title is not None:
+            self.ax.set_title(self.title)
+
+        antialiased = self.decoration("antialiasing")
+        self._decorations = (antialiased, self.decoration("errorbars"))
+        bincenters = (self.binning[1:] + self.binning[:-1]) / 2.
+
+        # one weighted entry per bin draws the precomputed bin contents
+        self._patches = list(self.ax.hist(bincenters, self.binning,
+                                          weights=self.bincontent,
+                                          fc=self.hist_color,
+                                          alpha=0.25)[2])
+
+        for patch in self._patches:
+            patch.set_antialiased(antialiased)
+
+        # try to add errorbars
+        self._errorbars = None
+        if self.decoration("errorbars"):
+            self._errorbars = self.ax.errorbar(
+                    bincenters, self.bincontent,
+                    yerr=np.sqrt(self.bincontent), fmt="none", color='b',
+                    antialiased=antialiased)
+
+        if self.log_y:
+            self.ax.set_yscale("log")
+        self._set_ylim()
+
+        self.ax.set_xlabel(self.xlabel)
+        self.ax.set_ylabel(self.ylabel)
+        self.ax.set_xlim(xmin=self.xmin, xmax=self.xmax)
+
+        # some beautification
+        self.ax.grid()
+
+    def show_fit(self, bin_centers, bincontent, fitx, decay, p, covar,
+                 chisquare, nbins):
+        """
+        Plot the fit onto the diagram
+
+        :param bin_centers: bin centers
+        :param bincontent: bincontents
+        :param fitx: the fit
+        :type fitx: numpy.ndarray
+        :param decay: decay function
+        :type decay: function
+        :param p: fit parameters
+        :type p: list
+        :param covar: covariance matrix
+        :type covar: matrix
+        :param chisquare: chi-squared
+        :type chisquare: float
+        :param nbins: number of bins
+        :type nbins: int
+        :returns: None
+        """
+
+        # clears a previous fit from the plot
+        for line in self.fit_lines:
+            line.remove()
+
+        self.fit_lines = self.ax.plot(bin_centers, bincontent, "b^",
+                                      fitx, decay(p, fitx), "b-")
+
+        ## print fit function formula start
+        #x = bin_centers
+        #y = bincontent
+        #poly = pl.polyfit(x, y, 2)
+
+        #def poly2latex(poly, variable="x", width=2):
+        #  t = ["{0:0.{width}f}"]
+        #  t.append(t[-1] + " {variable}")
+        #  t.append(t[-1] + "^{1}")
+
+        #  def f():
+        #    for i, v in enumerate(reversed(poly)):
+        #      idx = i if i < 2 else 2
+        #      yield t[idx].format(v, i, variable=variable, width=width)
+
+        #  return "${}$".format("+".join(f()))
+
+        #self.ax.plot(x, y, "o", alpha=0.4)
+        #x2 = np.linspace(-2, 2, 100)
+        #y2 = np.polyval(poly, x2)
+        #self.ax.plot(x2, y2, lw=2, color="r")
+        #self.ax.text(x2[5], y2[5], poly2latex(poly), fontsize=16)
+        # print fit function formula end
+
+        # FIXME: this seems to crop the histogram
+        # self.ax.set_ylim(0,max(bincontent)*1.2)
+        self.ax.set_xlabel(self.xlabel)
+        self.ax.set_ylabel(self.ylabel)
+
+        # compute the errors on the fit, nb that this calculation assumes that
+        # scipy.optimize.leastsq was used
+        error = []
+        for i in range(len(p)):
+            try:
+                error.append(np.absolute(covar[i][i]) ** 0.5)
+            except Exception:
+                error.append(0.00)
+
+        perr_leastsq = np.array(error)
+
+        try:
+            if chisquare / (nbins-len(p)) > 10000:
+                self.ax.legend(("Data", ("Fit: (%4.2f $\pm$ %4.2f) %s \n" +
+                                     " chisq/ndf=%.4g") %
+                            (p[2], perr_leastsq[2], self.dimension,
+                             chisquare / (nbins-len(p)))), loc=1)
+            self.ax.legend(("Data", ("Fit: (%4.2f $\pm$ %4.2f) %s \n" +
+                                     " chisq/ndf=%4.2f") %
+                            (p[2], perr_leastsq[2], self.dimension,
+                             chisquare / (nbins-len(p)))), loc=1)
+        except TypeError:
+            if chisquare / (nbins-len(p)) > 10000:
+                self.ax.legend(("Data", ("Fit: (%4.2f $\pm$ %4.2f) %s \n" +
+                                     " chisq/ndf=%.4g") %
+                            (p[2], perr_leastsq[2], self.dimension,
+                             chisquare / (nbins-len(p)))), loc=1)
+            self.logger.warn("Covariance Matrix is 'None', could " +
+                             "not calculate fit error!")
+            self.ax.legend(("Data", ("Fit: (%4.2f) %s \n " +
+                                     " chisq/ndf=%4.2f") %
+                            (p[2], self.dimension,
+                             chisquare / (nbins-len(p)))), loc=1)
+
+        self.request_draw()
+
+
+class PulsePlot(BasePlot):
+    """
+    Plot to display pulses
+
+    All pulses of an event are drawn as one line collection per channel. In
+    persistence mode the plot accumulates the last events into a
+    time-channel density image, like the afterglow of a phosphor scope.
+
+    :param logger: logger object
+    :type logger: logging.Logger
+    :param persistence_length: number of events to accumulate
+    :type persistence_length: int
+    :param time_range: time range of the persistence image in ns
+    :type time_range: float
+    :param time_bins: number of time bins of the persistence image
+    :type time_bins: int
+    """
+    TRACE_KIND = "pulse"
+    CHANNEL_COLORS = ['b', 'g', 'r', 'c']
+    CHANNEL_LABELS = ['c0', 'c1', 'c2', 'c3']
+    PULSE_HEIGHT = 1.0
+
+    def __init__(self, logger, persistence_length=200,
+                 time_range=100., time_bins=200):
+        BasePlot.__init__(self, logger, ymin=0, ymax=1.5,
+                          xmin=0, xmax=100, xlabel="Time (ns)",
+                          ylabel="ylabel", grid=True)
+        self.ax.set_title("Oscilloscope")
+        self.ax.yaxis.set_visible(False)
+
+        self.persistence = False
+        self.persistence_length = persistence_length
+
+        # one collection per channel holding all pulses of the last event
+        self.pulse_collections = []
+
+        for ch in range(4):
+            collection = LineCollection([], colors=self.CHANNEL_COLORS[ch],
+                                        linewidths=2,
+                                        label=self.CHANNEL_LABELS[ch])
+            self.ax.add_collection(collection)
+            self.pulse_collections.append(collection)
+
+        # the legend only depends on the channels, so build it once
+        try:
+            self.ax.legend(loc=1, ncol=5, mode="expand",
+                           borderaxespad=0., handlelength=1)
+        except Exception as e:
+            self.logger.info("An error with the legend occurred: %s" % e)
+            self.ax.legend(loc=2)
+
+        # ring buffer with the channel occupancy of the last events and
+        # the running sum which is displayed as the persistence image
+        self.time_edges = np.linspace(0., time_range, time_bins + 1)
+        self.persistence_frames = np.zeros(
+                (persistence_length, 4, time_bins), dtype=np.uint8)
+        self.persistence_sum = np.zeros((4, time_bins), dtype=np.int32)
+        self.persistence_index = 0
+        self.persistence_count = 0
+
+        self.persistence_image = self.ax.imshow(
+                np.zeros((4, time_bins)), aspect="auto", origin="lower",
+                interpolation="nearest", cmap="inferno", vmin=0., vmax=1.,
+                extent=(0., time_range, -0.5, 3.5), visible=False)
+
+    def set_persistence(self, enabled):
+        """
+        Switch between the oscilloscope and the persistence display.
+
+        :param enabled: show the persistence image
+        :type enabled: bool
+        :returns: None
+        """
+        self.persistence = enabled
+
+        for collection in self.pulse_collections:
+            collection.set_visible(not enabled)
+        self.persistence_image.set_visible(enabled)
+        self.ax.get_legend().set_visible(not enabled)
+        self.ax.yaxis.set_visible(enabled)
+
+        if enabled:
+            self.ax.set_xlim(self.time_edges[0], self.time_edges[-1])
+            self.ax.set_ylim(-0.5, 3.5)
+            self.ax.set_yticks(range(4))
+            self.ax.set_yticklabels(self.CHANNEL_LABELS)
+        else:
+            self.ax.set_ylim(self.ymin, self.ymax)
+
+        self.request_draw()
+
+    def reset_persistence(self):
+        """
+        Clear the accumulated events of the persistence image.
+
+        :returns: None
+        """
+        self.persistence_frames[:] = 0
+        self.persistence_sum[:] = 0
+        self.persistence_index = 0
+        self.persistence_count = 0
+        self.persistence_image.set_data(
+                np.zeros(self.persistence_sum.shape))
+
+    def _occupancy(self, pulses):
+        """
+        Get the time bins each channel was over threshold in.
+
+        :param pulses: extracted pulses
+        :type pulses: tuple
+        :returns: numpy.ndarray
+        """
+        n_bins = len(self.time_edges) - 1
+        # mark pulse starts and ends and integrate over the time bins
+        steps = np.zeros((4, n_bins + 1), dtype=np.int32)
+
+        for ch, channel_pulses in enumerate(pulses[1:]):
+            if not channel_pulses:
+                continue
+            edges = np.asarray(channel_pulses, dtype=float).reshape(-1, 2)
+            first = np.searchsorted(self.time_edges, edges[:, 0],
+                                    side="right") - 1
+            last = np.searchsorted(self.time_edges, edges[:, 1],
+                                   side="left")
+            np.add.at(steps[ch], np.clip(first, 0, n_bins), 1)
+            np.add.at(steps[ch], np.clip(last, 0, n_bins), -1)
+
+        return (np.cumsum(steps[:, :-1], axis=1) > 0).astype(np.uint8)
+
+    def _update_persistence(self, pulses):
+        """
+        Add the pulses of an event to the persistence image.
+
+        :param pulses: extracted pulses
+        :type pulses: tuple
+        :returns: None
+        """
+        frame = self._occupancy(pulses)
+
+        self.persistence_sum -= self.persistence_frames[self.persistence_index]
+        self.persistence_frames[self.persistence_index] = frame
+        self.persistence_sum += frame
+
+        self.persistence_index = ((self.persistence_index + 1) %
+                                  self.persistence_length)
+        self.persistence_count = min(self.persistence_count + 1,
+                                     self.persistence_length)
+
+        self.persistence_image.set_data(
+                self.persistence_sum / float(self.persistence_count))
+
+    def _update_pulses(self, pulses):
+        """
+        Replace the pulse collections by the pulses of an event.
+
+        :param pulses: extracted pulses
+        :type pulses: tuple
+        :returns: None
+        """
+        pulse_max = 0.
+        antialiased = self.decoration("antialiasing")
+
+        for ch, channel_pulses in enumerate(pulses[1:]):
+            edges = np.asarray(channel_pulses, dtype=float).reshape(-1, 2)
+
+            # every pulse is a rectangle without bottom line
+            segments = np.empty((len(edges), 4, 2))
+            segments[:, :, 0] = edges[:, [0, 0, 1, 1]]
+            segments[:, :, 1] = [0, self.PULSE_HEIGHT, self.PULSE_HEIGHT, 0]
+            self.pulse_collections[ch].set_segments(segments)
+            self.pulse_collections[ch].set_antialiased(antialiased)
+
+            if len(edges):
+                pulse_max = max(pulse_max, edges.max())
+
+        # TODO: the trick below does not really work as expected.
+        # if pulse_max < self.ax.get_xlim()[1]:
+        #    pulse_max = self.ax.get_xlim()[0]
+        if pulse_max > 0:
+            self.ax.set_xlim(0, pulse_max * 1.2)
+
+    def update_plot(self, pulses):
+        """
+        Update the plot with the pulses of an event
+
+        :param pulses: extracted pulses
+        :type pulses: tuple
+        :returns: None
+        """
+        # we have only the information that the pulse is over the threshold,
+        # besides that we do not have any information about its height
+        # TODO: It would be nice to implement the thresholds as scaling factors
+        if pulses is None:
+            self.logger.warning("Pulses have no value - " +
+                                "channels not connected?")
+            return
+
+        # the persistence image is kept up to date in both modes, so
+        # switching the display does not lose the accumulated events
+        self._update_persistence(pulses)
+
+        if not self.persistence:
+            self._update_pulses(pulses)
+
+        self.request_draw()
+
+    def update_plot_batch(self, pulses_list):
+        """
+        Update the plot with the pulses of several events. All events are
+        added to the persistence image, the oscilloscope shows the last one.
+
+        :param pulses_list: extracted pulses of each event
+        :type pulses_list: list of tuples
+        :returns: None
+        """
+        pulses_list = [pulses for pulses in pulses_list if pulses is not None]
+
+        if not pulses_list:
+            return
+
+        for pulses in pulses_list:
+            self._update_persistence(pulses)
+
+        if not self.persistence:
+            self._update_pulses(pulses_list[-1])
+
+        self.request_draw()
+
+
+class ScalarsPlot(BasePlot):
+    """
+    A plot to display scalars
+
+    :param logger: logger object
+    :type logger: logging.Logger
+    :param max_length: maximum number of values to plot
+    :type max_length: int
+    """
+    DEFAULT_CHANNEL_CONFIG = [True, True, True, True]
+    CHANNEL_COLORS = ['y', 'm', 'c', 'b']
+    TRIGGER_COLOR = 'g'
+
+    def __init__(self, logger, max_length=40):
+
+        BasePlot.__init__(self, logger, ymin=0, ymax=20,
+                          xlabel="Time (s)", ylabel="Rate (1/s)")
+        self.show_trigger = True
+        self.max_length = max_length
+        self.channel_data = [[], [], [], []]
+        self.trigger_data = []
+        self.time_data = []
+        self.time_window = 0
+        self.reset()
+
+    def reset(self, show_pending=False):
+        """
+        Reset all cached plot data
+
+        :param show_pending: indicate pending state
+        :type show_pending: bool
+        :returns: None
+        """
+        self.ax.clear()
+        self.ax.grid()
+        self.ax.set_xlabel(self.xlabel)
+        self.ax.set_ylabel(self.ylabel)
+        self.ax.set_xlim((self.xmin, self.xmax))
+        self.ax.set_ylim((self.ymin, self.ymax))
+
+        self.channel_data = [[], [], [], []]
+        self.trigger_data = []
+        self.time_data = []
+        self.time_window = 0
+
+        for ch in range(4):
+            self.ax.plot(self.time_data, self.channel_data[ch],
+                         c=self.CHANNEL_COLORS[ch],
+                         label=("ch%d" % ch), lw=3)
+        if self.show_trigger:
+            self.ax.plot(self.time_data, self.trigger_data, c='g',
+                         label='trigger', lw=3)
+
+        if show_pending:
+            left, width = .25, .5
+            bottom, height = .35, .8
+            right = left + width
+            top = bottom + height
+            self.ax.text(0.5 * (left + right), 0.5 * (bottom + top),
+                         'Measuring...', horizontalalignment='center',
+                         verticalalignment='center', fontsize=56, color='red',
+                         fontweight="heavy", alpha=.8, rotation=30,
+                         transform=self.fig.transFigure)
+
+        self.request_draw()
+
+    def update_plot(self, data, show_trigger=True,
+                    enabled_channels=DEFAULT_CHANNEL_CONFIG):
+        """
+        Update plot
+
+        :param data: plot data
+        :type data: list of lists
+        :param show_trigger: show trigger in plot
+        :type show_trigger: bool
+        :param enabled_channels: enabled channels
+        :type enabled_channels: list of bool
+        :returne: None
+        """
+        self.logger.debug("result : %s" % data)
+
+        # update lines data using the lists with new data
+        self.time_window += data[5]
+        self.time_data.append(self.time_window)
+
+        for ch in range(4):
+            self.channel_data[ch].append(data[ch])
+
+        self.trigger_data.append(data[4])
+
+        if len(self.channel_data[0]) > self.max_length:
+            for ch in range(4):
+                self.channel_data[ch].remove(self.channel_data[ch][0])
+            self.trigger_data.remove(self.trigger_data[0])
+            self.time_data.remove(self.time_data[0])
+
+        self._draw_rates(show_trigger, enabled_channels)
+
+    def get_state(self):
+        """
+        Copy of the rate history, e.g. for a session snapshot.
+
+        :returns: dict -- times, channel and trigger rates and the time
+            window
+        """
+        return {"time": np.array(self.time_data, dtype=np.float64),
+                "channels": np.array(self.channel_data, dtype=np.float64),
+                "trigger": np.array(self.trigger_data, dtype=np.float64),
+                "time_window": np.float64(self.time_window)}
+
+    def restore(self, state):
+        """
+        Replace the rate history with one saved by get_state.
+
+        :param state: the saved rate history
+        :type state: dict
+        :returns: None
+        """
+        self.time_data = state["time"].tolist()[-self.max_length:]
+        self.channel_data = [list(rates[-self.max_length:])
+                             for rates in state["channels"].tolist()]
+        self.trigger_data = state["trigger"].tolist()[-self.max_length:]
+        self.time_window = float(state["time_window"])
+
+        if self.time_data:
+            self._draw_rates(self.show_trigger)
+
+    def _draw_rates(self, show_trigger=True,
+                    enabled_channels=DEFAULT_CHANNEL_CONFIG):
+        """
+        Draw the rate history.
+
+        :param show_trigger: show trigger in plot
+        :type show_trigger: bool
+        :param enabled_channels: enabled channels
+        :type enabled_channels: list of bool
+        :returns: None
+        """
+        # do a complete redraw of the plot to avoid memory leak!
+        self.ax.clear()
+        self.show_trigger = show_trigger
+
+        self.ax.grid()
+        self.ax.set_xlabel(self.xlabel)
+        self.ax.set_ylabel(self.ylabel)
+
+        markers = self.decoration("markers")
+        antialiased = self.decoration("antialiasing")
+
+        for ch in range(4):
+            if enabled_channels[ch]:
+                self.ax.plot(self.time_data, self.channel_data[ch],
+                             c=self.CHANNEL_COLORS[ch],
+                             label=("ch%d" % ch), lw=2,
+                             marker='v' if markers else None,
+                             antialiased=antialiased)
+
+        if self.show_trigger:
+            self.ax.plot(self.time_data, self.trigger_data,
+                         c=self.TRIGGER_COLOR,
+                         label='trg', lw=2, marker='x' if markers else None,
+                         antialiased=antialiased)
+
+        if self.decoration("legend"):
+            try:
+                # get count of active cannels
+                channels = enabled_channels + [show_trigger]
+                active_count = sum(channels)
+
+                self.ax.legend(bbox_to_anchor=(0., 1.02, 1., .102), loc=3,
+                               ncol=active_count, mode="expand",
+                               borderaxespad=0., handlelength=2)
+            except Exception as e:
+                self.logger.info("An error with the legend occurred: %s" % e)
+                self.ax.legend(loc=2)
+
+        ma = max(max(self.channel_data[0]), max(self.channel_data[1]),
+                 max(self.channel_data[2]), max(self.channel_data[3]),
+                 max(self.trigger_data))
+
+        self.ax.set_ylim(0, ma * 1.1)
+
+        # do not set x-range if time_data consists of only one item to
+        # avoid matlibplot UserWarning
+        if len(self.time_data) > 1:
+            self.ax.set_xlim(self.time_data[0], self.time_data[-1])
+
+        self.request_draw()
+
+
+class LifetimePlot(BaseHistogramPlot):
+    """
+    A simple histogram for the use with mu lifetime
+    measurement
+
+    :param logger: logger object
+    :type logger: logging.Logger
+    :param binning: the binning to use for this plot
+    :type binning: list or tuple or numpy.ndarray
+    :param max_values: maximum number of raw values to keep
+    :type max_values: int
+    """
+    TRACE_KIND = "decay"
+
+    def __init__(self, logger, binning=(0, 10, 21),
+                 max_values=RawValueBuffer.DEFAULT_MAX_VALUES):
+        BaseHistogramPlot.__init__(
+                self, logger,
+                np.linspace(binning[0], binning[1], binning[2]),
+                max_values=max_values,
+                xlabel="Time between Pulses ($\mu$s)", ylabel="Events")
+
+
+class VelocityPlot(BaseHistogramPlot):
+    """
+    A simple histogram for the use with mu velocity measurement
+
+    :param logger: logger object
+    :type logger: logging.Logger
+    :param binning: the binning to use for this plot
+    :type binning: list or tuple or numpy.ndarray
+    :param max_values: maximum number of raw values to keep
+    :type max_values: int
+    """
+    TRACE_KIND = "velocity"
+
+    def __init__(self, logger, binning=(0., 30, 25),
+                 max_values=RawValueBuffer.DEFAULT_MAX_VALUES):
+        BaseHistogramPlot.__init__(
+                self, logger,
+                np.linspace(binning[0], binning[1], binning[2]),
+                max_values=max_values,
+                xmin=0., xmax=30, ymin=0, ymax=2,
+                ylabel="Events", xlabel="Flight Time (ns)")
+        self.dimension = r"$ns$"
+
+
+class PulseWidthPlot(BaseHistogramPlot):
+    """
+    A simple histogram for the use with pulse width measurement
+
+    :param logger: logger object
+    :type logger: logging.Logger
+    :param hist_color: the color of the histogram
+    :type hist_color: str
+    :param title: title of the plot
+    :type title: str
+    :param max_values: maximum number of raw values to keep
+    :type max_values: int
+    """
+    TRACE_KIND = "pulse"
+
+    def __init__(self, logger, hist_color="r", title=None,
+                 max_values=RawValueBuffer.DEFAULT_MAX_VALUES):
+        BaseHistogramPlot.__init__(
+                self, logger, np.linspace(0., 100, 30),
+                hist_color=hist_color, max_values=max_values,
+                xmin=0., xmax=100, ymin=0, ymax=2,
+                ylabel="Events", xlabel="Pulse Width (ns)")
+        self.ax_title = title if title is not None else "Pulse Widths"
+        self.name = self.ax_title
+        # keep the title when the histogram is drawn again
+        self.title = self.ax_title
+        self.ax.set_title(self.ax_title)
+        self.ax.figure.tight_layout()
+
+    def update_plot(self, data):
+        BaseHistogramPlot.update_plot(self, data)
+        # self.ax.set_title(self.ax_title)
+        # self.ax.figure.tight_layout()
+        # self.request_draw()
@@ -0,0 +1,249 @@
+"""
+Provides a cache for rendered static text and a benchmark for the text
+rendering paths of matplotlib.
+
+Axis labels, titles and legend entries hardly ever change, but matplotlib
+lays out and rasterizes them again on every draw. The cache renders each of
+them once into a bitmap and blits the bitmap on later draws.
+"""
+import collections
+import functools
+import math
+import shutil
+import threading
+import time
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg, RendererAgg
+from matplotlib.figure import Figure
+from matplotlib.text import Text
+from matplotlib.transforms import IdentityTransform
+
+__all__ = ["StaticTextCache", "STATIC_TEXT_CACHE", "benchmark_text_rendering"]
+
+
+class StaticTextCache(object):
+    """
+    Least recently used cache of rendered text bitmaps. Text artists are
+    hooked up with :meth:`install` and then draw from the cache whenever
+    they are rendered with Agg. Other renderers, e.g. for SVG or PDF output,
+    draw the text as usual.
+
+    :param max_entries: maximum number of cached bitmaps
+    :type max_entries: int
+    """
+    # extra pixels around the text extent, for antialiasing
+    PADDING = 2
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self._images = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def install(self, text):
+        """
+        Let the text artist 'text' draw from the cache.
+
+        :param text: the text artist
+        :type text: matplotlib.text.Text
+        :returns: None
+        """
+        if getattr(text, "_static_text_cache", None) is self:
+            return
+
+        text._static_text_cache = self
+        text.draw = functools.partial(self.draw, text)
+
+    def clear(self):
+        """
+        Drop all cached bitmaps.
+
+        :returns: None
+        """
+        with self._lock:
+            self._images.clear()
+
+    def _key(self, text, renderer):
+        """
+        Everything the bitmap of 'text' depends on.
+
+        :param text: the text artist
+        :type text: matplotlib.text.Text
+        :param renderer: the renderer
+        :returns: tuple
+        """
+        return (text.get_text(), hash(text.get_fontproperties()),
+                str(text.get_color()), text.get_rotation(),
+                text.get_rotation_mode(), text.get_horizontalalignment(),
+                text.get_verticalalignment(), text.get_usetex(),
+                text.get_alpha(), renderer.dpi)
+
+    def _render(self, text, renderer, anchor):
+        """
+        Render 'text' into a bitmap of its own.
+
+        :param text: the text artist
+        :type text: matplotlib.text.Text
+        :param renderer: the renderer the text will be drawn with
+        :param anchor: position of the text in display coordinates
+        :type anchor: numpy.ndarray
+        :returns: tuple -- bitmap and its offset to the anchor
+        """
+        bbox = text.get_window_extent(renderer)
+
+        x0 = math.floor(bbox.x0) - self.PADDING
+        y0 = math.floor(bbox.y0) - self.PADDING
+        width = int(math.ceil(bbox.x1)) + self.PADDING - x0
+        height = int(math.ceil(bbox.y1)) + self.PADDING - y0
+
+        # a copy of the text, positioned in the pixels of the bitmap
+        copy = Text(anchor[0] - x0, anchor[1] - y0, text.get_text())
+        copy.update_from(text)
+        # update_from also copies transform and clipping of the original
+        copy.set_transform(IdentityTransform())
+        copy.set_clip_on(False)
+        copy.set_rotation_mode(text.get_rotation_mode())
+        copy.set_figure(text.figure)
+
+        bitmap_renderer = RendererAgg(width, height, renderer.dpi)
+        copy.draw(bitmap_renderer)
+
+        # the buffer holds the rows from top to bottom, draw_image expects
+        # them from bottom to top
+        image = np.ascontiguousarray(
+                np.asarray(bitmap_renderer.buffer_rgba())[::-1])
+
+        return image, x0 - anchor[0], y0 - anchor[1]
+
+    def draw(self, text, renderer):
+        """
+        Draw the text artist 'text' from the cache.
+
+        :param text: the text artist
+        :type text: matplotlib.text.Text
+        :param renderer: the renderer
+        :returns: None
+        """
+        if (not isinstance(renderer, RendererAgg) or
+                not text.get_visible() or text.get_text() == ""):
+            return Text.draw(text, renderer)
+
+        anchor = text.get_transform().transform(text.get_unitless_position())
+
+        if not np.all(np.isfinite(anchor)):
+            return Text.draw(text, renderer)
+
+        key = self._key(text, renderer)
+
+        with self._lock:
+            entry = self._images.get(key)
+
+            if entry is not None:
+                self._images.move_to_end(key)
+                self.hits += 1
+
+        if entry is None:
+            entry = self._render(text, renderer, anchor)
+
+            with self._lock:
+                self.misses += 1
+                self._images[key] = entry
+
+                if len(self._images) > self.max_entries:
+                    self._images.popitem(last=False)
+
+        image, offset_x, offset_y = entry
+
+        gc = renderer.new_gc()
+        gc.set_clip_rectangle(text.get_clip_box() if text.get_clip_on()
+                              else None)
+        renderer.draw_image(gc, round(anchor[0] + offset_x),
+                            round(anchor[1] + offset_y), image)
+        gc.restore()
+
+        # keep matplotlib's bookkeeping as after a normal draw
+        text.stale = False
+
+
+# cache shared by all plots, the same labels appear on many of them
+STATIC_TEXT_CACHE = StaticTextCache()
+
+
+def _benchmark_figure(usetex, cache):
+    """
+    Build a figure with the static text of a typical muonic plot.
+
+    :param usetex: render the text with LaTeX
+    :type usetex: bool
+    :param cache: cache to install on the text artists or None
+    :type cache: StaticTextCache
+    :returns: matplotlib.figure.Figure
+    """
+    fig = Figure(facecolor="white", dpi=72, figsize=(10, 7.5))
+    FigureCanvasAgg(fig)
+
+    ax = fig.add_subplot(111)
+    ax.plot([0, 1, 2], [0, 2, 1], label="Data")
+    ax.plot([0, 1, 2], [1, 1, 1], label="Fit: (2.19 $\\pm$ 0.05) $\\mu$s")
+    ax.set_xlabel("Time between Pulses ($\\mu$s)")
+    ax.set_ylabel("Events")
+    ax.set_title("Muon Decay")
+    legend = ax.legend(loc=1)
+
+    texts = [ax.xaxis.label, ax.yaxis.label, ax.title]
+    texts += legend.get_texts()
+
+    for text in texts:
+        text.set_usetex(usetex)
+        if cache is not None:
+            cache.install(text)
+
+    return fig
+
+
+def benchmark_text_rendering(repeat=10, font_size=20):
+    """
+    Measure the time one draw of a figure with the static text of a typical
+    plot takes with LaTeX, with mathtext and with mathtext and the static
+    text cache. LaTeX is only measured if it is installed.
+
+    Only the text artists are switched between the paths, so the global
+    matplotlib settings are not touched and the benchmark can run next to
+    the GUI in another thread.
+
+    :param repeat: number of draws to average
+    :type repeat: int
+    :param font_size: font size of the text
+    :type font_size: int
+    :returns: dict -- mean draw time in seconds for each path
+    """
+    paths = [("mathtext", False, None),
+             ("mathtext+cache", False, StaticTextCache())]
+
+    if shutil.which("latex") is not None and shutil.which("dvipng"):
+        paths.append(("usetex", True, None))
+
+    results = dict()
+
+    for name, usetex, cache in paths:
+        fig = _benchmark_figure(usetex, cache)
+
+        for text in fig.findobj(Text):
+            text.set_fontsize(font_size)
+
+        try:
+            # first draw fills the caches of matplotlib and LaTeX
+            fig.canvas.draw()
+
+            start = time.perf_counter()
+            for _ in range(repeat):
+                fig.canvas.draw()
+            results[name] = (time.perf_counter() - start) / repeat
+        except RuntimeError:
+            # LaTeX is installed but fails on our text
+            continue
+
+    return results
@@ -49,7 +49,8 @@ setup(
 
     keywords='PyQt5 Qt GUI muonic muon skyview',
 
-    packages=['muonic_gui', 'muonic_gui.analysis', 'muonic_gui.gui'],
+    packages=['muonic_gui', 'muonic_gui.analysis', 'muonic_gui.gui',
+              'muonic_gui.daq', 'muonic_gui.lib', 'muonic_gui.plots'],
 
     package_data={
       'muonic_gui': ['daq_commands_help.txt', 'gui/muonic.xpm']